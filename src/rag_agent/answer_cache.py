@@ -0,0 +1,262 @@
+"""
+Caché semántica de respuestas en su propia colección
+
+¿Por qué una caché semántica?
+- La mayoría de las preguntas son paráfrasis de otras ya respondidas
+- Cada kickoff paga la generación completa con el LLM local
+- Si una pregunta equivalente se respondió hace poco, se sirve esa respuesta
+  sin ejecutar el crew (ni el LLM ni las herramientas RAG)
+
+Se consulta a nivel de crew (RagAgent.kickoff/kickoff_async); las llamadas
+a herramientas no se cachean aquí, solo se registran sus salidas. Cada
+entrada guarda el embedding de la pregunta (o del topic), la respuesta final
+y las salidas de herramientas que la produjeron.
+"""
+
+import dataclasses
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from .metrics import get_metrics
+from .rag_client import RAGClient, document_id, get_rag_client
+
+logger = logging.getLogger(__name__)
+
+# Salidas de herramientas de la ejecución en curso (ver collect_tool_outputs)
+_tool_outputs: ContextVar[Optional[List[Dict[str, str]]]] = ContextVar("tool_outputs", default=None)
+
+
+@contextmanager
+def collect_tool_outputs() -> Iterator[List[Dict[str, str]]]:
+    """
+    Recoge las salidas de herramientas registradas dentro del bloque
+
+    ContextVar: cada crew concurrente (asyncio o to_thread) tiene su propia lista.
+    """
+    outputs: List[Dict[str, str]] = []
+    token = _tool_outputs.set(outputs)
+    try:
+        yield outputs
+    finally:
+        _tool_outputs.reset(token)
+
+
+def record_tool_output(tool: str, tool_input: str, output: str):
+    outputs = _tool_outputs.get()
+    if outputs is not None:
+        outputs.append({"tool": tool, "input": tool_input, "output": output})
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    score: float
+    created_at: float
+    tool_outputs: List[Dict[str, str]] = field(default_factory=list)
+
+
+class SemanticAnswerCache:
+    """
+    Caché de respuestas indexada por similitud de la pregunta
+
+    - threshold: similitud coseno mínima para considerar dos preguntas equivalentes
+    - ttl_seconds: ventana de frescura; las entradas más viejas se ignoran y borran
+    - scope: separa espacios de respuesta (los demás inputs del crew, ver RagAgent.answer_cache_key)
+    - invalidate(): borra todo, p. ej. cuando cambia la base de conocimiento
+    """
+
+    def __init__(self, rag_client: RAGClient, collection_name: str = "answer_cache",
+                 threshold: float = 0.95, ttl_seconds: float = 86400.0, candidates: int = 5):
+        self.rag_client = rag_client
+        self.collection_name = collection_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.candidates = candidates
+
+        self._store = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+
+    @property
+    def store(self):
+        """Colección de la caché (mismo backend que la base de conocimiento)"""
+        if not self._ready:
+            with self._lock:
+                if self._store is None:
+                    self._store = self.rag_client.collection_store(self.collection_name)
+                if not self._ready:
+                    # Siempre coseno (el umbral es una similitud entre -1 y 1) y en una
+                    # sola etapa: la colección es pequeña y no necesita prefijo Matryoshka
+                    config = dataclasses.replace(
+                        self.rag_client.collection_config, distance="cosine", quantization="none",
+                        prefix_dimension=None
+                    )
+                    self._store.ensure_collection(config)
+                    self._ready = True
+        return self._store
+
+    def lookup(self, question: str, scope: str) -> Optional[CachedAnswer]:
+        """Respuesta cacheada más similar dentro del umbral y la ventana de frescura"""
+        metrics = get_metrics()
+        try:
+            with metrics.span("answer_cache_lookup", scope=scope):
+                embeddings = self.rag_client.get_embeddings([question])
+                hits = self.store.search_batch(
+                    embeddings, limit=self.candidates, score_threshold=self.threshold
+                )[0]
+        except Exception as e:
+            logger.warning("⚠️ Error consultando la caché de respuestas: %s", e)
+            return None
+
+        now = time.time()
+        expired_ids = []
+        for hit in hits:
+            entry = hit["metadata"]
+            if entry.get("scope") != scope:
+                continue
+            if now - entry.get("created_at", 0) > self.ttl_seconds:
+                expired_ids.append(hit["id"])
+                continue
+
+            self._delete_expired(expired_ids)
+            with self._lock:
+                self.hits += 1
+            metrics.incr("answer_cache_hits", scope=scope)
+            return CachedAnswer(
+                question=hit["text"],
+                answer=entry.get("answer", ""),
+                score=hit["score"],
+                created_at=entry.get("created_at", 0),
+                tool_outputs=entry.get("tool_outputs", []),
+            )
+
+        self._delete_expired(expired_ids)
+        with self._lock:
+            self.misses += 1
+        metrics.incr("answer_cache_misses", scope=scope)
+        return None
+
+    def _delete_expired(self, point_ids: List[str]):
+        if not point_ids:
+            return
+        with self._lock:
+            self.expired += len(point_ids)
+        try:
+            self.store.delete(point_ids)
+        except Exception as e:
+            logger.warning("⚠️ No se pudieron borrar entradas vencidas: %s", e)
+
+    def store_answer(self, question: str, scope: str, answer: str,
+                     tool_outputs: Optional[List[Dict[str, str]]] = None) -> bool:
+        """Guarda (o reemplaza) la respuesta a una pregunta en un scope"""
+        try:
+            embeddings = self.rag_client.get_embeddings([question])
+            payload = {
+                "text": question,
+                "metadata": {
+                    "scope": scope,
+                    "answer": answer,
+                    "tool_outputs": list(tool_outputs or []),
+                    "created_at": time.time(),
+                },
+            }
+            self.store.upsert([document_id(f"{scope}:{question}")], embeddings, [payload])
+        except Exception as e:
+            logger.warning("⚠️ Error guardando en la caché de respuestas: %s", e)
+            return False
+
+        with self._lock:
+            self.stores += 1
+        return True
+
+    def invalidate(self):
+        """Descarta todas las respuestas (la base de conocimiento cambió)"""
+        with self._lock:
+            store = self._store or self.rag_client.collection_store(self.collection_name)
+            try:
+                store.clear()
+            except Exception as e:
+                # La colección aún no existía
+                logger.debug("Caché de respuestas sin colección: %s", e)
+            self._store = store
+            self._ready = False
+        logger.info("🧹 Caché de respuestas invalidada")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "stores": self.stores,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+        try:
+            stats["entries"] = self.store.count()
+        except Exception:
+            stats["entries"] = 0
+        return stats
+
+    @classmethod
+    def from_env(cls, rag_client: RAGClient) -> Optional["SemanticAnswerCache"]:
+        """
+        - ANSWER_CACHE_ENABLED: "true" activa la caché (desactivada por defecto:
+          sirve respuestas de hasta ANSWER_CACHE_TTL segundos de antigüedad)
+        - ANSWER_CACHE_COLLECTION: colección de la caché
+        - ANSWER_CACHE_THRESHOLD: similitud mínima (0-1)
+        - ANSWER_CACHE_TTL: ventana de frescura en segundos
+        """
+        if not answer_cache_enabled():
+            return None
+        return cls(
+            rag_client,
+            collection_name=os.getenv("ANSWER_CACHE_COLLECTION", "answer_cache"),
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+        )
+
+
+def answer_cache_enabled() -> bool:
+    return os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+_answer_caches: Dict[int, SemanticAnswerCache] = {}
+_answer_caches_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[SemanticAnswerCache]:
+    """Caché de respuestas del RAGClient compartido (None si está desactivada)"""
+    if not answer_cache_enabled():
+        return None
+    rag_client = get_rag_client()
+    with _answer_caches_lock:
+        cache = _answer_caches.get(id(rag_client))
+        if cache is None or cache.rag_client is not rag_client:
+            cache = SemanticAnswerCache.from_env(rag_client)
+            _answer_caches[id(rag_client)] = cache
+    return cache
+
+
+def invalidate_answer_cache():
+    """La base de conocimiento cambió: descarta las respuestas cacheadas (si hay caché)"""
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.invalidate()
+
+
+def reset_answer_caches():
+    with _answer_caches_lock:
+        _answer_caches.clear()
@@ -0,0 +1,437 @@
+import asyncio
+import logging
+import os
+import warnings
+import weakref
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+import numpy as np
+from dotenv import load_dotenv
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import PointIdsList, PointStruct
+
+from .collection_config import CollectionConfig
+from .embedding_cache import EmbeddingCache
+from .metrics import get_metrics
+from .context_packer import ContextConfig, build_context, resolve_max_tokens
+from .dedup import DedupConfig, WriteResult, cosine_hits, merge_metadata
+from .query_cache import bump_collection_generation
+from .rag_client import HEDGE_MAX_TEXTS, document_id
+from .resilience import BackendError, Resilience, TransientError
+from .search_filter import SearchFilter
+from .vector_store import existing_layout, format_hits, normalize_point_id, query_request
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Clientes compartidos por event loop (las conexiones async pertenecen a un loop)
+_shared_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRAGClient]" = (
+    weakref.WeakKeyDictionary()
+)
+
+class AsyncRAGClient:
+    """
+    Versión asíncrona de RAGClient (asyncio + httpx + AsyncQdrantClient)
+
+    ¿Por qué una versión async?
+    - Muchos crews concurrentes no deben bloquear un hilo por cada I/O
+    - Un solo event loop atiende cientos de peticiones a Ollama y Qdrant
+    - El pool de conexiones está acotado (OLLAMA_MAX_CONNECTIONS)
+
+    Los métodos reflejan los de RAGClient y retornan los mismos formatos.
+    """
+
+    def __init__(self):
+        # Configuración de Ollama
+        self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "nomic-embed-text:latest")
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+        # Cliente HTTP asíncrono con límite de conexiones
+        max_connections = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+        self.http_client = httpx.AsyncClient(
+            base_url=self.ollama_base_url,
+            # Timeout de lectura (OLLAMA_TIMEOUT) y de conexión por separado
+            timeout=httpx.Timeout(
+                float(os.getenv("OLLAMA_TIMEOUT", "60")),
+                connect=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+            ),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+        # Misma caché de embeddings que el cliente síncrono
+        self.embedding_cache = EmbeddingCache.from_env(self.embedding_model)
+
+        # Configuración de Qdrant (inicialización perezosa)
+        self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
+        self.collection_name = os.getenv("QDRANT_COLLECTION_NAME", "knowledge_base")
+        self.collection_config = CollectionConfig.from_env()
+        self.context_config = ContextConfig.from_env()
+        self.dedup_config = DedupConfig.from_env()
+        self.dedup_stats = {"added": 0, "skipped": 0, "merged": 0, "replaced": 0}
+        self.ollama_resilience = Resilience.from_env("ollama", "OLLAMA")
+        self.qdrant_resilience = Resilience.from_env("qdrant", "QDRANT")
+        self._qdrant_client: Optional[AsyncQdrantClient] = None
+        self._collection_ready = False
+        self._init_lock = asyncio.Lock()
+
+    async def get_qdrant_client(self) -> AsyncQdrantClient:
+        """Crea el cliente de Qdrant y verifica la colección una sola vez"""
+        if not self._collection_ready:
+            async with self._init_lock:
+                if self._qdrant_client is None:
+                    if not async_backend_supported():
+                        raise ValueError("El backend vectorial configurado no es un servidor Qdrant: "
+                                         "usa RAGClient (ver async_backend_supported)")
+                    self._qdrant_client = AsyncQdrantClient(
+                        url=self.qdrant_url, timeout=int(os.getenv("QDRANT_TIMEOUT", "10"))
+                    )
+                if not self._collection_ready:
+                    self._collection_ready = await self._ensure_collection_exists()
+        return self._qdrant_client
+
+    async def _ensure_collection_exists(self) -> bool:
+        """Crea la colección en Qdrant si no existe (con sus índices de payload)"""
+        try:
+            collections = await self.qdrant_resilience.acall(self._qdrant_client.get_collections)
+            collection_names = [col.name for col in collections.collections]
+
+            existing_indexes = {}
+            if self.collection_name not in collection_names:
+                await self._qdrant_client.create_collection(
+                    collection_name=self.collection_name,
+                    **self.collection_config.create_collection_kwargs()
+                )
+                logger.info("✅ Colección '%s' creada en Qdrant", self.collection_name)
+            else:
+                info = await self._qdrant_client.get_collection(self.collection_name)
+                existing_indexes = info.payload_schema or {}
+                self.collection_config = existing_layout(self.collection_name, info, self.collection_config)
+
+            for field_name, schema in self.collection_config.payload_index_schemas().items():
+                if field_name in existing_indexes:
+                    continue
+                with warnings.catch_warnings():
+                    warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+                    await self._qdrant_client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=field_name,
+                        field_schema=schema
+                    )
+            return True
+
+        except Exception as e:
+            logger.error("❌ Error al crear/verificar colección: %s", e)
+            return False
+
+    async def get_embeddings(self, texts: Sequence[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Genera embeddings en lote con /api/embed
+
+        Los lotes se envían concurrentemente; el límite de conexiones del
+        cliente HTTP acota cuántos van a Ollama a la vez.
+        Lanza BackendError si Ollama falla tras los reintentos.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        metrics = get_metrics()
+        metrics.incr("embedding_texts", len(texts))
+        with metrics.span("embedding"):
+            if self.embedding_cache is None:
+                return await self._fetch_embeddings(texts, batch_size)
+
+            # SQLite bloquea: fuera del event loop, como el resto de I/O síncrona
+            cached = await asyncio.to_thread(self.embedding_cache.get_many, texts)
+            missing = list(dict.fromkeys(
+                text for text, vector in zip(texts, cached) if vector is None
+            ))
+            metrics.incr("embedding_cache_hits", len(texts) - sum(vector is None for vector in cached))
+
+            fetched = {}
+            if missing:
+                embeddings = await self._fetch_embeddings(missing, batch_size)
+                await asyncio.to_thread(self.embedding_cache.put_many, missing, embeddings)
+                fetched = dict(zip(missing, embeddings))
+
+            return np.vstack([
+                vector if vector is not None else fetched[text]
+                for text, vector in zip(texts, cached)
+            ])
+
+    async def _fetch_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        batch_size = batch_size or self.embedding_batch_size
+        batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+        results = await asyncio.gather(*(
+            self.ollama_resilience.acall(
+                lambda batch=batch: self._fetch_batch(batch),
+                hedge=len(batch) <= HEDGE_MAX_TEXTS
+            )
+            for batch in batches
+        ))
+        return np.vstack(results)
+
+    async def _fetch_batch(self, batch: List[str]) -> np.ndarray:
+        metrics = get_metrics()
+        with metrics.span("ollama_embed"):
+            response = await self.http_client.post(
+                "/api/embed",
+                json={
+                    "model": self.embedding_model,
+                    "input": batch
+                }
+            )
+        metrics.incr("ollama_requests")
+        metrics.incr("ollama_response_bytes", len(response.content))
+
+        if response.status_code >= 500 or response.status_code == 429:
+            raise TransientError(f"Error en Ollama: {response.status_code}")
+        if response.status_code != 200:
+            raise BackendError(f"Error en Ollama: {response.status_code}")
+
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(batch):
+            raise BackendError(
+                f"Ollama devolvió {len(embeddings)} embeddings para {len(batch)} textos"
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """Genera el embedding de un solo texto"""
+        return (await self.get_embeddings([text]))[0].tolist()
+
+    async def add_document(self, text: str, metadata: Dict[str, Any] = None,
+                           embedding: Optional[Sequence[float]] = None) -> bool:
+        """Añade un documento a la base de conocimiento"""
+        try:
+            if embedding is None:
+                embedding = (await self.get_embeddings([text]))[0]
+            embedding = [float(value) for value in embedding]
+            if not embedding:
+                return False
+
+            # ID canónico: el mismo que retornan las búsquedas (ver format_hits)
+            doc_id = normalize_point_id(document_id(text))
+            qdrant_client = await self.get_qdrant_client()
+            with get_metrics().span("vector_upsert", backend="qdrant"):
+                await self.qdrant_resilience.acall(lambda: qdrant_client.upsert(
+                    collection_name=self.collection_name,
+                    points=[PointStruct(
+                        id=doc_id,
+                        vector=self.collection_config.point_vector(embedding),
+                        payload={"text": text, "metadata": metadata or {}}
+                    )]
+                ))
+            get_metrics().incr("upserted_points")
+            self._invalidate_query_cache()
+
+            logger.info("✅ Documento añadido con ID: %s", doc_id)
+            return True
+
+        except Exception as e:
+            logger.error("❌ Error añadiendo documento: %s", e)
+            return False
+
+    async def add_document_unique(self, text: str, metadata: Dict[str, Any] = None) -> WriteResult:
+        """Añade un documento salvo que ya exista uno casi idéntico (ver RAGClient)"""
+        config = self.dedup_config
+        if not config.enabled:
+            added = await self.add_document(text, metadata)
+            return WriteResult("added" if added else "failed",
+                               normalize_point_id(document_id(text)) if added else None)
+
+        try:
+            embeddings = await self.get_embeddings([text])
+
+            qdrant_client = await self.get_qdrant_client()
+            euclid = self.collection_config.distance == "euclid"
+            with get_metrics().span("vector_search", backend="qdrant"):
+                hits = (await self._search(
+                    embeddings[:1], config.candidates, None if euclid else config.threshold,
+                    with_vectors=euclid or config.mode == "merge"
+                ))[0]
+            if euclid:
+                hits = cosine_hits(embeddings[0], hits)
+            duplicate = config.find_duplicate(text, hits)
+
+            if duplicate is None:
+                if not await self.add_document(text, metadata, embedding=embeddings[0]):
+                    return WriteResult("failed")
+                self.dedup_stats["added"] += 1
+                return WriteResult("added", normalize_point_id(document_id(text)))
+
+            result = WriteResult("skipped", duplicate["id"], duplicate["id"], duplicate["score"])
+            if config.mode == "merge":
+                await self.qdrant_resilience.acall(lambda: qdrant_client.upsert(
+                    collection_name=self.collection_name,
+                    points=[PointStruct(
+                        id=duplicate["id"],
+                        vector=self.collection_config.point_vector(duplicate["vector"]),
+                        payload={
+                            "text": duplicate["text"],
+                            "metadata": merge_metadata(duplicate["metadata"], metadata or {})
+                        }
+                    )]
+                ))
+                result.action = "merged"
+            elif config.mode == "replace":
+                new_id = normalize_point_id(document_id(text))
+                if not await self.add_document(text, metadata, embedding=embeddings[0]):
+                    return WriteResult("failed")
+                if new_id != duplicate["id"]:
+                    await self.qdrant_resilience.acall(lambda: qdrant_client.delete(
+                        collection_name=self.collection_name,
+                        points_selector=PointIdsList(points=[duplicate["id"]])
+                    ))
+                result.action, result.point_id = "replaced", new_id
+            if result.changed:
+                self._invalidate_query_cache()
+
+            self.dedup_stats[result.action] += 1
+            get_metrics().incr("duplicates_avoided", action=result.action)
+            logger.info("♻️ Duplicado de %s (similitud %.3f): %s",
+                        duplicate["id"], duplicate["score"], result.action)
+            return result
+
+        except Exception as e:
+            logger.error("❌ Error añadiendo documento: %s", e)
+            return WriteResult("failed")
+
+    def _invalidate_query_cache(self):
+        """
+        La colección cambió: invalida las cachés de consultas de esa colección
+
+        Las búsquedas síncronas (herramientas, servicio) no deben servir
+        resultados cacheados de antes de esta escritura.
+        """
+        bump_collection_generation(self.collection_name)
+
+    @property
+    def duplicates_avoided(self) -> int:
+        return self.dedup_stats["skipped"] + self.dedup_stats["merged"] + self.dedup_stats["replaced"]
+
+    async def _search(self, vectors: Sequence[Sequence[float]], limit: int,
+                      score_threshold: Optional[float] = None, search_params=None,
+                      with_vectors: bool = False,
+                      search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """
+        Búsqueda por lotes en Qdrant (misma lógica que QdrantVectorStore.search_batch)
+
+        Una sola petición a la Query API; con MATRYOSHKA_DIMENSION, candidatos
+        con el prefijo y reordenación con el vector completo.
+        """
+        qdrant_client = await self.get_qdrant_client()
+        query_filter = search_filter.to_qdrant() if search_filter is not None else None
+
+        responses = await self.qdrant_resilience.acall(lambda: qdrant_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                query_request(vector, self.collection_config, limit, score_threshold,
+                              search_params, with_vectors, query_filter)
+                for vector in vectors
+            ]
+        ), hedge=True)
+        return [format_hits(response.points) for response in responses]
+
+    async def search_similar(self, query: str, limit: int = 5, score_threshold: Optional[float] = None,
+                             hnsw_ef: Optional[int] = None, oversampling: Optional[float] = None,
+                             search_filter: Optional[SearchFilter] = None) -> List[Dict]:
+        """Busca documentos similares usando búsqueda vectorial"""
+        return (await self.search_similar_batch(
+            [query], limit=limit, score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef, oversampling=oversampling, search_filter=search_filter
+        ))[0]
+
+    async def search_similar_batch(self, queries: Sequence[str], limit: int = 5,
+                                   score_threshold: Optional[float] = None,
+                                   hnsw_ef: Optional[int] = None,
+                                   oversampling: Optional[float] = None,
+                                   search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """Busca documentos similares para varias consultas a la vez (BackendError si fallan)"""
+        queries = list(queries)
+        if not queries:
+            return []
+
+        if score_threshold is None:
+            score_threshold = self.collection_config.min_score_threshold
+        search_params = self.collection_config.search_params(hnsw_ef, oversampling)
+
+        query_embeddings = await self.get_embeddings(queries)
+
+        metrics = get_metrics()
+        with metrics.span("vector_search", backend="qdrant"):
+            search_results = await self._search(query_embeddings, limit, score_threshold,
+                                                search_params, search_filter=search_filter)
+        metrics.incr("vector_searches", len(search_results))
+        metrics.incr("search_results", sum(len(hits) for hits in search_results))
+
+        return search_results
+
+    async def get_context_for_query(self, query: str, max_tokens: Optional[int] = None,
+                                    search_filter: Optional[SearchFilter] = None,
+                                    max_context_length: Optional[int] = None) -> str:
+        """Obtiene contexto relevante para una consulta (ver RAGClient.get_context_for_query)"""
+        max_tokens = resolve_max_tokens(max_tokens, max_context_length)
+        metrics = get_metrics()
+        query_vector = (await self.get_embeddings([query]))[0]
+        with metrics.span("vector_search", backend="qdrant"):
+            candidates = (await self._search(
+                [query_vector], self.context_config.candidates,
+                self.collection_config.min_score_threshold, self.collection_config.search_params(),
+                with_vectors=True, search_filter=search_filter
+            ))[0]
+        metrics.incr("vector_searches")
+        metrics.incr("search_results", len(candidates))
+
+        with metrics.span("context_assembly"):
+            context = build_context(
+                candidates,
+                max_tokens or self.context_config.max_tokens,
+                query_vector,
+                mmr_lambda=self.context_config.mmr_lambda,
+                duplicate_threshold=self.context_config.duplicate_threshold
+            )
+        metrics.incr("context_bytes", len(context.encode("utf-8")))
+        return context
+
+    async def aclose(self):
+        """Cierra las conexiones HTTP y de Qdrant"""
+        await self.http_client.aclose()
+        if self._qdrant_client is not None:
+            await self._qdrant_client.close()
+
+def async_backend_supported() -> bool:
+    """
+    True si el backend configurado es un servidor Qdrant (QDRANT_URL)
+
+    ¿Por qué?
+    - Con VECTOR_BACKEND=numpy, QDRANT_PATH o QDRANT_URL=:memory: los datos
+      viven dentro del proceso, en el backend del RAGClient síncrono
+    - Un AsyncQdrantClient consultaría otra base (vacía o inexistente): las
+      herramientas usan entonces la ruta síncrona en un hilo
+    """
+    return (os.getenv("VECTOR_BACKEND", "qdrant").lower() == "qdrant"
+            and not os.getenv("QDRANT_PATH")
+            and os.getenv("QDRANT_URL", "http://localhost:6333") != ":memory:")
+
+
+def get_async_rag_client() -> AsyncRAGClient:
+    """
+    Retorna el AsyncRAGClient compartido del event loop actual
+
+    ¿Por qué uno por loop?
+    - Las conexiones de httpx y AsyncQdrantClient quedan ligadas al loop que las creó
+    - Dentro de un mismo loop todos los agentes reutilizan el mismo pool
+    """
+    loop = asyncio.get_running_loop()
+    client = _shared_async_clients.get(loop)
+    if client is None:
+        client = AsyncRAGClient()
+        _shared_async_clients[loop] = client
+    return client
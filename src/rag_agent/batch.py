@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Ejecución por lotes: muchos topics con crews concurrentes
+
+¿Por qué un runner por lotes?
+- Las cargas reales son listas de cientos de topics
+- Un proceso por topic repite el arranque y no solapa la espera del LLM
+- Los clientes de Ollama y Qdrant se comparten entre todos los crews
+
+Uso:
+    run_batch topics.jsonl --output results.jsonl --concurrency 4
+
+El archivo de entrada puede ser JSONL (un objeto con "topic" por línea, o un
+string) o CSV con cabecera (columna "topic"; el resto de columnas también se
+pasan como inputs). Se lee en streaming y cada resultado se escribe al terminar.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO, Union
+
+import numpy as np
+
+from .metrics import configure_logging, get_metrics
+from .rag_client import get_rag_client
+
+
+def iter_topics(path: Union[str, Path]) -> Iterator[Dict[str, str]]:
+    """Genera los inputs de cada topic sin cargar el archivo completo"""
+    path = Path(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            for row in csv.DictReader(f):
+                # Las filas cortas traen None en las columnas que faltan
+                if (row.get("topic") or "").strip():
+                    yield {name: (value or "").strip() for name, value in row.items() if name}
+            return
+
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"topic": item}
+            if not isinstance(item, dict) or not item.get("topic"):
+                raise ValueError(f"{path}:{line_number}: se esperaba un objeto con 'topic'")
+            # Listas (p. ej. sub_queries) como texto separado por ";"
+            yield {name: "; ".join(map(str, value)) if isinstance(value, list) else str(value)
+                   for name, value in item.items()}
+
+
+def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    if not latencies:
+        return {}
+    p50, p95, p99 = np.percentile(np.asarray(latencies), [50, 95, 99])
+    return {"p50_s": round(float(p50), 3), "p95_s": round(float(p95), 3),
+            "p99_s": round(float(p99), 3), "max_s": round(max(latencies), 3)}
+
+
+async def run_topics(topics: Iterator[Dict[str, str]], output: TextIO,
+                     concurrency: int = 4) -> Dict:
+    """
+    Ejecuta un crew por topic con como mucho `concurrency` en vuelo
+
+    ¿Cómo se acota la concurrencia?
+    - El semáforo se adquiere ANTES de leer el siguiente topic: nunca hay más
+      de `concurrency` crews (ni topics leídos) en memoria a la vez
+    - Cada crew corre con RagAgent.kickoff_async (Crew.kickoff_async)
+    """
+    # Import diferido: crewai solo se carga cuando realmente se ejecutan crews
+    from .crew import RagAgent
+
+    # Calentar los clientes compartidos una sola vez (colección verificada)
+    get_rag_client().vector_store
+
+    semaphore = asyncio.Semaphore(concurrency)
+    current_year = str(datetime.now().year)
+    latencies: List[float] = []
+    counts = {"ok": 0, "failed": 0, "cached": 0}
+    tasks = set()
+
+    async def run_one(index: int, inputs: Dict[str, str]):
+        start = time.perf_counter()
+        record = {"index": index, "topic": inputs["topic"], "inputs": inputs}
+        try:
+            rag_agent = RagAgent()
+            # En lotes el reporte va al archivo de resultados, no a report.md
+            rag_agent.report_file = None
+            rag_agent.print_metrics = False
+            result = await rag_agent.kickoff_async(inputs)
+            record.update(status="ok", output=result.raw, cached=not result.tasks_output)
+            counts["ok"] += 1
+            counts["cached"] += int(not result.tasks_output)
+        except Exception as e:
+            record.update(status="error", error=str(e))
+            counts["failed"] += 1
+        finally:
+            semaphore.release()
+
+        record["latency_s"] = round(time.perf_counter() - start, 3)
+        latencies.append(record["latency_s"])
+        # Escritura incremental: un resultado por línea en cuanto termina
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        print(f"{'✅' if record['status'] == 'ok' else '❌'} [{index}] {inputs['topic']} "
+              f"({record['latency_s']}s)")
+
+    start = time.perf_counter()
+    for index, inputs in enumerate(topics):
+        await semaphore.acquire()
+        inputs.setdefault("current_year", current_year)
+        task = asyncio.create_task(run_one(index, inputs))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    total = counts["ok"] + counts["failed"]
+    return {
+        "topics": total,
+        **counts,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_min": round(total / elapsed * 60, 2) if elapsed else 0.0,
+        "latency": _percentiles(latencies),
+    }
+
+
+def print_report(report: Dict):
+    print("\n📊 Resumen del lote")
+    print("=" * 60)
+    print(f"📋 Topics: {report['topics']} (✅ {report['ok']} | ❌ {report['failed']} | "
+          f"⚡ {report['cached']} desde caché)")
+    print(f"⏱️ Tiempo total: {report['elapsed_s']}s | "
+          f"Throughput: {report['throughput_per_min']} topics/min")
+    latency = report["latency"]
+    if latency:
+        print(f"⏱️ Latencia por topic: p50 {latency['p50_s']}s | p95 {latency['p95_s']}s | "
+              f"máx {latency['max_s']}s")
+
+
+def run_batch(argv: Optional[Sequence[str]] = None):
+    """
+    Run many crews concurrently from a JSONL or CSV file of topics.
+    """
+    parser = argparse.ArgumentParser(description="Ejecuta el crew RAG para muchos topics")
+    parser.add_argument("input", type=Path, help="Archivo .jsonl o .csv con los topics")
+    parser.add_argument("--output", type=Path, default=Path("batch_results.jsonl"),
+                        help="Resultados JSONL (uno por topic, escritos al terminar cada uno)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Crews simultáneos máximos")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    print(f"🚀 Ejecutando topics de {args.input} (concurrencia {args.concurrency})")
+    print(f"💾 Resultados en {args.output}")
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        report = asyncio.run(run_topics(iter_topics(args.input), output, args.concurrency))
+
+    print_report(report)
+    metrics = get_metrics()
+    print("\n" + metrics.summary())
+    metrics.flush()
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_batch()
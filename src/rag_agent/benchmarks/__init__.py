@@ -0,0 +1,13 @@
+"""
+Benchmarks offline de la capa RAG (ver run.py)
+"""
+
+from .fake_ollama import FakeOllamaServer, fake_embedding
+from .import_time import run_import_benchmark
+from .matryoshka import run_matryoshka_benchmark
+from .run import run_benchmark
+
+__all__ = [
+    "FakeOllamaServer", "fake_embedding", "run_benchmark", "run_import_benchmark",
+    "run_matryoshka_benchmark",
+]
@@ -0,0 +1,54 @@
+"""
+Corpus sintético para benchmarks a partir de knowledge/
+"""
+
+import random
+import re
+from pathlib import Path
+from typing import List, Union
+
+_SENTENCE_RE = re.compile(r"[^.!?\n]{20,}[.!?]")
+
+
+def replicate_corpus(source_dir: Union[str, Path], target_dir: Union[str, Path],
+                     num_files: int, seed: int = 0) -> List[Path]:
+    """
+    Copia los .txt de source_dir hasta tener num_files archivos en target_dir
+
+    Cada copia reordena los párrafos del original: los fragmentos se parecen
+    (como en un corpus real con contenido repetido) pero no son idénticos.
+    """
+    sources = sorted(Path(source_dir).glob("*.txt"))
+    if not sources:
+        raise ValueError(f"No hay archivos .txt en {source_dir}")
+
+    target = Path(target_dir)
+    target.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+
+    written = []
+    for i in range(num_files):
+        source = sources[i % len(sources)]
+        paragraphs = source.read_text(encoding="utf-8").split("\n\n")
+        if i >= len(sources):
+            rng.shuffle(paragraphs)
+        path = target / f"{source.stem}_{i:05d}.txt"
+        path.write_text("\n\n".join(paragraphs), encoding="utf-8")
+        written.append(path)
+    return written
+
+
+def sample_queries(source_dir: Union[str, Path], count: int, seed: int = 0) -> List[str]:
+    """Consultas deterministas: frases del corpus recortadas a unas pocas palabras"""
+    sentences = []
+    for path in sorted(Path(source_dir).glob("*.txt")):
+        sentences.extend(_SENTENCE_RE.findall(path.read_text(encoding="utf-8")))
+    if not sentences:
+        raise ValueError(f"No hay frases en {source_dir}")
+
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        words = rng.choice(sentences).strip(" -*").split()
+        queries.append(" ".join(words[:rng.randint(4, 10)]))
+    return queries
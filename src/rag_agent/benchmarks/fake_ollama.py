@@ -0,0 +1,126 @@
+"""
+Servidor HTTP que imita la API de embeddings de Ollama (/api/embed)
+
+¿Por qué un servidor falso?
+- Los benchmarks miden nuestra capa RAG, no la GPU ni el modelo
+- Vectores deterministas: dos ejecuciones producen exactamente los mismos resultados
+- La latencia es configurable para simular un Ollama local o remoto
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _word_vector(word: str, dimension: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+
+
+def fake_embedding(text: str, dimension: int = 768) -> np.ndarray:
+    """
+    Embedding determinista: suma de vectores aleatorios por palabra, normalizada
+
+    ¿Por qué por palabra y no un hash del texto completo?
+    - Textos que comparten palabras quedan cerca, como con un modelo real
+    - Las consultas encuentran resultados y el umbral de score se comporta igual
+    """
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        vector += _word_vector(word, dimension)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeOllamaServer:
+    """
+    Ollama falso en un hilo: `with FakeOllamaServer() as server: server.url`
+
+    - latency_ms: latencia fija por petición
+    - per_text_ms: latencia adicional por cada texto del lote
+    """
+
+    def __init__(self, dimension: int = 768, latency_ms: float = 0.0, per_text_ms: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.requests = 0
+        self.texts = 0
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        with self._lock:
+            self.requests += 1
+            self.texts += len(texts)
+        delay = (self.latency_ms + self.per_text_ms * len(texts)) / 1000
+        if delay:
+            time.sleep(delay)
+        return [fake_embedding(text, self.dimension).tolist() for text in texts]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != "/api/embed":
+                    self.send_error(404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                texts = body.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+
+                data = json.dumps({
+                    "model": body.get("model", ""),
+                    "embeddings": server.embed(texts)
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # Sin una línea de log por petición
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
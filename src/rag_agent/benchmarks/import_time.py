@@ -0,0 +1,117 @@
+"""
+Tiempo de importación de los puntos de entrada (python -X importtime)
+
+¿Por qué medirlo?
+- El CLI y las tareas cron son procesos cortos: el arranque en frío domina
+- Un import de más (p. ej. CrewAI en `search`) añade segundos sin que nada falle
+- Cada módulo tiene un presupuesto y una lista de paquetes que no debe cargar
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Presupuesto (ms acumulados) y paquetes prohibidos por módulo
+IMPORT_BUDGETS_MS: Dict[str, float] = {
+    "rag_agent.main": 100.0,
+    "rag_agent.rag_client": 2500.0,
+}
+FORBIDDEN_IMPORTS: Dict[str, Tuple[str, ...]] = {
+    "rag_agent.main": ("crewai", "litellm", "qdrant_client"),
+    "rag_agent.rag_client": ("crewai", "litellm"),
+}
+
+# "import time:       self [us] |  cumulative | imported package"
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+# Directorio que contiene el paquete rag_agent (src/)
+_PACKAGE_ROOT = Path(__file__).resolve().parents[2]
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int, int]]:
+    """(módulo, µs propios, µs acumulados, profundidad) por import, en el orden de -X importtime"""
+    entries = []
+    for line in output.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            entries.append((match.group(4), int(match.group(1)), int(match.group(2)),
+                            len(match.group(3))))
+    return entries
+
+
+def import_subtree(entries: List[Tuple[str, int, int, int]], module: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Imports causados por `module` (sin los del arranque del intérprete)
+
+    -X importtime lista cada módulo después de sus dependencias, con más
+    sangría cuanto más profundo: el subárbol son las líneas anteriores más
+    profundas que el propio módulo.
+    """
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index][0] == module:
+            depth = entries[index][3]
+            start = index
+            while start > 0 and entries[start - 1][3] > depth:
+                start -= 1
+            return entries[start:index + 1]
+    return []
+
+
+def _run_importtime(module: str) -> List[Tuple[str, int, int, int]]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(_PACKAGE_ROOT), env.get("PYTHONPATH")]))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, check=True
+    )
+    return parse_importtime(completed.stderr)
+
+
+def measure_import(module: str, repeat: int = 3, top: int = 10,
+                   budget_ms: Optional[float] = None,
+                   forbidden: Sequence[str] = ()) -> Dict:
+    """
+    Importa `module` en `repeat` intérpretes nuevos y resume el más rápido
+
+    - cumulative_ms: tiempo acumulado del import (mínimo y mediana)
+    - heaviest: los `top` imports con más tiempo propio en la mejor ejecución
+    - forbidden_imports: paquetes prohibidos que se cargaron igualmente
+    """
+    runs = []
+    for _ in range(repeat):
+        subtree = import_subtree(_run_importtime(module), module)
+        runs.append((subtree[-1][2] if subtree else 0, subtree))
+
+    cumulative_ms = [total / 1000 for total, _ in runs]
+    best_ms, entries = min(runs, key=lambda run: run[0])
+    best_ms /= 1000
+
+    loaded = {name.split(".")[0] for name, *_ in entries}
+    heaviest = sorted(entries, key=lambda entry: entry[1], reverse=True)[:top]
+    report = {
+        "module": module,
+        "cumulative_ms": round(best_ms, 3),
+        "median_ms": round(statistics.median(cumulative_ms), 3),
+        "modules_imported": len(entries),
+        "forbidden_imports": sorted(package for package in forbidden if package in loaded),
+        "heaviest": [{"module": name, "self_ms": round(own / 1000, 3)} for name, own, *_ in heaviest],
+    }
+    if budget_ms is not None:
+        report["budget_ms"] = budget_ms
+        report["within_budget"] = best_ms <= budget_ms and not report["forbidden_imports"]
+    return report
+
+
+def run_import_benchmark(modules: Optional[Sequence[str]] = None, repeat: int = 3,
+                         budgets: Optional[Dict[str, float]] = None) -> List[Dict]:
+    """Mide cada módulo con su presupuesto (IMPORT_BUDGETS_MS salvo que se indique otro)"""
+    budgets = {**IMPORT_BUDGETS_MS, **(budgets or {})}
+    return [
+        measure_import(module, repeat, budget_ms=budgets.get(module),
+                       forbidden=FORBIDDEN_IMPORTS.get(module, ()))
+        for module in (modules or list(IMPORT_BUDGETS_MS))
+    ]
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline de la capa RAG
+
+¿Qué mide?
+- Ingesta: documentos/s y fragmentos/s de load_knowledge_folder
+- Latencia p50/p95/p99 de search_similar y get_context_for_query
+- Memoria pico del proceso (y del heap de Python con --trace-memory)
+- Con --import-time: tiempo de importación de los puntos de entrada frente
+  a su presupuesto (ver import_time.py)
+- Con --matryoshka: recall@k y latencia de la búsqueda en dos etapas frente
+  a la exacta (ver matryoshka.py)
+
+Sin Ollama ni Qdrant reales: un Ollama falso local (FakeOllamaServer) y Qdrant
+en memoria (o el backend NumPy). La salida JSON se puede comparar entre versiones.
+
+Uso:
+    python -m rag_agent.benchmarks --sizes 6,60,300 --queries 200 --output bench.json
+    python -m rag_agent.benchmarks --sizes "" --import-time
+    python -m rag_agent.benchmarks --sizes "" --matryoshka
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from ..metrics import Metrics, set_metrics
+from ..rag_client import get_rag_client, reset_rag_clients
+from ..setup_knowledge_base import load_knowledge_folder
+from .corpus import replicate_corpus, sample_queries
+from .fake_ollama import FakeOllamaServer
+from .import_time import run_import_benchmark
+from .matryoshka import run_matryoshka_benchmark
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Igual que setup_knowledge_base: relativo al directorio del proyecto
+DEFAULT_KNOWLEDGE_DIR = Path("knowledge")
+
+
+@contextmanager
+def _patched_env(values: Dict[str, Optional[str]]) -> Iterator[None]:
+    """Aplica variables de entorno y restaura las originales al salir"""
+    previous = {name: os.environ.get(name) for name in values}
+    try:
+        for name, value in values.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@contextmanager
+def _working_directory(path: Path) -> Iterator[None]:
+    previous = Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def latency_summary(samples_ms: Sequence[float]) -> Dict[str, float]:
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    if samples.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "count": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+
+
+def _measure(fn: Callable[[str], object], queries: Sequence[str]) -> List[float]:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def peak_rss_mb() -> Optional[float]:
+    """RSS máximo del proceso (en Linux ru_maxrss está en KB, en macOS en bytes)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+
+def benchmark_size(num_files: int, queries: Sequence[str], knowledge_dir: Path,
+                   workdir: Path, trace_memory: bool = False) -> Dict:
+    """Ingesta num_files archivos en una colección nueva y mide las consultas"""
+    run_dir = workdir / f"corpus_{num_files}"
+    replicate_corpus(knowledge_dir, run_dir / "knowledge", num_files)
+
+    env = {
+        "QDRANT_COLLECTION_NAME": f"bench_{num_files}",
+        "INGEST_MANIFEST_PATH": str(run_dir / "ingest_manifest.json"),
+    }
+    metrics = Metrics()
+    with _patched_env(env), _working_directory(run_dir):
+        reset_rag_clients()
+        set_metrics(metrics)
+        if trace_memory:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        files_loaded = load_knowledge_folder(full_resync=True)
+        setup_seconds = time.perf_counter() - start
+
+        rag_client = get_rag_client()
+        points = rag_client.count_documents()
+
+        # Calentamiento: conexiones y colección ya inicializadas
+        rag_client.search_similar(queries[0])
+
+        search_ms = _measure(rag_client.search_similar, queries)
+        context_ms = _measure(rag_client.get_context_for_query, queries)
+
+        memory = {"peak_rss_mb": peak_rss_mb()}
+        if trace_memory:
+            memory["python_heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+        reset_rag_clients()
+        set_metrics(None)
+
+    return {
+        "files": num_files,
+        "setup": {
+            "files_loaded": files_loaded,
+            "points": points,
+            "seconds": round(setup_seconds, 3),
+            "docs_per_sec": round(files_loaded / setup_seconds, 2) if setup_seconds else None,
+            "points_per_sec": round(points / setup_seconds, 2) if setup_seconds else None,
+        },
+        "search_similar": latency_summary(search_ms),
+        "get_context_for_query": latency_summary(context_ms),
+        "memory": memory,
+        # Desglose por span (embedding, vector_search, context_assembly...)
+        "metrics": metrics.snapshot(),
+    }
+
+
+def run_benchmark(sizes: Sequence[int], num_queries: int = 100, dimension: int = 768,
+                  latency_ms: float = 0.0, per_text_ms: float = 0.0,
+                  backend: str = "qdrant", caches: bool = False,
+                  knowledge_dir: Optional[Path] = None, trace_memory: bool = False,
+                  seed: int = 0) -> Dict:
+    """
+    Ejecuta el benchmark para cada tamaño de corpus (número de archivos)
+
+    Las cachés de embeddings y de consultas se desactivan por defecto para
+    medir el camino completo (embedding + búsqueda) en cada consulta.
+    """
+    knowledge_dir = Path(knowledge_dir or DEFAULT_KNOWLEDGE_DIR).resolve()
+    queries = sample_queries(knowledge_dir, num_queries, seed=seed)
+
+    with tempfile.TemporaryDirectory(prefix="rag_bench_") as tmp, \
+            FakeOllamaServer(dimension, latency_ms, per_text_ms) as server:
+        workdir = Path(tmp)
+        env = {
+            "OLLAMA_BASE_URL": server.url,
+            "EMBEDDING_DIMENSION": str(dimension),
+            "VECTOR_BACKEND": backend,
+            "QDRANT_PATH": ":memory:",
+            "NUMPY_STORE_PATH": str(workdir / "numpy_store"),
+            "EMBEDDING_CACHE_ENABLED": "true" if caches else "false",
+            "EMBEDDING_CACHE_PATH": str(workdir / "embeddings.sqlite3"),
+            "QUERY_CACHE_ENABLED": "true" if caches else "false",
+        }
+        with _patched_env(env):
+            runs = [
+                benchmark_size(size, queries, knowledge_dir, workdir, trace_memory)
+                for size in sizes
+            ]
+        embed_requests = server.requests
+
+    return {
+        "benchmark": "rag_layer",
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {
+            "sizes": list(sizes),
+            "queries": num_queries,
+            "dimension": dimension,
+            "latency_ms": latency_ms,
+            "per_text_ms": per_text_ms,
+            "backend": backend,
+            "caches": caches,
+            "seed": seed,
+        },
+        "embed_requests": embed_requests,
+        "runs": runs,
+    }
+
+
+def print_summary(report: Dict):
+    print("\n📊 Resultados del benchmark")
+    print("=" * 60)
+    for run in report["runs"]:
+        setup = run["setup"]
+        print(f"📁 {run['files']} archivos → {setup['points']} fragmentos "
+              f"en {setup['seconds']}s ({setup['docs_per_sec']} docs/s)")
+        for name in ("search_similar", "get_context_for_query"):
+            stats = run[name]
+            print(f"   🔍 {name}: p50 {stats['p50_ms']}ms | "
+                  f"p95 {stats['p95_ms']}ms | p99 {stats['p99_ms']}ms")
+        print(f"   💾 Memoria pico: {run['memory']['peak_rss_mb']} MB")
+    for entry in report.get("import_time", []):
+        status = "✅" if entry.get("within_budget", True) else "⚠️"
+        budget = f" (presupuesto {entry['budget_ms']}ms)" if "budget_ms" in entry else ""
+        print(f"{status} import {entry['module']}: {entry['cumulative_ms']}ms{budget}")
+        if entry["forbidden_imports"]:
+            print(f"   🚫 Importa {', '.join(entry['forbidden_imports'])}")
+    if "matryoshka" in report:
+        matryoshka = report["matryoshka"]
+        print(f"🪆 Matryoshka: {matryoshka['config']['points']} puntos de "
+              f"{matryoshka['config']['dimension']} dimensiones")
+        for run in matryoshka["runs"]:
+            label = f"prefijo {run['prefix_dimension']}" if run["prefix_dimension"] else "exacta"
+            print(f"   🔍 {label}: recall@{matryoshka['config']['limit']} {run['recall_at_k']} | "
+                  f"p50 {run['p50_ms']}ms | p95 {run['p95_ms']}ms | {run['scanned_mb']} MB leídos")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark offline de la capa RAG")
+    parser.add_argument("--sizes", default="6,60",
+                        help="Tamaños del corpus en archivos, separados por comas")
+    parser.add_argument("--queries", type=int, default=100, help="Consultas por tamaño")
+    parser.add_argument("--dimension", type=int, default=768, help="Dimensión de los embeddings")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Latencia simulada de Ollama por petición")
+    parser.add_argument("--per-text-ms", type=float, default=0.0,
+                        help="Latencia simulada adicional por texto del lote")
+    parser.add_argument("--backend", choices=("qdrant", "numpy"), default="qdrant")
+    parser.add_argument("--caches", action="store_true",
+                        help="Mantener activas las cachés de embeddings y consultas")
+    parser.add_argument("--knowledge", type=Path, default=None,
+                        help="Carpeta con los .txt a replicar (por defecto knowledge/)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Medir el pico del heap de Python con tracemalloc (más lento)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--import-time", action="store_true",
+                        help="Medir el tiempo de importación de los puntos de entrada")
+    parser.add_argument("--import-repeat", type=int, default=3,
+                        help="Intérpretes nuevos por módulo (se reporta el más rápido)")
+    parser.add_argument("--import-budget", action="append", default=[], metavar="MODULO=MS",
+                        help="Presupuesto de importación para un módulo (repetible)")
+    parser.add_argument("--matryoshka", action="store_true",
+                        help="Comparar la búsqueda en dos etapas (prefijo + reordenación) con la exacta")
+    parser.add_argument("--matryoshka-prefixes", default="128,256",
+                        help="Dimensiones de prefijo a comparar, separadas por comas")
+    parser.add_argument("--matryoshka-points", type=int, default=20000,
+                        help="Puntos sintéticos de la colección")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="Archivo JSON de salida (por defecto se imprime)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(
+        sizes=[int(size) for size in args.sizes.split(",") if size],
+        num_queries=args.queries,
+        dimension=args.dimension,
+        latency_ms=args.latency_ms,
+        per_text_ms=args.per_text_ms,
+        backend=args.backend,
+        caches=args.caches,
+        knowledge_dir=args.knowledge,
+        trace_memory=args.trace_memory,
+        seed=args.seed,
+    )
+
+    if args.import_time:
+        budgets = {}
+        for item in args.import_budget:
+            module, _, budget = item.partition("=")
+            budgets[module] = float(budget)
+        report["import_time"] = run_import_benchmark(
+            list(budgets) or None, args.import_repeat, budgets
+        )
+
+    if args.matryoshka:
+        report["matryoshka"] = run_matryoshka_benchmark(
+            num_points=args.matryoshka_points,
+            dimension=args.dimension,
+            prefix_dimensions=[int(size) for size in args.matryoshka_prefixes.split(",") if size],
+            num_queries=args.queries,
+            seed=args.seed,
+        )
+
+    print_summary(report)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n", encoding="utf-8")
+        print(f"\n💾 Resultados guardados en {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Fragmentación (chunking) de documentos para la ingesta RAG
+
+¿Por qué fragmentar?
+- Un vector por archivo completo diluye el significado de cada sección
+- Fragmentos pequeños devuelven pasajes precisos y prompts más cortos
+- Se procesa en streaming: los archivos grandes nunca se cargan enteros en memoria
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple, Union
+
+# Aproximación de tokens: palabras y signos de puntuación por separado
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Frase: hasta un signo final seguido de espacio o fin de línea (no corta "3.5")
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?…]+(?=\s|\Z)|\Z)\s*", re.DOTALL)
+
+DEFAULT_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+DEFAULT_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estima el número de tokens de un texto
+
+    ¿Por qué una estimación?
+    - No dependemos del tokenizador concreto de cada modelo de Ollama
+    - Contar palabras y signos por separado se acerca al conteo BPE real
+    """
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass
+class Chunk:
+    """Fragmento de un documento con sus offsets (caracteres) en el original"""
+    text: str
+    start: int
+    end: int
+    index: int
+    token_count: int
+
+
+@dataclass
+class _Segment:
+    raw: str
+    start: int
+    tokens: int
+    new_paragraph: bool
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.raw)
+
+
+def _iter_segments(lines: Iterable[str], max_tokens: int) -> Iterator[_Segment]:
+    """
+    Divide un flujo de líneas en frases (o líneas de lista) con sus offsets
+
+    El espacio en blanco entre segmentos se conserva en `raw`, así que
+    concatenar segmentos consecutivos reproduce el texto original.
+    """
+    offset = 0
+    pending = None
+    new_paragraph = True
+
+    for line in lines:
+        if not line.strip():
+            # Línea en blanco: fin de párrafo
+            if pending is not None:
+                pending.raw += line
+            new_paragraph = True
+            offset += len(line)
+            continue
+
+        indent = len(line) - len(line.lstrip())
+        if pending is not None:
+            pending.raw += line[:indent]
+
+        for match in _SENTENCE_RE.finditer(line, indent):
+            for raw, start in _split_long(match.group(), offset + match.start(), max_tokens):
+                if pending is not None:
+                    yield pending
+                pending = _Segment(raw, start, count_tokens(raw), new_paragraph)
+                new_paragraph = False
+
+        offset += len(line)
+
+    if pending is not None:
+        yield pending
+
+
+def _split_long(raw: str, start: int, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """Corta por palabras una frase que por sí sola supera max_tokens"""
+    if count_tokens(raw) <= max_tokens:
+        yield raw, start
+        return
+
+    piece_start = 0
+    piece_tokens = 0
+    for word in re.finditer(r"\S+\s*", raw):
+        word_tokens = count_tokens(word.group())
+        if piece_tokens and piece_tokens + word_tokens > max_tokens:
+            yield raw[piece_start:word.start()], start + piece_start
+            piece_start = word.start()
+            piece_tokens = 0
+        piece_tokens += word_tokens
+    yield raw[piece_start:], start + piece_start
+
+
+def chunk_lines(lines: Iterable[str], max_tokens: int = DEFAULT_MAX_TOKENS,
+                overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> Iterator[Chunk]:
+    """
+    Agrupa frases en fragmentos de como máximo max_tokens tokens
+
+    ¿Cómo se decide el corte?
+    - Nunca se corta una frase (salvo que ella sola supere max_tokens)
+    - Si el fragmento ya va por la mitad y empieza un párrafo nuevo, se corta ahí
+    - Las últimas frases (hasta overlap_tokens) se repiten al inicio del siguiente
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens debe ser menor que max_tokens")
+
+    current: List[_Segment] = []
+    current_tokens = 0
+    index = 0
+
+    for segment in _iter_segments(lines, max_tokens):
+        if current:
+            overflow = current_tokens + segment.tokens > max_tokens
+            paragraph_break = segment.new_paragraph and current_tokens >= max_tokens // 2
+            if overflow or paragraph_break:
+                yield _make_chunk(current, index)
+                index += 1
+                current = _overlap_tail(current, overlap_tokens, max_tokens - segment.tokens)
+                current_tokens = sum(s.tokens for s in current)
+
+        current.append(segment)
+        current_tokens += segment.tokens
+
+    if current:
+        yield _make_chunk(current, index)
+
+
+def _overlap_tail(segments: List[_Segment], overlap_tokens: int, room: int) -> List[_Segment]:
+    """Últimas frases del fragmento anterior que caben en el solapamiento"""
+    budget = min(overlap_tokens, room)
+    tail: List[_Segment] = []
+    tokens = 0
+    for segment in reversed(segments):
+        if tokens + segment.tokens > budget:
+            break
+        tail.insert(0, segment)
+        tokens += segment.tokens
+    return tail
+
+
+def _make_chunk(segments: List[_Segment], index: int) -> Chunk:
+    raw = "".join(segment.raw for segment in segments)
+    text = raw.strip()
+    start = segments[0].start + (len(raw) - len(raw.lstrip()))
+    return Chunk(
+        text=text,
+        start=start,
+        end=start + len(text),
+        index=index,
+        token_count=sum(segment.tokens for segment in segments)
+    )
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS,
+               overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> Iterator[Chunk]:
+    """Fragmenta un texto ya cargado en memoria"""
+    return chunk_lines(text.splitlines(keepends=True), max_tokens, overlap_tokens)
+
+
+def chunk_file(path: Union[str, Path], max_tokens: int = DEFAULT_MAX_TOKENS,
+               overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+               encoding: str = "utf-8") -> Iterator[Chunk]:
+    """
+    Fragmenta un archivo leyéndolo línea a línea (generador)
+
+    Los offsets de cada Chunk son posiciones de caracteres en el archivo.
+    """
+    with open(path, "r", encoding=encoding, newline="") as f:
+        yield from chunk_lines(f, max_tokens, overlap_tokens)
@@ -0,0 +1,260 @@
+"""
+Esquema de la colección vectorial configurable desde el entorno
+
+¿Por qué configurable?
+- La dimensión depende del modelo de embeddings (EMBEDDING_DIMENSION)
+- La cuantización y los vectores en disco reducen mucho el uso de memoria
+- Los parámetros HNSW permiten cambiar recall por latencia en colecciones grandes
+- Los índices de payload permiten filtrar por metadatos durante la búsqueda HNSW
+- Con MATRYOSHKA_DIMENSION la búsqueda es en dos etapas: candidatos con un
+  prefijo corto del embedding y rescoring con el vector completo
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    PayloadSchemaType,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+)
+
+DISTANCES = {
+    "cosine": Distance.COSINE,
+    "dot": Distance.DOT,
+    "euclid": Distance.EUCLID,
+    "euclidean": Distance.EUCLID,
+}
+
+QUANTIZATIONS = ("none", "scalar", "binary")
+
+PAYLOAD_SCHEMAS = {
+    "keyword": PayloadSchemaType.KEYWORD,
+    "datetime": PayloadSchemaType.DATETIME,
+    "integer": PayloadSchemaType.INTEGER,
+    "float": PayloadSchemaType.FLOAT,
+    "bool": PayloadSchemaType.BOOL,
+}
+
+# Vectores con nombre del esquema Matryoshka (dos etapas)
+FULL_VECTOR = "full"
+PREFIX_VECTOR = "prefix"
+
+# Campos de metadata indexados por defecto (ver search_filter.SearchFilter)
+DEFAULT_PAYLOAD_INDEXES = "category:keyword,source:keyword,added_by:keyword,added_at:datetime"
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+
+def _env_optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name, "")
+    return int(value) if value else None
+
+
+def _env_optional_float(name: str) -> Optional[float]:
+    value = os.getenv(name, "")
+    return float(value) if value else None
+
+
+def parse_payload_indexes(spec: str) -> Dict[str, str]:
+    """"campo:tipo,campo:tipo" -> {campo: tipo}; "none" o vacío desactiva los índices"""
+    if spec.strip().lower() in ("", "none"):
+        return {}
+    indexes = {}
+    for item in spec.split(","):
+        name, _, schema = item.strip().partition(":")
+        schema = (schema or "keyword").strip().lower()
+        if schema not in PAYLOAD_SCHEMAS:
+            raise ValueError(f"Tipo de índice de payload desconocido: {schema}")
+        indexes[name.strip()] = schema
+    return indexes
+
+
+@dataclass
+class CollectionConfig:
+    """
+    Parámetros de creación de la colección y de búsqueda por defecto
+
+    Los parámetros de creación solo se aplican al crear la colección; las
+    colecciones existentes conservan su esquema.
+    """
+    dimension: int = 768
+    distance: str = "cosine"
+    on_disk: bool = False
+    on_disk_payload: bool = False
+    quantization: str = "none"
+    quantization_always_ram: bool = True
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    min_score_threshold: float = 0.4
+    search_hnsw_ef: Optional[int] = None
+    search_oversampling: Optional[float] = None
+    payload_indexes: Dict[str, str] = field(
+        default_factory=lambda: parse_payload_indexes(DEFAULT_PAYLOAD_INDEXES)
+    )
+    prefix_dimension: Optional[int] = None
+    prefix_oversampling: float = 4.0
+
+    def __post_init__(self):
+        self.distance = self.distance.lower()
+        self.quantization = self.quantization.lower()
+        if self.distance not in DISTANCES:
+            raise ValueError(f"DISTANCE_METRIC desconocida: {self.distance}")
+        if self.distance == "euclidean":
+            self.distance = "euclid"
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"VECTOR_QUANTIZATION desconocida: {self.quantization}")
+        if self.prefix_dimension is not None and not 0 < self.prefix_dimension < self.dimension:
+            raise ValueError(
+                f"MATRYOSHKA_DIMENSION debe estar entre 1 y {self.dimension - 1}: {self.prefix_dimension}"
+            )
+
+    @classmethod
+    def from_env(cls) -> "CollectionConfig":
+        """
+        - EMBEDDING_DIMENSION, DISTANCE_METRIC (cosine, dot, euclidean)
+        - VECTORS_ON_DISK, PAYLOAD_ON_DISK
+        - VECTOR_QUANTIZATION (none, scalar, binary), QUANTIZATION_ALWAYS_RAM
+        - HNSW_M, HNSW_EF_CONSTRUCT
+        - MIN_SCORE_THRESHOLD, SEARCH_HNSW_EF, SEARCH_OVERSAMPLING
+        - PAYLOAD_INDEXES: "campo:tipo,..." sobre metadata (keyword, datetime, ...)
+        - MATRYOSHKA_DIMENSION (p. ej. 128 o 256), MATRYOSHKA_OVERSAMPLING
+        """
+        return cls(
+            dimension=int(os.getenv("EMBEDDING_DIMENSION", "768")),
+            distance=os.getenv("DISTANCE_METRIC", "cosine"),
+            on_disk=_env_bool("VECTORS_ON_DISK"),
+            on_disk_payload=_env_bool("PAYLOAD_ON_DISK"),
+            quantization=os.getenv("VECTOR_QUANTIZATION", "none"),
+            quantization_always_ram=_env_bool("QUANTIZATION_ALWAYS_RAM", True),
+            hnsw_m=_env_optional_int("HNSW_M"),
+            hnsw_ef_construct=_env_optional_int("HNSW_EF_CONSTRUCT"),
+            min_score_threshold=float(os.getenv("MIN_SCORE_THRESHOLD", "0.4")),
+            search_hnsw_ef=_env_optional_int("SEARCH_HNSW_EF"),
+            search_oversampling=_env_optional_float("SEARCH_OVERSAMPLING"),
+            payload_indexes=parse_payload_indexes(os.getenv("PAYLOAD_INDEXES", DEFAULT_PAYLOAD_INDEXES)),
+            prefix_dimension=_env_optional_int("MATRYOSHKA_DIMENSION"),
+            prefix_oversampling=float(os.getenv("MATRYOSHKA_OVERSAMPLING", "4")),
+        )
+
+    @property
+    def qdrant_distance(self) -> Distance:
+        return DISTANCES[self.distance]
+
+    def vectors_config(self) -> Union[VectorParams, Dict[str, VectorParams]]:
+        """
+        Un vector por punto o, con prefix_dimension, dos vectores con nombre
+
+        ¿Por qué dos vectores (Matryoshka)?
+        - Los modelos Matryoshka (nomic-embed-text) concentran la información en
+          las primeras dimensiones: el prefijo basta para elegir candidatos
+        - El índice HNSW y la RAM solo guardan el prefijo (128/256 dims en vez de 768)
+        - El vector completo vive en disco, sin índice (m=0), y solo se lee para
+          reordenar los candidatos
+        """
+        if self.prefix_dimension is None:
+            return VectorParams(
+                size=self.dimension,
+                distance=self.qdrant_distance,
+                on_disk=self.on_disk or None
+            )
+        return {
+            FULL_VECTOR: VectorParams(
+                size=self.dimension,
+                distance=self.qdrant_distance,
+                on_disk=True,
+                hnsw_config=HnswConfigDiff(m=0)
+            ),
+            PREFIX_VECTOR: VectorParams(
+                size=self.prefix_dimension,
+                distance=self.qdrant_distance,
+                on_disk=self.on_disk or None
+            ),
+        }
+
+    def point_vector(self, vector: Sequence[float]) -> Union[List[float], Dict[str, List[float]]]:
+        """Vector de un punto en el formato del esquema (con nombre si es Matryoshka)"""
+        values = [float(value) for value in vector]
+        if self.prefix_dimension is None:
+            return values
+        return {FULL_VECTOR: values, PREFIX_VECTOR: values[:self.prefix_dimension]}
+
+    def prefix_candidates(self, limit: int) -> int:
+        """Candidatos de la primera etapa que se reordenan con el vector completo"""
+        return max(limit, int(limit * self.prefix_oversampling))
+
+    def quantization_config(self):
+        """
+        Configuración de cuantización de Qdrant
+
+        ¿Por qué cuantizar?
+        - scalar (int8): ~4x menos memoria con pérdida de recall mínima
+        - binary: ~32x menos memoria; necesita rescoring con oversampling
+        """
+        if self.quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(
+                    type=ScalarType.INT8,
+                    always_ram=self.quantization_always_ram
+                )
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(
+                binary=BinaryQuantizationConfig(always_ram=self.quantization_always_ram)
+            )
+        return None
+
+    def hnsw_config(self) -> Optional[HnswConfigDiff]:
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def payload_index_schemas(self) -> Dict[str, PayloadSchemaType]:
+        """
+        Índices de payload a crear: {"metadata.campo": tipo}
+
+        ¿Por qué indexar?
+        - Qdrant usa el índice para filtrar durante el recorrido HNSW; sin él
+          un filtro selectivo degrada la búsqueda a un escaneo
+        - Los índices se pueden añadir a colecciones existentes en cualquier momento
+        """
+        return {f"metadata.{name}": PAYLOAD_SCHEMAS[schema] for name, schema in self.payload_indexes.items()}
+
+    def create_collection_kwargs(self) -> Dict[str, Any]:
+        """Argumentos para QdrantClient.create_collection (sin collection_name)"""
+        kwargs: Dict[str, Any] = {"vectors_config": self.vectors_config()}
+        if self.on_disk_payload:
+            kwargs["on_disk_payload"] = True
+        if self.quantization_config() is not None:
+            kwargs["quantization_config"] = self.quantization_config()
+        if self.hnsw_config() is not None:
+            kwargs["hnsw_config"] = self.hnsw_config()
+        return kwargs
+
+    def search_params(self, hnsw_ef: Optional[int] = None,
+                      oversampling: Optional[float] = None) -> Optional[SearchParams]:
+        """
+        Parámetros por consulta: hnsw_ef (recall vs latencia) y oversampling
+        con rescoring sobre los vectores originales cuando hay cuantización
+        """
+        hnsw_ef = hnsw_ef if hnsw_ef is not None else self.search_hnsw_ef
+        oversampling = oversampling if oversampling is not None else self.search_oversampling
+
+        quantization = None
+        if oversampling is not None or self.quantization != "none":
+            quantization = QuantizationSearchParams(rescore=True, oversampling=oversampling)
+
+        if hnsw_ef is None and quantization is None:
+            return None
+        return SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
@@ -0,0 +1,167 @@
+"""
+Ensamblado del contexto RAG con presupuesto de tokens y diversidad (MMR)
+
+¿Por qué no concatenar los resultados en orden?
+- El presupuesto real del LLM es en tokens, no en caracteres
+- Un documento grande no debe impedir que entren otros más pequeños
+- Pasajes casi idénticos (solapamiento de chunks, documentos repetidos)
+  gastan el presupuesto sin aportar información nueva
+"""
+
+import os
+import warnings
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .chunking import count_tokens
+
+NO_RESULTS_MESSAGE = "No se encontró información relevante en la base de conocimiento."
+EMPTY_CONTEXT_MESSAGE = "No se encontró información relevante."
+SEPARATOR = "\n\n---\n\n"
+
+# Conversión aproximada para el antiguo presupuesto en caracteres (max_context_length)
+CHARS_PER_TOKEN = 4
+
+
+@dataclass
+class ContextConfig:
+    """
+    Parámetros del ensamblado de contexto
+
+    - max_tokens: presupuesto por defecto del contexto
+    - candidates: resultados que se recuperan para elegir entre ellos
+    - mmr_lambda: 1.0 = solo relevancia, 0.0 = solo diversidad
+    - duplicate_threshold: similitud coseno a partir de la cual un pasaje es duplicado
+    """
+    max_tokens: int = 500
+    candidates: int = 20
+    mmr_lambda: float = 0.7
+    duplicate_threshold: float = 0.95
+
+    @classmethod
+    def from_env(cls) -> "ContextConfig":
+        """
+        - CONTEXT_MAX_TOKENS, CONTEXT_CANDIDATES
+        - CONTEXT_MMR_LAMBDA, CONTEXT_DUPLICATE_THRESHOLD
+        """
+        return cls(
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "500")),
+            candidates=int(os.getenv("CONTEXT_CANDIDATES", "20")),
+            mmr_lambda=float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7")),
+            duplicate_threshold=float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.95")),
+        )
+
+
+def resolve_max_tokens(max_tokens: Optional[int], max_context_length: Optional[int]) -> Optional[int]:
+    """
+    Presupuesto en tokens aceptando el parámetro anterior en caracteres
+
+    max_context_length está obsoleto: se convierte (CHARS_PER_TOKEN) y avisa
+    con DeprecationWarning; si llegan ambos, manda max_tokens.
+    """
+    if max_context_length is None:
+        return max_tokens
+    warnings.warn("max_context_length (caracteres) está obsoleto: usa max_tokens",
+                  DeprecationWarning, stacklevel=3)
+    if max_tokens is not None:
+        return max_tokens
+    return max(1, max_context_length // CHARS_PER_TOKEN)
+
+
+def format_passage(doc: Dict) -> str:
+    return f"[Fuente ID: {doc['id']}, Score: {doc['score']:.3f}]\n{doc['text']}"
+
+
+def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def select_passages(similar_docs: Sequence[Dict], max_tokens: int,
+                    query_vector: Optional[Sequence[float]] = None,
+                    mmr_lambda: float = 0.7,
+                    duplicate_threshold: float = 0.95) -> List[Dict]:
+    """
+    Elige los pasajes que entran en el presupuesto, en orden de selección
+
+    ¿Cómo funciona?
+    - Se descartan textos repetidos exactos
+    - Si todos los documentos traen "vector" y hay query_vector, se elige por
+      MMR: relevancia con la consulta menos similitud máxima con lo ya elegido,
+      calculado con matrices (una sola multiplicación para todas las parejas)
+    - Un pasaje demasiado parecido a uno elegido (>= duplicate_threshold) se descarta
+    - Un pasaje que no cabe se salta y se sigue con los demás
+    """
+    # Duplicados exactos: se conserva la primera aparición (la de mayor score)
+    seen = set()
+    docs = []
+    for doc in similar_docs:
+        text = doc["text"].strip()
+        if text and text not in seen:
+            seen.add(text)
+            docs.append(doc)
+    if not docs:
+        return []
+
+    # El separador entre pasajes también consume presupuesto
+    separator_cost = count_tokens(SEPARATOR)
+    costs = np.array([count_tokens(format_passage(doc)) + separator_cost for doc in docs])
+    available = costs <= max_tokens
+
+    use_mmr = query_vector is not None and all(doc.get("vector") is not None for doc in docs)
+    if not use_mmr:
+        # Sin vectores: orden de relevancia, saltando lo que no cabe
+        selected, used = [], 0
+        for doc, cost in zip(docs, costs):
+            if used + cost <= max_tokens:
+                selected.append(doc)
+                used += cost
+        return selected
+
+    vectors = _unit_rows(np.asarray([doc["vector"] for doc in docs], dtype=np.float32))
+    query = _unit_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    # Similitud máxima de cada candidato con lo ya elegido (nada elegido = 0)
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+
+    selected, used = [], 0
+    while available.any():
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(np.where(available, scores, -np.inf)))
+        available[best] = False
+
+        if redundancy[best] >= duplicate_threshold:
+            continue
+        selected.append(docs[best])
+        used += costs[best]
+        redundancy = np.maximum(redundancy, similarity[best])
+        # Solo siguen disponibles los que aún caben
+        available &= costs <= max_tokens - used
+
+    return selected
+
+
+def build_context(similar_docs: List[Dict], max_tokens: int = 500,
+                  query_vector: Optional[Sequence[float]] = None,
+                  mmr_lambda: float = 0.7, duplicate_threshold: float = 0.95) -> str:
+    """
+    Construye el texto de contexto para el LLM dentro de max_tokens (ver select_passages)
+
+    ¿Por qué limitar el contexto?
+    - Los LLMs tienen límites de tokens
+    - Demasiado contexto puede confundir al modelo
+    - Prompts más cortos responden antes
+    """
+    if not similar_docs:
+        return NO_RESULTS_MESSAGE
+
+    passages = select_passages(
+        similar_docs, max_tokens, query_vector,
+        mmr_lambda=mmr_lambda, duplicate_threshold=duplicate_threshold
+    )
+    context = SEPARATOR.join(format_passage(doc) for doc in passages)
+
+    return context if context else EMPTY_CONTEXT_MESSAGE
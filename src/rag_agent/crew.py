@@ -1,15 +1,28 @@
 from crewai import Agent, Crew, Process, Task, LLM
-from crewai.project import CrewBase, agent, crew, task
+from crewai.crews.crew_output import CrewOutput
+from crewai.project import CrewBase, after_kickoff, agent, before_kickoff, crew, task
 from crewai.agents.agent_builder.base_agent import BaseAgent
-from typing import List
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
 # Importar herramientas RAG
 from .tools.rag_tools import RAGSearchTool, RAGAddDocumentTool, RAGContextTool
+from .answer_cache import collect_tool_outputs, get_answer_cache
+from .metrics import get_metrics
+from .prefetch import (
+    NO_PREFETCHED_CONTEXT, prefetch_context, prefetch_queries, retrieval_first_enabled
+)
+from .query_cache import make_key
+from .write_buffer import flush_write_buffers
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Configuración de LLM para Ollama
 # ¿Por qué esta configuración específica?
 # - model: Especifica el modelo de Ollama a usar
@@ -24,6 +37,9 @@ llm = LLM(
     timeout=60,  # Timeout de 60 segundos
 )
 
+# Archivo que escribe la tarea de reporte (también al servir desde caché)
+REPORT_FILE = 'report.md'
+
 @CrewBase
 class RagAgent():
     """
@@ -38,6 +54,13 @@ class RagAgent():
     agents: List[BaseAgent]
     tasks: List[Task]
 
+    # Archivo del reporte final (None = no escribir, p. ej. en ejecuciones por lotes)
+    report_file: Optional[str] = REPORT_FILE
+    # Registrar (logger) el resumen de métricas al terminar cada kickoff
+    print_metrics: bool = True
+    # Recuperar el contexto antes del kickoff (None = RETRIEVAL_FIRST del entorno)
+    retrieval_first: Optional[bool] = None
+
     @agent
     def researcher(self) -> Agent:
         """
@@ -100,9 +123,133 @@ class RagAgent():
         """
         return Task(
             config=self.tasks_config['reporting_task'], 
-            output_file='report.md'
+            output_file=self.report_file
         )
 
+    def kickoff(self, inputs: Dict[str, str]) -> CrewOutput:
+        """
+        Ejecuta el crew consultando antes la caché semántica de respuestas
+        
+        ¿Por qué no llamar directamente a crew().kickoff?
+        - Si una pregunta equivalente (paráfrasis) se respondió dentro de la
+          ventana de frescura, se sirve esa respuesta sin llamar al LLM
+        - Si no, se ejecuta el crew y se guarda la respuesta final junto con
+          las salidas de las herramientas usadas
+        """
+        cached = self._cached_answer(inputs)
+        if cached is not None:
+            return cached
+        
+        with collect_tool_outputs() as tool_outputs:
+            result = self.crew().kickoff(inputs=inputs)
+        
+        self._store_answer(inputs, result, tool_outputs)
+        return result
+
+    async def kickoff_async(self, inputs: Dict[str, str]) -> CrewOutput:
+        """
+        Versión asíncrona de kickoff (Crew.kickoff_async) para ejecutar
+        muchos crews concurrentes desde un mismo event loop
+        """
+        cached = await asyncio.to_thread(self._cached_answer, inputs)
+        if cached is not None:
+            return cached
+        
+        # to_thread copia el contexto: las herramientas registran en esta lista
+        with collect_tool_outputs() as tool_outputs:
+            result = await self.crew().kickoff_async(inputs=inputs)
+        
+        await asyncio.to_thread(self._store_answer, inputs, result, tool_outputs)
+        return result
+
+    def _cached_answer(self, inputs: Dict[str, str]) -> Optional[CrewOutput]:
+        cache = get_answer_cache()
+        if cache is None:
+            return None
+        
+        question, scope = self.answer_cache_key(inputs)
+        cached = cache.lookup(question, scope)
+        if cached is None:
+            return None
+        
+        logger.info("⚡ Respuesta desde la caché semántica (similitud %.3f con '%s')",
+                    cached.score, cached.question)
+        if self.report_file:
+            Path(self.report_file).write_text(cached.answer, encoding="utf-8")
+        # Sin tasks_output: la respuesta no salió de una ejecución del crew
+        return CrewOutput(raw=cached.answer)
+
+    def _store_answer(self, inputs: Dict[str, str], result: CrewOutput,
+                      tool_outputs: List[Dict[str, str]]):
+        cache = get_answer_cache()
+        if cache is None:
+            return
+        
+        question, scope = self.answer_cache_key(inputs)
+        cache.store_answer(question, scope, result.raw, tool_outputs)
+        if self.print_metrics:
+            stats = cache.stats()
+            logger.info("📦 Caché de respuestas: %d aciertos, %d fallos, %d entradas",
+                        stats["hits"], stats["misses"], stats["entries"])
+
+    @staticmethod
+    def answer_cache_key(inputs: Dict[str, str]) -> Tuple[str, str]:
+        """
+        Pregunta (question o topic) y scope con el resto de inputs
+        
+        El scope evita servir la respuesta de otro contexto (p. ej. otro año).
+        """
+        field = "question" if "question" in inputs else "topic"
+        others = {name: value for name, value in inputs.items() if name != field}
+        return str(inputs.get(field, "")), make_key("crew", others)
+
+    @before_kickoff
+    def inject_rag_context(self, inputs: Dict[str, str]) -> Dict[str, str]:
+        """
+        Rellena {rag_context} de tasks.yaml antes de interpolar las tareas
+        
+        ¿Por qué en before_kickoff?
+        - En modo retrieval-first el topic y las subconsultas (sub_queries) se
+          recuperan en paralelo y llegan empaquetados a las descripciones
+        - Los agentes responden en una pasada en lugar de gastar turnos del
+          LLM en descubrir que deben llamar a las herramientas RAG
+        - Retorna un diccionario nuevo: la clave de la caché de respuestas
+          sigue calculándose con los inputs originales
+        """
+        inputs = dict(inputs or {})
+        if inputs.get("rag_context"):
+            return inputs
+        
+        retrieval_first = self.retrieval_first
+        if retrieval_first is None:
+            retrieval_first = retrieval_first_enabled()
+        
+        context = ""
+        if retrieval_first:
+            queries = prefetch_queries(inputs)
+            logger.info("📥 Recuperando contexto previo para %d consulta(s)", len(queries))
+            context = prefetch_context(queries)
+        inputs["rag_context"] = context or NO_PREFETCHED_CONTEXT
+        return inputs
+
+    @after_kickoff
+    def report_metrics(self, result):
+        """
+        Escribe los documentos diferidos y registra el resumen de métricas RAG
+        
+        ¿Por qué al final del kickoff?
+        - Lo que los agentes encolaron con rag_add_document queda escrito (WRITE_BEHIND_ENABLED)
+        - Muestra cuánto tiempo se fue en embeddings, búsquedas y herramientas
+        - Vuelca las métricas al sink configurado (METRICS_SINK)
+        """
+        if not flush_write_buffers():
+            logger.warning("⚠️ Quedan documentos sin escribir; se reintentarán desde el archivo de derrame")
+        metrics = get_metrics()
+        if self.print_metrics:
+            logger.info("\n%s", metrics.summary())
+        metrics.flush()
+        return result
+
     @crew
     def crew(self) -> Crew:
         """
@@ -0,0 +1,163 @@
+"""
+Supresión de casi-duplicados en las escrituras de los agentes
+
+¿Por qué deduplicar?
+- Los IDs son md5(texto): cualquier reformulación trivial crea otro punto
+- Tras muchas ejecuciones la colección se llena de variantes del mismo hallazgo
+- Los duplicados ralentizan la búsqueda y desplazan resultados útiles del top-k
+
+Antes de escribir se busca el punto más parecido: si supera el umbral de
+similitud (y, opcionalmente, su SimHash de shingles está cerca) se omite la
+escritura, se combinan los metadatos o se reemplaza el punto existente.
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEDUP_MODES = ("skip", "merge", "replace")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def text_shingles(text: str, size: int = 3) -> List[str]:
+    """Shingles de `size` palabras consecutivas (en minúsculas)"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def simhash(text: str, bits: int = 64, shingle_size: int = 3) -> int:
+    """
+    SimHash de los shingles del texto
+
+    Textos casi idénticos (una palabra cambiada, otra puntuación) quedan a
+    pocos bits de distancia de Hamming; textos distintos, a ~bits/2.
+    """
+    shingles = text_shingles(text, shingle_size)
+    if not shingles:
+        return 0
+    digest_size = bits // 8
+    hashes = np.array(
+        [list(hashlib.blake2b(s.encode("utf-8"), digest_size=digest_size).digest())
+         for s in shingles],
+        dtype=np.uint8
+    )
+    # Cada bit vota +1/-1 por shingle; el signo de la suma es el bit del SimHash
+    votes = np.unpackbits(hashes, axis=1).astype(np.int32) * 2 - 1
+    fingerprint = np.packbits(votes.sum(axis=0) > 0)
+    return int.from_bytes(fingerprint.tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def cosine_hits(embedding, hits: List[Dict]) -> List[Dict]:
+    """
+    Reordena los hits por similitud coseno con `embedding` (requiere "vector")
+
+    ¿Por qué?
+    - Con DISTANCE_METRIC=euclidean el score del backend es una distancia
+      (menor es mejor): no es comparable con el umbral de similitud
+    """
+    if not hits:
+        return []
+    query = np.asarray(embedding, dtype=np.float32)
+    matrix = np.asarray([hit["vector"] for hit in hits], dtype=np.float32)
+    norms = np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12)
+    similarities = (matrix @ query) / norms
+    rescored = [dict(hit, score=float(similarity)) for hit, similarity in zip(hits, similarities)]
+    return sorted(rescored, key=lambda hit: hit["score"], reverse=True)
+
+
+def merge_metadata(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combina metadatos: las claves nuevas se añaden y los valores distintos
+    de una misma clave se acumulan en una lista (p. ej. varias fuentes)
+    """
+    merged = dict(existing)
+    for name, value in new.items():
+        if name not in merged:
+            merged[name] = value
+            continue
+        current = merged[name] if isinstance(merged[name], list) else [merged[name]]
+        if value not in current:
+            merged[name] = current + [value]
+    merged["duplicates"] = int(existing.get("duplicates", 0)) + 1
+    return merged
+
+
+@dataclass
+class DedupConfig:
+    """
+    - threshold: similitud mínima (coseno) para considerar un punto duplicado;
+      con DISTANCE_METRIC=euclidean los hits se re-puntúan con cosine_hits
+    - mode: skip (no escribir), merge (combinar metadatos) o replace (nuevo texto)
+    - simhash: exigir además que los SimHash estén a <= simhash_max_distance bits
+    """
+    enabled: bool = True
+    threshold: float = 0.92
+    mode: str = "skip"
+    simhash: bool = False
+    simhash_max_distance: int = 6
+    candidates: int = 5
+
+    def __post_init__(self):
+        self.mode = self.mode.lower()
+        if self.mode not in DEDUP_MODES:
+            raise ValueError(f"DEDUP_MODE desconocido: {self.mode}")
+
+    @classmethod
+    def from_env(cls) -> "DedupConfig":
+        """
+        - DEDUP_ENABLED: "false" escribe siempre (comportamiento anterior)
+        - DEDUP_THRESHOLD, DEDUP_MODE (skip, merge, replace)
+        - DEDUP_SIMHASH, DEDUP_SIMHASH_MAX_DISTANCE
+        """
+        return cls(
+            enabled=os.getenv("DEDUP_ENABLED", "true").lower() not in ("0", "false", "no"),
+            threshold=float(os.getenv("DEDUP_THRESHOLD", "0.92")),
+            mode=os.getenv("DEDUP_MODE", "skip"),
+            simhash=os.getenv("DEDUP_SIMHASH", "false").lower() in ("1", "true", "yes"),
+            simhash_max_distance=int(os.getenv("DEDUP_SIMHASH_MAX_DISTANCE", "6")),
+        )
+
+    def find_duplicate(self, text: str, hits: List[Dict]) -> Optional[Dict]:
+        """Primer resultado (ordenados por score) que cuenta como duplicado de `text`"""
+        fingerprint = simhash(text) if self.simhash else None
+        for hit in hits:
+            if hit["score"] < self.threshold:
+                continue
+            if fingerprint is not None and \
+                    hamming_distance(fingerprint, simhash(hit["text"])) > self.simhash_max_distance:
+                continue
+            return hit
+        return None
+
+
+@dataclass
+class WriteResult:
+    """Resultado de una escritura deduplicada"""
+    action: str  # added, skipped, merged, replaced o failed
+    point_id: Optional[str] = None
+    duplicate_of: Optional[str] = None
+    score: Optional[float] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.action != "failed"
+
+    @property
+    def duplicate(self) -> bool:
+        return self.duplicate_of is not None
+
+    @property
+    def changed(self) -> bool:
+        """La escritura modificó la colección (todo salvo skipped y failed)"""
+        return self.action in ("added", "merged", "replaced")
@@ -0,0 +1,201 @@
+"""
+Caché de embeddings en dos niveles (memoria + disco)
+
+¿Por qué cachear embeddings?
+- setup_knowledge_base vuelve a embeber los mismos documentos en cada ejecución
+- Los agentes repiten las mismas consultas una y otra vez
+- Un embedding depende solo de (modelo, texto): se puede reutilizar sin riesgo
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def text_hash(text: str) -> str:
+    """Hash de contenido usado como clave (independiente de la longitud del texto)"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché de embeddings direccionada por contenido: clave = (modelo, sha256(texto))
+
+    ¿Por qué dos niveles?
+    - LRU en memoria: acierto inmediato para consultas repetidas en el proceso
+    - SQLite en disco: sobrevive a reinicios (vectores float16 o float32 como BLOB)
+    - Al cambiar EMBEDDING_MODEL se purgan las entradas del modelo anterior
+    """
+
+    def __init__(self, model: str, path: Optional[str] = None, max_entries: int = 10000,
+                 dtype: str = "float32"):
+        self.model = model
+        self.max_entries = max_entries
+        self.dtype = np.dtype(dtype)
+        self.path = path
+
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            self._open_disk_store(path)
+
+    def _open_disk_store(self, path: str):
+        """Abre (o crea) el almacén SQLite e invalida entradas de otro modelo"""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " dtype TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+        if row is None or row[0] != self.model:
+            # El modelo cambió: los vectores anteriores ya no son comparables
+            self._db.execute("DELETE FROM embeddings WHERE model != ?", (self.model,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (self.model,)
+            )
+        self._db.commit()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Busca los embeddings de varios textos
+
+        Retorna una lista alineada con `texts` con el vector (float32) o None si falta.
+        """
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for key in hashes:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+
+            pending = [key for key in dict.fromkeys(hashes) if key not in found]
+            from_disk = set()
+            if pending and self._db is not None:
+                for key, vector in self._load_from_disk(pending).items():
+                    from_disk.add(key)
+                    found[key] = vector
+                    self._remember(key, vector)
+
+            results = []
+            for key in hashes:
+                vector = found.get(key)
+                if vector is None:
+                    self.misses += 1
+                elif key in from_disk:
+                    self.disk_hits += 1
+                else:
+                    self.memory_hits += 1
+                results.append(vector)
+
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray):
+        """Guarda embeddings en ambos niveles"""
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = text_hash(text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((self.model, key, self.dtype.name, vector.astype(self.dtype).tobytes()))
+
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, dtype, vector) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+
+    def _load_from_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        loaded = {}
+        # SQLite limita el número de parámetros por consulta
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = self._db.execute(
+                f"SELECT text_hash, dtype, vector FROM embeddings "
+                f"WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model, *chunk]
+            )
+            for key, dtype, blob in cursor:
+                loaded[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+        return loaded
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """Inserta en el LRU en memoria expulsando las entradas más antiguas"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Vacía ambos niveles"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de aciertos/fallos para ajustar el tamaño de la caché"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    @classmethod
+    def from_env(cls, model: str) -> Optional["EmbeddingCache"]:
+        """
+        Crea la caché según la configuración del entorno
+
+        - EMBEDDING_CACHE_ENABLED: "false" desactiva la caché
+        - EMBEDDING_CACHE_PATH: ruta SQLite (vacía = solo memoria)
+        - EMBEDDING_CACHE_SIZE: entradas máximas en memoria
+        - EMBEDDING_CACHE_DTYPE: float32 o float16 para el almacén en disco
+        """
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(
+            model=model,
+            path=os.getenv("EMBEDDING_CACHE_PATH", ".rag_cache/embeddings.sqlite3") or None,
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+            dtype=os.getenv("EMBEDDING_CACHE_DTYPE", "float32"),
+        )
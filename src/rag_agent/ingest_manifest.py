@@ -0,0 +1,127 @@
+"""
+Manifiesto de ingesta incremental
+
+¿Por qué un manifiesto?
+- Re-ejecutar el setup no debe re-embeber archivos que no cambiaron
+- Al editar o borrar un archivo hay que eliminar sus puntos antiguos de Qdrant
+- El coste de re-sincronizar depende del tamaño del cambio, no del corpus
+"""
+
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+MANIFEST_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+def file_hash(path: Union[str, Path], block_size: int = 1 << 16) -> str:
+    """sha256 del contenido leyendo por bloques"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ManifestEntry:
+    """Estado de un archivo fuente en la última ingesta"""
+    content_hash: Optional[str]
+    mtime_ns: int
+    size: int
+    point_ids: List[str] = field(default_factory=list)
+
+
+class IngestManifest:
+    """
+    Registro JSON de los archivos ingestados: hash, mtime, tamaño e IDs de puntos
+
+    El manifiesto solo es válido para la misma colección, modelo de embeddings
+    y parámetros de fragmentación; si alguno cambia se descarta y se re-ingesta todo.
+    """
+
+    def __init__(self, path: Union[str, Path], fingerprint: Dict[str, object]):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.files: Dict[str, ManifestEntry] = {}
+
+    @classmethod
+    def load(cls, path: Union[str, Path], fingerprint: Dict[str, object]) -> "IngestManifest":
+        manifest = cls(path, fingerprint)
+        if not manifest.path.exists():
+            return manifest
+
+        try:
+            data = json.loads(manifest.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Manifiesto de ingesta ilegible, se re-ingesta todo: %s", e)
+            return manifest
+
+        if data.get("version") != MANIFEST_VERSION or data.get("fingerprint") != fingerprint:
+            logger.warning("⚠️ Cambió la configuración de ingesta, se re-ingesta todo")
+            return manifest
+
+        manifest.files = {
+            source: ManifestEntry(**entry) for source, entry in data.get("files", {}).items()
+        }
+        return manifest
+
+    def save(self):
+        """Escritura atómica (archivo temporal + rename)"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "fingerprint": self.fingerprint,
+            "files": {source: asdict(entry) for source, entry in sorted(self.files.items())},
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+    def get(self, source: str) -> Optional[ManifestEntry]:
+        return self.files.get(source)
+
+    def is_unchanged(self, source: str, path: Path) -> bool:
+        """
+        Comprueba si un archivo no cambió desde la última ingesta
+
+        ¿Por qué mtime + tamaño primero?
+        - Evita leer y hashear archivos que claramente no cambiaron
+        - Si solo cambió el mtime (p. ej. git checkout) se confirma por hash
+        """
+        entry = self.files.get(source)
+        if entry is None or entry.content_hash is None:
+            return False
+
+        stat = path.stat()
+        if entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            return True
+
+        if entry.size == stat.st_size and entry.content_hash == file_hash(path):
+            entry.mtime_ns = stat.st_mtime_ns
+            return True
+
+        return False
+
+    def record(self, source: str, path: Path, content_hash: Optional[str], point_ids: List[str]):
+        stat = path.stat()
+        self.files[source] = ManifestEntry(
+            content_hash=content_hash,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            point_ids=list(point_ids),
+        )
+
+    def remove(self, source: str) -> Optional[ManifestEntry]:
+        return self.files.pop(source, None)
+
+    def missing_sources(self, present: List[str]) -> List[str]:
+        """Fuentes registradas que ya no existen en disco"""
+        present_set = set(present)
+        return [source for source in self.files if source not in present_set]
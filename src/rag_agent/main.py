@@ -20,12 +20,21 @@ RAG Agent Crew - Sistema Multi-Agente RAG 100% Local
 import sys
 import warnings
 from datetime import datetime
-from pathlib import Path
-
-from rag_agent.crew import RagAgent
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
+# Imports diferidos: cada comando importa solo lo que usa
+# ¿Por qué?
+# - rag_agent.crew carga CrewAI/LiteLLM y crea el LLM (varios segundos)
+# - `search` y `help` no los necesitan; el CLI y los cron arrancan en frío
+# - Ver `benchmark --import-time` para el presupuesto de tiempo de importación
+
+
+def _configure_logging():
+    """Mensajes de la capa RAG por logging (LOG_LEVEL, por defecto INFO)"""
+    from rag_agent.metrics import configure_logging
+    configure_logging()
+
 # This main file is intended to be a way for you to run your
 # crew locally, so refrain from adding unnecessary logic into this file.
 # Replace with inputs you want to test with, it will automatically
@@ -40,6 +49,9 @@ def run():
     - Los agentes ahora usan RAG automáticamente
     - No requiere cambios en el flujo de usuario
     """
+    _configure_logging()
+    from rag_agent.crew import RagAgent
+    
     inputs = {
         'topic': 'bases de datos vectoriales',
         'current_year': str(datetime.now().year)
@@ -51,7 +63,8 @@ def run():
         print(f"📅 Año: {inputs['current_year']}")
         print("=" * 60)
         
-        RagAgent().crew().kickoff(inputs=inputs)
+        # Pasa por la caché semántica de respuestas antes de llamar al LLM
+        RagAgent().kickoff(inputs=inputs)
         
         print("\n" + "=" * 60)
         print("✅ RAG Agent completado exitosamente!")
@@ -60,6 +73,14 @@ def run():
     except Exception as e:
         raise Exception(f"An error occurred while running the RAG crew: {e}")
 
+def run_batch():
+    """
+    Run many crews concurrently from a JSONL or CSV file of topics.
+    """
+    _configure_logging()
+    from rag_agent.batch import run_batch as batch_main
+    batch_main(sys.argv[2:])
+
 def setup_knowledge_base():
     """
     Initialize the knowledge base with initial documents.
@@ -69,6 +90,7 @@ def setup_knowledge_base():
     - Carga datos iniciales necesarios
     - Puede ejecutarse independientemente
     """
+    _configure_logging()
     try:
         print("🔧 Configurando base de conocimiento RAG...")
         
@@ -88,6 +110,9 @@ def train():
     - Permite optimizar el uso de herramientas RAG
     - Mantiene compatibilidad con CrewAI
     """
+    _configure_logging()
+    from rag_agent.crew import RagAgent
+    
     inputs = {
         "topic": "AI LLMs",
         'current_year': str(datetime.now().year)
@@ -103,6 +128,9 @@ def replay():
     """
     Replay the RAG crew execution from a specific task.
     """
+    _configure_logging()
+    from rag_agent.crew import RagAgent
+    
     try:
         print("🔄 Reproduciendo ejecución de RAG Agent...")
         RagAgent().crew().replay(task_id=sys.argv[1])
@@ -114,6 +142,9 @@ def test():
     """
     Test the RAG crew execution and returns the results.
     """
+    _configure_logging()
+    from rag_agent.crew import RagAgent
+    
     inputs = {
         "topic": "AI LLMs",
         "current_year": str(datetime.now().year)
@@ -135,10 +166,13 @@ def search_knowledge():
     - Útil para debugging y verificación
     - Proporciona interfaz simple para consultas
     """
+    _configure_logging()
     try:
-        from rag_agent.rag_client import RAGClient
+        # Solo el cliente RAG: sin CrewAI ni el LLM
+        from rag_agent.rag_client import get_rag_client
+        from rag_agent.resilience import BackendError
         
-        rag_client = RAGClient()
+        rag_client = get_rag_client()
         
         print("🔍 Búsqueda interactiva en la base de conocimiento")
         print("Escribe 'quit' para salir")
@@ -155,7 +189,12 @@ def search_knowledge():
                 continue
                 
             print(f"\n🔍 Buscando: {query}")
-            results = rag_client.search_similar(query, limit=3)
+            try:
+                results = rag_client.search_similar(query, limit=3)
+            except BackendError as e:
+                # Ollama/Qdrant no disponibles: no es lo mismo que "sin resultados"
+                print(f"❌ Backend no disponible: {e}")
+                continue
             
             if results:
                 print(f"📚 Encontrados {len(results)} resultados:")
@@ -170,6 +209,68 @@ def search_knowledge():
     except Exception as e:
         print(f"❌ Error en búsqueda: {e}")
 
+def answer_cache():
+    """
+    Show or clear the semantic answer cache.
+    
+    ¿Por qué un comando?
+    - Permite ver cuántas respuestas hay cacheadas
+    - `cache clear` descarta todas (p. ej. tras editar knowledge/ a mano)
+    """
+    _configure_logging()
+    try:
+        from rag_agent.answer_cache import get_answer_cache
+        
+        cache = get_answer_cache()
+        if cache is None:
+            print("⚠️ La caché de respuestas está desactivada (actívala con ANSWER_CACHE_ENABLED=true)")
+            return
+        
+        if len(sys.argv) > 2 and sys.argv[2].lower() == "clear":
+            cache.invalidate()
+            print("🧹 Caché de respuestas vaciada")
+            return
+        
+        stats = cache.stats()
+        print(f"📦 Caché de respuestas '{cache.collection_name}'")
+        print(f"   Entradas: {stats['entries']}")
+        print(f"   Umbral de similitud: {cache.threshold}")
+        print(f"   Ventana de frescura: {cache.ttl_seconds:.0f}s")
+        
+    except Exception as e:
+        print(f"❌ Error en la caché de respuestas: {e}")
+
+def export_knowledge():
+    """
+    Export the knowledge base to a portable snapshot (precomputed embeddings).
+    
+    ¿Por qué?
+    - Otro nodo o el CI importan los vectores en segundos, sin Ollama
+    """
+    _configure_logging()
+    from rag_agent.snapshot import main as snapshot_main
+    snapshot_main(["export", *sys.argv[2:]])
+
+def import_knowledge():
+    """
+    Import a snapshot without calling the embedding model.
+    """
+    _configure_logging()
+    from rag_agent.snapshot import main as snapshot_main
+    snapshot_main(["import", *sys.argv[2:]])
+
+def serve():
+    """
+    Run the resident retrieval service (one warm RAGClient for every crew).
+    
+    ¿Por qué?
+    - Los procesos de crew y el CLI no pagan clientes ni conexiones en frío
+    - Consultas idénticas simultáneas se resuelven con una sola búsqueda
+    """
+    _configure_logging()
+    from rag_agent.service import main as service_main
+    service_main(sys.argv[2:])
+
 def show_help():
     """
     Show available commands for the RAG system.
@@ -185,13 +286,20 @@ Comandos disponibles:
 
 📊 EJECUCIÓN:
   run                    - Ejecutar el sistema RAG completo
+  run_batch <archivo>    - Ejecutar muchos topics (JSONL/CSV) con crews concurrentes
   train <iterations> <file>   - Entrenar los agentes
   test <iterations> <model>   - Probar el sistema
   replay <task_id>       - Reproducir ejecución específica
 
 🔧 CONFIGURACIÓN:
   setup                  - Configurar base de conocimiento inicial
+  setup --full           - Re-ingestar todos los archivos de knowledge/
   search                 - Búsqueda interactiva en la base de conocimiento
+  cache                  - Estado de la caché semántica de respuestas
+  cache clear            - Vaciar la caché semántica de respuestas
+  export <directorio>    - Exportar la base de conocimiento (vectores float16 + payloads)
+  import <directorio>    - Importar un snapshot sin re-embeber (--replace vacía antes)
+  serve                  - Servicio de recuperación residente (ver RAG_SERVICE_URL)
 
 ❓ AYUDA:
   help                   - Mostrar esta ayuda
@@ -212,10 +320,20 @@ Comandos disponibles:
 if __name__ == "__main__":
     if len(sys.argv) > 1:
         command = sys.argv[1].lower()
-        if command == "setup":
+        if command == "run_batch":
+            run_batch()
+        elif command == "setup":
             setup_knowledge_base()
         elif command == "search":
             search_knowledge()
+        elif command == "cache":
+            answer_cache()
+        elif command == "export":
+            export_knowledge()
+        elif command == "import":
+            import_knowledge()
+        elif command == "serve":
+            serve()
         elif command == "help":
             show_help()
         else:
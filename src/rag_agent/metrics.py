@@ -0,0 +1,300 @@
+"""
+Instrumentación de la capa RAG: spans de tiempo, contadores y sinks
+
+¿Por qué instrumentar?
+- Saber si una ejecución lenta se va en embeddings, en Qdrant o en el LLM
+- Contadores de resultados, bytes y aciertos de caché para ajustar la configuración
+- Salida intercambiable: JSON lines (un evento por línea) o texto de Prometheus
+
+Uso:
+    with get_metrics().span("embedding", backend="ollama"):
+        ...
+    get_metrics().incr("search_results", 5)
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, Labels]
+
+# Muestras por span para percentiles (ventana de las más recientes)
+SAMPLE_WINDOW = 2048
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+
+class SpanStats:
+    """Conteo, suma, máximo y ventana de duraciones (segundos) de un span"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def add(self, seconds: float, error: bool = False):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.errors += int(error)
+        self.samples.append(seconds)
+
+    def percentiles(self) -> Dict[str, float]:
+        if not self.samples:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+        p50, p95, p99 = np.percentile(np.fromiter(self.samples, dtype=np.float64), [50, 95, 99])
+        return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+class MetricsSink:
+    """Destino de las métricas: eventos individuales y/o volcado del estado"""
+
+    def emit(self, event: Dict):
+        pass
+
+    def export(self, metrics: "Metrics"):
+        pass
+
+
+class JsonLinesSink(MetricsSink):
+    """Un objeto JSON por span/contador, añadido al archivo"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def emit(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def export(self, metrics: "Metrics"):
+        with self._lock:
+            self._file.flush()
+
+
+class PrometheusTextSink(MetricsSink):
+    """Escribe el estado completo en formato de exposición de Prometheus (textfile collector)"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def export(self, metrics: "Metrics"):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(metrics.prometheus_text(), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+
+
+class Metrics:
+    """
+    Registro de spans y contadores, seguro entre hilos
+
+    - span(nombre, **labels): mide la duración de un bloque (y si lanzó excepción)
+    - incr(nombre, valor, **labels): suma a un contador
+    - flush(): vuelca el estado a los sinks (Prometheus reescribe el archivo)
+    """
+
+    def __init__(self, sinks: Optional[List[MetricsSink]] = None, prefix: str = "rag"):
+        self.sinks = list(sinks or [])
+        self.prefix = prefix
+        self._spans: Dict[MetricKey, SpanStats] = {}
+        self._counters: Dict[MetricKey, float] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record_span(name, time.perf_counter() - start, error, **labels)
+
+    def record_span(self, name: str, seconds: float, error: bool = False, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            stats = self._spans.get(key)
+            if stats is None:
+                stats = self._spans[key] = SpanStats()
+            stats.add(seconds, error)
+        self._emit({"type": "span", "name": name, "labels": dict(key[1]),
+                    "seconds": round(seconds, 6), "error": error})
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if not value:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._emit({"type": "counter", "name": name, "labels": dict(key[1]), "value": value})
+
+    def _emit(self, event: Dict):
+        if not self.sinks:
+            return
+        event["ts"] = round(time.time(), 6)
+        for sink in self.sinks:
+            try:
+                sink.emit(event)
+            except Exception as e:
+                logger.warning("⚠️ Sink de métricas falló: %s", e)
+
+    def flush(self):
+        for sink in self.sinks:
+            try:
+                sink.export(self)
+            except Exception as e:
+                logger.warning("⚠️ Sink de métricas falló: %s", e)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """Estado actual como diccionarios (duraciones en segundos)"""
+        with self._lock:
+            spans = [(key, stats.count, stats.total, stats.max, stats.errors, stats.percentiles())
+                     for key, stats in self._spans.items()]
+            counters = list(self._counters.items())
+        return {
+            "spans": [
+                {"name": name, "labels": dict(labels), "count": count, "total": total,
+                 "max": max_, "errors": errors, **percentiles}
+                for (name, labels), count, total, max_, errors, percentiles in sorted(spans)
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters)
+            ],
+        }
+
+    def prometheus_text(self) -> str:
+        """Formato de exposición de Prometheus: spans como summary, contadores como counter"""
+        snapshot = self.snapshot()
+        lines = []
+        declared = set()
+
+        for span in snapshot["spans"]:
+            metric = f"{self.prefix}_{span['name']}_seconds"
+            labels = _labels(span["labels"])
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for quantile in ("0.5", "0.95", "0.99"):
+                value = span[{"0.5": "p50", "0.95": "p95", "0.99": "p99"}[quantile]]
+                quantile_labels = _format_labels(labels + (("quantile", quantile),))
+                lines.append(f"{metric}{{{quantile_labels}}} {value:.6f}")
+            suffix = f"{{{_format_labels(labels)}}}" if labels else ""
+            lines.append(f"{metric}_sum{suffix} {span['total']:.6f}")
+            lines.append(f"{metric}_count{suffix} {span['count']}")
+
+        for counter in snapshot["counters"]:
+            metric = f"{self.prefix}_{counter['name']}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            labels = _format_labels(_labels(counter["labels"]))
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{metric}{suffix} {counter['value']:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Reporte legible para imprimir al terminar un crew"""
+        snapshot = self.snapshot()
+        if not snapshot["spans"] and not snapshot["counters"]:
+            return "📊 Sin métricas registradas"
+
+        lines = ["📊 Métricas RAG", "=" * 60]
+        for span in snapshot["spans"]:
+            labels = _format_labels(_labels(span["labels"]))
+            name = f"{span['name']}{{{labels}}}" if labels else span["name"]
+            errors = f" | ❌ {span['errors']}" if span["errors"] else ""
+            lines.append(
+                f"⏱️ {name}: {span['count']}x | total {span['total']:.3f}s | "
+                f"p50 {span['p50'] * 1000:.1f}ms | p95 {span['p95'] * 1000:.1f}ms{errors}"
+            )
+        for counter in snapshot["counters"]:
+            labels = _format_labels(_labels(counter["labels"]))
+            name = f"{counter['name']}{{{labels}}}" if labels else counter["name"]
+            lines.append(f"🔢 {name}: {counter['value']:g}")
+        return "\n".join(lines)
+
+    @classmethod
+    def from_env(cls) -> "Metrics":
+        """
+        - METRICS_SINK: none (por defecto), jsonl o prometheus (admite "jsonl,prometheus")
+        - METRICS_JSONL_PATH: archivo JSON lines (por defecto .rag_cache/metrics.jsonl)
+        - METRICS_PROMETHEUS_PATH: archivo de exposición (por defecto .rag_cache/metrics.prom)
+        """
+        sinks: List[MetricsSink] = []
+        for name in os.getenv("METRICS_SINK", "none").lower().split(","):
+            name = name.strip()
+            if name == "jsonl":
+                sinks.append(JsonLinesSink(os.getenv("METRICS_JSONL_PATH", ".rag_cache/metrics.jsonl")))
+            elif name == "prometheus":
+                sinks.append(PrometheusTextSink(
+                    os.getenv("METRICS_PROMETHEUS_PATH", ".rag_cache/metrics.prom")
+                ))
+            elif name not in ("", "none"):
+                logger.warning("⚠️ METRICS_SINK desconocido: %s", name)
+        return cls(sinks)
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Registro de métricas del proceso (se crea desde el entorno la primera vez)"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics.from_env()
+    return _metrics
+
+
+def set_metrics(metrics: Optional[Metrics]):
+    """Reemplaza el registro global (None = volver a crearlo desde el entorno)"""
+    global _metrics
+    with _metrics_lock:
+        _metrics = metrics
+
+
+def configure_logging(level: Optional[str] = None):
+    """
+    Logging para los comandos de consola (LOG_LEVEL, por defecto INFO)
+
+    Los módulos usan logging.getLogger(__name__); sin esta llamada una
+    aplicación que importe rag_agent decide su propia configuración.
+    """
+    logging.basicConfig(
+        level=(level or os.getenv("LOG_LEVEL", "INFO")).upper(),
+        format="%(message)s"
+    )
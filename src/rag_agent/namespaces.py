@@ -0,0 +1,123 @@
+"""
+Espacios de nombres (namespaces): una colección por equipo o cliente
+
+¿Por qué varias colecciones en lugar de una enorme?
+- Cada equipo o tenant tiene su propia base de conocimiento aislada
+- El coste del índice HNSW de una colección no crece con los datos de los demás
+- Una consulta puede buscar en varios namespaces a la vez (en paralelo) y
+  combinar los resultados en un único top-k
+
+¿Cómo se combinan los scores?
+- Por defecto se comparan los scores brutos: con el mismo modelo y métrica
+  son comparables, y un namespace sin nada relevante no cuela resultados
+- minmax o zscore (opcionales) reescalan cada namespace a su propia
+  distribución: útil si las colecciones usan modelos distintos, pero el
+  mejor resultado de cada namespace vale lo mismo aunque sea irrelevante
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+DEFAULT_NAMESPACE = "default"
+NORMALIZATIONS = ("minmax", "zscore", "none")
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def parse_namespaces(spec: str) -> Dict[str, str]:
+    """"equipo_a=kb_equipo_a,cliente_42=kb_cliente_42" -> {namespace: colección}"""
+    collections = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        namespace, _, collection = item.partition("=")
+        collections[namespace.strip()] = collection.strip() or namespace.strip()
+    return collections
+
+
+@dataclass
+class NamespaceConfig:
+    """
+    Mapeo namespace -> colección
+
+    - "default" es siempre la colección base (QDRANT_COLLECTION_NAME)
+    - Los namespaces de RAG_NAMESPACES usan la colección indicada
+    - Cualquier otro namespace usa "<colección base>_<namespace>" (un tenant
+      nuevo no necesita cambiar la configuración)
+    """
+    base_collection: str
+    collections: Dict[str, str] = field(default_factory=dict)
+    normalization: str = "none"
+
+    def __post_init__(self):
+        self.normalization = self.normalization.lower()
+        if self.normalization not in NORMALIZATIONS:
+            raise ValueError(f"NAMESPACE_SCORE_NORMALIZATION desconocida: {self.normalization}")
+
+    @classmethod
+    def from_env(cls, base_collection: str) -> "NamespaceConfig":
+        """
+        - RAG_NAMESPACES: "namespace=colección,..." (opcional)
+        - NAMESPACE_SCORE_NORMALIZATION: none (scores brutos, por defecto), minmax o zscore
+        """
+        return cls(
+            base_collection=base_collection,
+            collections=parse_namespaces(os.getenv("RAG_NAMESPACES", "")),
+            normalization=os.getenv("NAMESPACE_SCORE_NORMALIZATION", "none"),
+        )
+
+    def collection_for(self, namespace: str) -> str:
+        if namespace == DEFAULT_NAMESPACE:
+            return self.base_collection
+        if namespace in self.collections:
+            return self.collections[namespace]
+        if not _NAME_RE.match(namespace):
+            raise ValueError(f"Namespace inválido: {namespace!r}")
+        return f"{self.base_collection}_{namespace}"
+
+
+def normalize_scores(scores: Sequence[float], method: str = "none",
+                     higher_is_better: bool = True) -> List[float]:
+    """
+    Scores de un namespace llevados a una escala común (mayor es mejor)
+
+    - minmax: el mejor resultado vale 1 y el peor 0 (un solo resultado vale 1)
+    - zscore: desviaciones respecto a la media del namespace
+    - none: el score original (con euclid, negado para que mayor sea mejor)
+    """
+    values = [float(score) if higher_is_better else -float(score) for score in scores]
+    if method == "none" or not values:
+        return values
+    if method == "minmax":
+        low, high = min(values), max(values)
+        if high - low < 1e-12:
+            return [1.0 for _ in values]
+        return [(value - low) / (high - low) for value in values]
+    mean = sum(values) / len(values)
+    std = (sum((value - mean) ** 2 for value in values) / len(values)) ** 0.5
+    if std < 1e-12:
+        return [0.0 for _ in values]
+    return [(value - mean) / std for value in values]
+
+
+def merge_hits(hits_by_namespace: Dict[str, List[Dict]], limit: int, method: str = "none",
+               higher_is_better: bool = True) -> List[Dict]:
+    """
+    Top-k global a partir de los resultados de cada namespace
+
+    Cada resultado conserva su score original en "raw_score" e indica su
+    "namespace". Con minmax o zscore su "score" pasa a ser el normalizado;
+    con none se ordena por el score llevado a "mayor es mejor" pero se muestra
+    el original (con euclid, la distancia y no su negación).
+    """
+    merged = []
+    for namespace, hits in hits_by_namespace.items():
+        ranks = normalize_scores([hit["score"] for hit in hits], method, higher_is_better)
+        for hit, rank in zip(hits, ranks):
+            score = hit["score"] if method == "none" else rank
+            merged.append(({**hit, "namespace": namespace, "raw_score": hit["score"], "score": score}, rank))
+    # Orden estable: a igual score, el namespace pedido primero
+    merged.sort(key=lambda item: item[1], reverse=True)
+    return [hit for hit, _ in merged[:limit]]
@@ -0,0 +1,93 @@
+"""
+Modo retrieval-first: recuperar el contexto antes del kickoff
+
+¿Por qué recuperar antes?
+- Sin contexto previo, cada agente gasta al menos un turno del LLM en decidir
+  llamar a rag_search/get_rag_context antes de recuperar nada
+- El topic (y las subconsultas) se conocen antes de empezar: la recuperación
+  puede hacerse en paralelo y llegar ya empaquetada en los inputs de las tareas
+- Los agentes responden en una pasada y solo usan herramientas para detalles
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Union
+
+from .context_packer import EMPTY_CONTEXT_MESSAGE, NO_RESULTS_MESSAGE
+from .metrics import get_metrics
+from .rag_client import RAGClient, get_rag_client
+
+logger = logging.getLogger(__name__)
+
+# Texto para {rag_context} cuando no hay contexto precargado
+NO_PREFETCHED_CONTEXT = "(No prefetched context: use the RAG tools as described below.)"
+
+
+def retrieval_first_enabled() -> bool:
+    """RETRIEVAL_FIRST: "true" activa la recuperación previa (desactivada por defecto)"""
+    return os.getenv("RETRIEVAL_FIRST", "false").lower() in ("1", "true", "yes")
+
+
+def prefetch_queries(inputs: Dict[str, object]) -> List[str]:
+    """
+    Consultas a recuperar: el topic (o question) y las subconsultas opcionales
+
+    sub_queries puede ser una lista o un texto separado por ";" o saltos de línea.
+    """
+    queries = [str(inputs.get("question") or inputs.get("topic") or "").strip()]
+    sub_queries: Union[str, Sequence[str]] = inputs.get("sub_queries") or []
+    if isinstance(sub_queries, str):
+        sub_queries = sub_queries.replace("\n", ";").split(";")
+    queries.extend(str(query).strip() for query in sub_queries)
+
+    # Sin vacíos ni repetidos, respetando el orden
+    return list(dict.fromkeys(query for query in queries if query))
+
+
+def prefetch_context(queries: Sequence[str], max_tokens: Optional[int] = None,
+                     rag_client: Optional[RAGClient] = None) -> str:
+    """
+    Recupera y empaqueta el contexto de todas las consultas en paralelo
+
+    - Un único lote de embeddings para todas las consultas (queda en la caché)
+    - Una búsqueda + empaquetado por consulta en hilos, con el presupuesto
+      total de tokens repartido entre ellas
+    """
+    if not queries:
+        return ""
+    rag_client = rag_client or get_rag_client()
+    max_tokens = max_tokens or int(os.getenv("RETRIEVAL_FIRST_MAX_TOKENS", "1500"))
+    per_query_tokens = max(max_tokens // len(queries), 1)
+
+    metrics = get_metrics()
+    with metrics.span("prefetch", queries=len(queries)):
+        try:
+            # Calienta la caché de embeddings con una sola llamada a Ollama
+            rag_client.get_embeddings(list(queries))
+        except Exception as e:
+            logger.warning("⚠️ Error precalculando embeddings: %s", e)
+
+        def fetch(query: str) -> str:
+            try:
+                return rag_client.get_context_for_query(query, max_tokens=per_query_tokens)
+            except Exception as e:
+                # Los agentes aún pueden usar las herramientas durante la ejecución
+                logger.warning("⚠️ Error recuperando contexto para '%s': %s", query, e)
+                return ""
+
+        with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+            contexts = list(executor.map(fetch, queries))
+
+    if len(queries) == 1:
+        return contexts[0]
+
+    sections = []
+    seen = {NO_RESULTS_MESSAGE, EMPTY_CONTEXT_MESSAGE}
+    for query, context in zip(queries, contexts):
+        # Las subconsultas suelen devolver el mismo contexto que el topic
+        if not context.strip() or context in seen:
+            continue
+        seen.add(context)
+        sections.append(f"### {query}\n{context}")
+    return "\n\n".join(sections) if sections else contexts[0]
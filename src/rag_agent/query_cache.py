@@ -0,0 +1,143 @@
+"""
+Caché de resultados de búsqueda y contexto
+
+¿Por qué cachear resultados?
+- Los agentes de un mismo crew repiten consultas idénticas o casi idénticas
+- Cada repetición cuesta un embedding y una búsqueda en Qdrant
+- Un contador de generación invalida todo al instante cuando alguien escribe
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+# Generación compartida por colección: cualquier cliente (síncrono o async)
+# invalida las cachés de una colección sin construir un RAGClient
+_collection_generations: Dict[str, int] = {}
+_collection_generations_lock = threading.Lock()
+
+
+def bump_collection_generation(collection_name: str):
+    """La colección cambió: deja obsoletas las entradas de todas sus cachés"""
+    with _collection_generations_lock:
+        _collection_generations[collection_name] = _collection_generations.get(collection_name, 0) + 1
+
+
+def make_key(*parts: Any) -> str:
+    """Clave estable a partir de los parámetros de la consulta (incluye filtros)"""
+    return json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+
+
+class QueryCache:
+    """
+    Caché LRU con TTL y contador de generación de la colección
+
+    ¿Cómo se invalida?
+    - Cada entrada guarda la generación en que se calculó
+    - bump_generation() (llamado al escribir en la colección) deja obsoletas todas
+    - Con `collection` la generación es la compartida de esa colección
+      (ver bump_collection_generation)
+    - Las entradas expiran además tras ttl_seconds, por si otro proceso escribe
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0,
+                 collection: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self._generation = 0
+
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.expired = 0
+
+    @property
+    def generation(self) -> int:
+        if self.collection is None:
+            return self._generation
+        return _collection_generations.get(self.collection, 0)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            generation, stored_at, value = entry
+            if generation != self.generation:
+                self.stale += 1
+                self.misses += 1
+                del self._entries[key]
+                return default
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                self.expired += 1
+                self.misses += 1
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """
+        Guarda un resultado
+
+        `generation` es la generación leída antes de calcular el resultado: si
+        hubo una escritura mientras tanto, el resultado ya es viejo y no se guarda.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (self.generation, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump_generation(self):
+        """Invalida todos los resultados (la colección cambió)"""
+        with self._lock:
+            if self.collection is None:
+                self._generation += 1
+            else:
+                bump_collection_generation(self.collection)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Tasas de acierto para ajustar tamaño y TTL"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "expired": self.expired,
+                "entries": len(self._entries),
+                "generation": self.generation,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    @classmethod
+    def from_env(cls, collection: Optional[str] = None) -> Optional["QueryCache"]:
+        """
+        - QUERY_CACHE_ENABLED: "false" desactiva la caché
+        - QUERY_CACHE_SIZE: entradas máximas
+        - QUERY_CACHE_TTL: segundos de validez de cada entrada
+        """
+        if os.getenv("QUERY_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+            return None
+        return cls(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.getenv("QUERY_CACHE_TTL", "300")),
+            collection=collection,
+        )
@@ -1,14 +1,68 @@
 import os
+import copy
+import hashlib
+import logging
+import threading
 import requests
 import json
 import numpy as np
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple
+from requests.adapters import HTTPAdapter
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter
+from qdrant_client.models import SearchParams
 from dotenv import load_dotenv
+from .collection_config import CollectionConfig
+from .context_packer import ContextConfig, build_context, resolve_max_tokens
+from .dedup import DedupConfig, WriteResult, cosine_hits, merge_metadata
+from .embedding_cache import EmbeddingCache
+from .metrics import get_metrics
+from .namespaces import DEFAULT_NAMESPACE, NamespaceConfig, merge_hits
+from .query_cache import QueryCache, make_key
+from .resilience import BackendError, Resilience, TransientError
+from .search_filter import SearchFilter
+from .vector_store import (
+    NumpyVectorStore, QdrantVectorStore, VectorStore, normalize_point_id
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Solo se duplican (hedging) peticiones pequeñas: consultas, no cargas masivas
+HEDGE_MAX_TEXTS = 8
+
+# Registro de clientes compartidos a nivel de proceso
+_shared_clients: Dict[tuple, "RAGClient"] = {}
+_shared_clients_lock = threading.Lock()
+
+def document_id(text: str) -> str:
+    """ID único basado en hash del texto"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+@dataclass
+class FailedDocument:
+    """Documento que no se pudo añadir en add_documents"""
+    index: int
+    id: str
+    error: str
+
+@dataclass
+class AddDocumentsResult:
+    """Resultado estructurado de una carga masiva"""
+    ids: List[str] = field(default_factory=list)
+    failed: List[FailedDocument] = field(default_factory=list)
+    
+    @property
+    def added(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
 class RAGClient:
     """
     Cliente RAG que integra Ollama (LLM + Embeddings) con Qdrant (Vector DB)
@@ -23,43 +77,291 @@ class RAGClient:
         # Configuración de Ollama
         self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self.embedding_model = os.getenv("EMBEDDING_MODEL", "nomic-embed-text:latest")
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        
+        # Timeouts (conexión, lectura) de cada petición a Ollama
+        # ¿Por qué ambos?
+        # - connect corto: un Ollama apagado se detecta en segundos
+        # - read largo (OLLAMA_TIMEOUT): un lote grande puede tardar en embeberse
+        self.ollama_timeout = (
+            float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+            float(os.getenv("OLLAMA_TIMEOUT", "60"))
+        )
         
-        # Configuración de Qdrant
+        # Sesión HTTP persistente (keep-alive) para Ollama
+        # ¿Por qué una sesión?
+        # - Reutiliza conexiones TCP en lugar de abrir una por petición
+        # - El pool evita el coste de handshake en cargas masivas
+        self.http_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.http_session.mount("http://", adapter)
+        self.http_session.mount("https://", adapter)
+        
+        # Caché de embeddings (memoria + disco), clave = (modelo, hash del texto)
+        self.embedding_cache = EmbeddingCache.from_env(self.embedding_model)
+        
+        # Configuración de Qdrant / backend vectorial
         self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
         self.collection_name = os.getenv("QDRANT_COLLECTION_NAME", "knowledge_base")
         
-        # Inicializar clientes
-        self.qdrant_client = QdrantClient(url=self.qdrant_url)
+        # Caché de resultados de búsqueda/contexto, invalidada al escribir en la colección
+        self.query_cache = QueryCache.from_env(self.collection_name)
+        
+        self.vector_backend = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+        self.collection_config = CollectionConfig.from_env()
+        self.context_config = ContextConfig.from_env()
         
-        # Crear colección si no existe
-        self._ensure_collection_exists()
+        # Reintentos con backoff + circuit breaker por backend (ver resilience.py)
+        self.ollama_resilience = Resilience.from_env("ollama", "OLLAMA")
+        self.vector_resilience = Resilience.from_env(self.vector_backend, "QDRANT")
+        
+        # Namespaces: una colección por equipo/tenant (ver namespace_client)
+        self.namespace = DEFAULT_NAMESPACE
+        self.namespace_config = NamespaceConfig.from_env(self.collection_name)
+        self._namespace_clients: Dict[str, "RAGClient"] = {}
+        
+        # Supresión de casi-duplicados en add_document_unique
+        self.dedup_config = DedupConfig.from_env()
+        self.dedup_stats = {"added": 0, "skipped": 0, "merged": 0, "replaced": 0}
+        
+        # El backend y la verificación de colección se inicializan
+        # de forma perezosa en el primer acceso (ver propiedad vector_store)
+        self._vector_store: Optional[VectorStore] = None
+        self._collection_ready = False
+        # Los namespaces crean su colección en la primera escritura, no al leer
+        self._create_on_read = True
+        self._init_lock = threading.RLock()
     
-    def _ensure_collection_exists(self):
+    @property
+    def vector_store(self) -> VectorStore:
         """
-        Crea la colección en Qdrant si no existe
+        Backend vectorial creado en el primer uso
         
-        ¿Por qué 768 dimensiones?
-        - nomic-embed-text genera vectores de 768 dimensiones
-        - Distance.COSINE: mejor para similitud semántica en embeddings de texto
+        ¿Por qué perezoso?
+        - Crear el cliente y verificar la colección cuesta un round trip
+        - Se hace una sola vez por cliente y el resultado queda cacheado
+        - El lock evita inicializaciones duplicadas entre hilos
+        
+        En un namespace la colección no se crea aquí (ver _writable_store).
+        """
+        if not self._collection_ready:
+            with self._init_lock:
+                if self._vector_store is None:
+                    self._vector_store = self._create_vector_store()
+                if not self._collection_ready and self._create_on_read:
+                    self._collection_ready = self._ensure_collection_exists()
+        return self._vector_store
+    
+    def _writable_store(self) -> VectorStore:
+        """Backend listo para escribir: crea la colección si aún no existe"""
+        store = self.vector_store
+        if not self._collection_ready:
+            with self._init_lock:
+                if not self._collection_ready:
+                    self._collection_ready = self._ensure_collection_exists()
+        return store
+    
+    def _collection_available(self) -> bool:
+        """
+        True si la colección existe (y queda lista para leer); nunca la crea
+        
+        ¿Por qué?
+        - Buscar en un namespace desconocido no debe crear su colección ni sus
+          índices de payload: sin escrituras cuenta como vacío
+        """
+        if self._collection_ready:
+            return True
+        with self._init_lock:
+            if not self._collection_ready:
+                store = self.vector_store
+                if self.vector_resilience.call(store.exists):
+                    self._collection_ready = self._ensure_collection_exists()
+        return self._collection_ready
+    
+    @vector_store.setter
+    def vector_store(self, store: VectorStore):
+        with self._init_lock:
+            self._vector_store = store
+            self._collection_ready = False
+    
+    def _create_vector_store(self) -> VectorStore:
+        """
+        Crea el backend según VECTOR_BACKEND
+        
+        - qdrant (por defecto): servidor en QDRANT_URL; QDRANT_URL=:memory: o
+          QDRANT_PATH=<directorio> usan el modo local de qdrant-client
+        - numpy: búsqueda exacta embebida, persistida en NUMPY_STORE_PATH
+        """
+        if self.vector_backend == "numpy":
+            return NumpyVectorStore.shared(
+                self.collection_name,
+                path=os.getenv("NUMPY_STORE_PATH", ".rag_cache/numpy_store") or None
+            )
+        if self.vector_backend != "qdrant":
+            raise ValueError(f"VECTOR_BACKEND desconocido: {self.vector_backend}")
+        
+        qdrant_path = os.getenv("QDRANT_PATH")
+        if qdrant_path:
+            client = QdrantClient(path=qdrant_path)
+        elif self.qdrant_url == ":memory:":
+            client = QdrantClient(location=":memory:")
+        else:
+            client = QdrantClient(url=self.qdrant_url, timeout=int(os.getenv("QDRANT_TIMEOUT", "10")))
+        return QdrantVectorStore(client, self.collection_name)
+    
+    def collection_store(self, collection_name: str) -> VectorStore:
+        """
+        Store de otra colección en el mismo backend (p. ej. la caché de respuestas)
+        
+        Reutiliza la conexión de Qdrant o el directorio de NumPy; la colección
+        no se crea aquí (ver VectorStore.ensure_collection).
+        """
+        return self.vector_store.for_collection(collection_name)
+    
+    def namespace_client(self, namespace: str) -> "RAGClient":
+        """
+        Cliente ligado a la colección de un namespace (equipo o tenant)
+        
+        ¿Por qué un cliente por namespace?
+        - Escrituras, deduplicación y caché de consultas quedan aisladas por colección
+        - Comparte la sesión HTTP, la caché de embeddings, los circuit breakers
+          y la conexión al backend con este cliente
+        """
+        collection_name = self.namespace_config.collection_for(namespace)
+        if collection_name == self.collection_name:
+            return self
+        with self._init_lock:
+            client = self._namespace_clients.get(namespace)
+            if client is None:
+                client = copy.copy(self)
+                client.namespace = namespace
+                client.collection_name = collection_name
+                client.query_cache = QueryCache.from_env(collection_name)
+                client.dedup_stats = dict.fromkeys(self.dedup_stats, 0)
+                client._namespace_clients = {}
+                client._vector_store = self.vector_store.for_collection(collection_name)
+                client._collection_ready = False
+                client._create_on_read = False
+                client._init_lock = threading.RLock()
+                self._namespace_clients[namespace] = client
+        return client
+    
+    @property
+    def qdrant_client(self) -> QdrantClient:
+        """Cliente de Qdrant subyacente (solo con VECTOR_BACKEND=qdrant)"""
+        store = self.vector_store
+        if not isinstance(store, QdrantVectorStore):
+            raise AttributeError(f"El backend '{self.vector_backend}' no usa Qdrant")
+        return store.client
+    
+    @qdrant_client.setter
+    def qdrant_client(self, client: QdrantClient):
+        self.vector_store = QdrantVectorStore(client, self.collection_name)
+    
+    def _ensure_collection_exists(self) -> bool:
+        """
+        Crea la colección si no existe con el esquema de CollectionConfig
+        (dimensión, métrica, cuantización, HNSW, vectores/payload en disco)
+        
+        Retorna True si la colección está lista para usarse.
         """
         try:
-            collections = self.qdrant_client.get_collections()
-            collection_names = [col.name for col in collections.collections]
-            
-            if self.collection_name not in collection_names:
-                self.qdrant_client.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=768,  # Dimensión de nomic-embed-text
-                        distance=Distance.COSINE
-                    )
-                )
-                print(f"✅ Colección '{self.collection_name}' creada en Qdrant")
+            created = self.vector_resilience.call(
+                lambda: self._vector_store.ensure_collection(self.collection_config)
+            )
+            if created:
+                logger.info("✅ Colección '%s' creada (%s)", self.collection_name, self.vector_backend)
             else:
-                print(f"✅ Colección '{self.collection_name}' ya existe")
+                logger.debug("✅ Colección '%s' ya existe", self.collection_name)
+            return True
                 
         except Exception as e:
-            print(f"❌ Error al crear/verificar colección: {e}")
+            logger.error("❌ Error al crear/verificar colección: %s", e)
+            return False
+    
+    def get_embeddings(self, texts: Sequence[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Genera embeddings para varios textos usando el endpoint multi-input de Ollama
+        
+        ¿Por qué en lotes?
+        - /api/embed acepta una lista en "input": un solo round trip para muchos textos
+        - La sesión keep-alive reutiliza la conexión entre lotes
+        - batch_size acota el tamaño de cada petición (EMBEDDING_BATCH_SIZE)
+        - Los textos ya presentes en la caché de embeddings no se reenvían
+        
+        Retorna una matriz float32 de forma (len(texts), dimensión).
+        Lanza BackendError si Ollama falla tras los reintentos (un fallo no
+        se confunde con "sin resultados").
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        metrics = get_metrics()
+        metrics.incr("embedding_texts", len(texts))
+        with metrics.span("embedding"):
+            if self.embedding_cache is None:
+                return self._fetch_embeddings(texts, batch_size)
+            
+            # Solo se piden a Ollama los textos que no están en caché
+            cached = self.embedding_cache.get_many(texts)
+            missing = list(dict.fromkeys(
+                text for text, vector in zip(texts, cached) if vector is None
+            ))
+            metrics.incr("embedding_cache_hits", len(texts) - sum(vector is None for vector in cached))
+            
+            fetched = {}
+            if missing:
+                embeddings = self._fetch_embeddings(missing, batch_size)
+                self.embedding_cache.put_many(missing, embeddings)
+                fetched = dict(zip(missing, embeddings))
+            
+            return np.vstack([
+                vector if vector is not None else fetched[text]
+                for text, vector in zip(texts, cached)
+            ])
+    
+    def _fetch_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """Llama a /api/embed en lotes de batch_size (con reintentos; BackendError si falla)"""
+        batch_size = batch_size or self.embedding_batch_size
+        
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            batches.append(self.ollama_resilience.call(
+                lambda: self._embed_batch(batch),
+                hedge=len(batch) <= HEDGE_MAX_TEXTS
+            ))
+        
+        return np.vstack(batches)
+    
+    def _embed_batch(self, batch: List[str]) -> np.ndarray:
+        """Una petición a /api/embed con timeouts de conexión y lectura"""
+        metrics = get_metrics()
+        with metrics.span("ollama_embed"):
+            response = self.http_session.post(
+                f"{self.ollama_base_url}/api/embed",
+                json={
+                    "model": self.embedding_model,
+                    "input": batch
+                },
+                timeout=self.ollama_timeout
+            )
+        metrics.incr("ollama_requests")
+        metrics.incr("ollama_response_bytes", len(response.content))
+        
+        if response.status_code >= 500 or response.status_code == 429:
+            raise TransientError(f"Error en Ollama: {response.status_code}")
+        if response.status_code != 200:
+            # 4xx (p. ej. modelo no descargado): reintentar no sirve
+            raise BackendError(f"Error en Ollama: {response.status_code}")
+        
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(batch):
+            raise BackendError(
+                f"Ollama devolvió {len(embeddings)} embeddings para {len(batch)} textos"
+            )
+        return np.asarray(embeddings, dtype=np.float32)
     
     def get_embedding(self, text: str) -> List[float]:
         """
@@ -70,36 +372,27 @@ class RAGClient:
         - nomic-embed-text está optimizado para RAG
         - Consistencia con el stack local
         """
-        try:
-            response = requests.post(
-                f"{self.ollama_base_url}/api/embeddings",
-                json={
-                    "model": self.embedding_model,
-                    "prompt": text
-                }
-            )
-            
-            if response.status_code == 200:
-                embedding = response.json()["embedding"]
-                return embedding
-            else:
-                raise Exception(f"Error en Ollama: {response.status_code}")
-                
-        except Exception as e:
-            print(f"❌ Error generando embedding: {e}")
-            return []
+        return self.get_embeddings([text])[0].tolist()
     
-    def add_document(self, text: str, metadata: Dict[str, Any] = None) -> bool:
+    def add_document(self, text: str, metadata: Dict[str, Any] = None,
+                     embedding: Optional[Sequence[float]] = None,
+                     point_id: Optional[str] = None) -> bool:
         """
         Añade un documento a la base de conocimiento
         
         ¿Por qué incluir metadata?
         - Permite filtros más específicos en búsquedas
         - Útil para tracking de fuentes, fechas, categorías
+        
+        Si se pasa `embedding` (p. ej. calculado con get_embeddings en lote)
+        no se vuelve a llamar a Ollama. `point_id` permite fijar el ID (p. ej.
+        para fragmentos cuyo texto puede repetirse en varios archivos).
         """
         try:
             # Generar embedding
-            embedding = self.get_embedding(text)
+            if embedding is None:
+                embedding = self.get_embeddings([text])[0]
+            embedding = [float(value) for value in embedding]
             if not embedding:
                 return False
             
@@ -110,93 +403,526 @@ class RAGClient:
             }
             
             # Generar ID único basado en hash del texto
-            import hashlib
-            doc_id = hashlib.md5(text.encode()).hexdigest()
+            doc_id = point_id or document_id(text)
             
-            # Insertar en Qdrant
-            point = PointStruct(
-                id=doc_id,
-                vector=embedding,
-                payload=payload
-            )
-            
-            self.qdrant_client.upsert(
-                collection_name=self.collection_name,
-                points=[point]
-            )
+            # Insertar en el backend vectorial
+            self._upsert([doc_id], [embedding], [payload])
+            self._invalidate_query_cache()
             
-            print(f"✅ Documento añadido con ID: {doc_id}")
+            logger.info("✅ Documento añadido con ID: %s", doc_id)
             return True
             
         except Exception as e:
-            print(f"❌ Error añadiendo documento: {e}")
+            logger.error("❌ Error añadiendo documento: %s", e)
             return False
     
-    def search_similar(self, query: str, limit: int = 5, score_threshold: float = 0.4) -> List[Dict]:
+    def add_document_unique(self, text: str, metadata: Dict[str, Any] = None) -> WriteResult:
         """
-        Busca documentos similares usando búsqueda vectorial
+        Añade un documento salvo que ya exista uno casi idéntico
         
-        ¿Por qué estos parámetros?
-        - limit=5: Balance entre contexto y velocidad
-        - score_threshold=0.7: Filtro de calidad para evitar resultados irrelevantes
+        ¿Cómo se decide?
+        - Se busca el punto más parecido con el mismo embedding que se escribiría
+        - Si supera DEDUP_THRESHOLD (y el SimHash, si DEDUP_SIMHASH) es duplicado
+        - DEDUP_MODE: skip no escribe, merge combina los metadatos en el punto
+          existente y replace sustituye el punto por el texto nuevo
         """
+        return self.add_documents_unique([(text, metadata)])[0]
+    
+    def add_documents_unique(self, documents: Sequence[Tuple[str, Optional[Dict[str, Any]]]]
+                             ) -> List[WriteResult]:
+        """
+        Versión por lotes de add_document_unique (un embedding, una búsqueda y un upsert)
+        
+        Los documentos del lote también se comparan entre sí: el segundo de dos
+        textos casi idénticos cuenta como duplicado del primero.
+        """
+        documents = [(text, metadata or {}) for text, metadata in documents]
+        if not documents:
+            return []
+        config = self.dedup_config
+        
         try:
-            # Generar embedding de la consulta
-            query_embedding = self.get_embedding(query)
-            if not query_embedding:
-                return []
+            embeddings = self.get_embeddings([text for text, _ in documents])
             
-            # Búsqueda en Qdrant
-            search_result = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=limit,
-                score_threshold=score_threshold
-            )
+            if config.enabled:
+                # Con euclidean el score es una distancia: se re-puntúa con coseno
+                euclid = self.collection_config.distance == "euclid"
+                all_hits = self._vector_search(
+                    embeddings,
+                    config.candidates,
+                    None if euclid else config.threshold,
+                    None,
+                    with_vectors=euclid or config.mode == "merge"
+                )
+                if euclid:
+                    all_hits = [cosine_hits(embedding, hits) for embedding, hits in zip(embeddings, all_hits)]
+            else:
+                all_hits = [[] for _ in documents]
+            unit_vectors = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
             
-            # Formatear resultados
-            results = []
-            for hit in search_result:
-                results.append({
-                    "text": hit.payload.get("text", ""),
-                    "metadata": hit.payload.get("metadata", {}),
-                    "score": hit.score,
-                    "id": hit.id
-                })
+            # Puntos a escribir en un solo upsert (ID -> posición) e IDs a borrar
+            ids: List[str] = []
+            vectors: List[Any] = []
+            payloads: List[Dict] = []
+            rows: List[int] = []
+            positions: Dict[str, int] = {}
+            stale_ids: List[str] = []
+            results: List[WriteResult] = []
             
-            print(f"✅ Encontrados {len(results)} documentos similares")
-            return results
+            for i, (text, metadata) in enumerate(documents):
+                doc_id = normalize_point_id(document_id(text))
+                duplicate = None
+                if config.enabled:
+                    # Primero contra los documentos nuevos de este mismo lote
+                    similarities = unit_vectors[rows] @ unit_vectors[i] if rows else []
+                    batch_hits = sorted(
+                        ({"id": ids[k], "text": payloads[k]["text"], "metadata": payloads[k]["metadata"],
+                          "vector": vectors[k], "score": float(similarities[k])}
+                         for k in range(len(rows)) if rows[k] >= 0),
+                        key=lambda hit: hit["score"], reverse=True
+                    )
+                    duplicate = config.find_duplicate(text, batch_hits) or \
+                        config.find_duplicate(text, all_hits[i])
+                
+                if duplicate is None:
+                    positions[doc_id] = len(ids)
+                    ids.append(doc_id)
+                    vectors.append(embeddings[i])
+                    payloads.append({"text": text, "metadata": metadata})
+                    rows.append(i)
+                    results.append(WriteResult("added", doc_id))
+                    continue
+                
+                result = WriteResult("skipped", duplicate["id"], duplicate["id"], duplicate["score"])
+                position = positions.get(duplicate["id"])
+                if config.mode == "merge":
+                    if position is None:
+                        positions[duplicate["id"]] = position = len(ids)
+                        ids.append(duplicate["id"])
+                        vectors.append(duplicate["vector"])
+                        payloads.append({"text": duplicate["text"], "metadata": duplicate["metadata"]})
+                        # Punto ya existente: no participa en la comparación dentro del lote
+                        rows.append(-1)
+                    payloads[position]["metadata"] = merge_metadata(payloads[position]["metadata"], metadata)
+                    result.action = "merged"
+                elif config.mode == "replace":
+                    if position is None:
+                        if duplicate["id"] != doc_id:
+                            stale_ids.append(duplicate["id"])
+                        position = len(ids)
+                        ids.append(doc_id)
+                        vectors.append(embeddings[i])
+                        payloads.append({"text": text, "metadata": metadata})
+                        rows.append(i)
+                    else:
+                        # Reemplaza al pendiente del lote antes de escribirlo
+                        del positions[ids[position]]
+                        ids[position], vectors[position], rows[position] = doc_id, embeddings[i], i
+                        payloads[position] = {"text": text, "metadata": metadata}
+                    positions[doc_id] = position
+                    result.action, result.point_id = "replaced", doc_id
+                results.append(result)
+            
+            if ids:
+                self._upsert(ids, vectors, payloads)
+            stale_ids = [point_id for point_id in stale_ids if point_id not in positions]
+            if stale_ids:
+                self.vector_resilience.call(lambda: self.vector_store.delete(stale_ids))
+            if ids or stale_ids:
+                self._invalidate_query_cache()
             
         except Exception as e:
-            print(f"❌ Error en búsqueda: {e}")
-            return []
+            logger.error("❌ Error añadiendo documentos: %s", e)
+            return [WriteResult("failed") for _ in documents]
+        
+        metrics = get_metrics()
+        for result in results:
+            self.dedup_stats[result.action] += 1
+            if result.duplicate:
+                metrics.incr("duplicates_avoided", action=result.action)
+                logger.info("♻️ Duplicado de %s (similitud %.3f): %s",
+                            result.duplicate_of, result.score, result.action)
+        logger.info("✅ %d documentos escritos", len(ids))
+        return results
+    
+    @property
+    def duplicates_avoided(self) -> int:
+        """Escrituras que no crearon un punto nuevo por ser casi-duplicados"""
+        return self.dedup_stats["skipped"] + self.dedup_stats["merged"] + self.dedup_stats["replaced"]
     
-    def get_context_for_query(self, query: str, max_context_length: int = 2000) -> str:
+    def add_documents(self, documents: Iterable[Tuple], batch_size: Optional[int] = None,
+                      wait: bool = True, parallel: int = 1) -> AddDocumentsResult:
         """
-        Obtiene contexto relevante para una consulta (función principal de RAG)
+        Añade muchos documentos con embeddings y upserts por lotes
+        
+        ¿Por qué una API masiva?
+        - Un upsert por documento convierte la ingesta en miles de round trips
+        - Cada lote se embebe con una sola petición y se escribe con un solo upsert
+        - Con parallel > 1 los upserts corren en hilos mientras se embebe el siguiente lote
+        - wait=False no espera a que Qdrant indexe cada lote (más rápido en cargas grandes)
+        
+        `documents` es un iterable de (texto, metadata) o (texto, metadata, point_id);
+        se consume en streaming. No imprime nada por documento: los fallos se
+        retornan en AddDocumentsResult.failed.
+        """
+        batch_size = batch_size or self.embedding_batch_size
+        result = AddDocumentsResult()
+        iterator = enumerate(documents)
+        
+        with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+            pending = []
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    break
+                
+                indexes = [index for index, _ in batch]
+                texts = [item[0] for _, item in batch]
+                metadatas = [item[1] if len(item) > 1 else None for _, item in batch]
+                ids = [
+                    item[2] if len(item) > 2 and item[2] else document_id(item[0])
+                    for _, item in batch
+                ]
+                
+                try:
+                    embeddings = self.get_embeddings(texts)
+                except BackendError as e:
+                    result.failed.extend(
+                        FailedDocument(index, doc_id, f"error generando embeddings: {e}")
+                        for index, doc_id in zip(indexes, ids)
+                    )
+                    continue
+                
+                future = executor.submit(
+                    self._upsert,
+                    ids,
+                    embeddings,
+                    [{"text": text, "metadata": metadata or {}} for text, metadata in zip(texts, metadatas)],
+                    wait
+                )
+                pending.append((future, indexes, ids))
+                
+                # Acotar lotes en vuelo para no acumular todo el corpus en memoria
+                while len(pending) > parallel:
+                    self._collect_upsert(pending.pop(0), result)
+            
+            for item in pending:
+                self._collect_upsert(item, result)
+        
+        if result.ids:
+            self._invalidate_query_cache()
+        return result
+    
+    def _upsert(self, ids: List[str], vectors, payloads: List[Dict], wait: bool = True):
+        """Upsert instrumentado en el backend vectorial"""
+        with get_metrics().span("vector_upsert", backend=self.vector_backend):
+            # Idempotente (mismos IDs): se puede reintentar
+            store = self._writable_store()
+            self.vector_resilience.call(lambda: store.upsert(ids, vectors, payloads, wait))
+        get_metrics().incr("upserted_points", len(ids))
+    
+    def _collect_upsert(self, pending_upsert, result: AddDocumentsResult):
+        future, indexes, ids = pending_upsert
+        try:
+            future.result()
+            result.ids.extend(ids)
+        except Exception as e:
+            result.failed.extend(
+                FailedDocument(index, doc_id, str(e)) for index, doc_id in zip(indexes, ids)
+            )
+    
+    def upsert_points(self, ids: Sequence[str], vectors, payloads: Sequence[Dict],
+                      wait: bool = True):
+        """
+        Escribe puntos con vectores ya calculados, sin llamar a Ollama
+        
+        ¿Para qué?
+        - Importar un snapshot (ver snapshot.py): el coste es el de escribir, no el de embeber
+        - Los errores se propagan: el llamador decide si reintentar el lote
+        """
+        self._upsert(list(ids), vectors, list(payloads), wait)
+        self._invalidate_query_cache()
+    
+    def delete_documents(self, point_ids: Sequence[str]) -> bool:
+        """
+        Elimina puntos de la colección por ID
+        
+        ¿Por qué?
+        - Al editar o borrar un archivo fuente sus fragmentos antiguos quedan obsoletos
+        """
+        point_ids = list(point_ids)
+        if not point_ids:
+            return True
+        
+        try:
+            if not self._collection_available():
+                # Sin colección no hay nada que borrar
+                return True
+            self.vector_resilience.call(lambda: self.vector_store.delete(point_ids))
+            self._invalidate_query_cache()
+            logger.info("🗑️ Eliminados %d puntos obsoletos", len(point_ids))
+            return True
+            
+        except Exception as e:
+            logger.error("❌ Error eliminando documentos: %s", e)
+            return False
+    
+    def _invalidate_query_cache(self):
+        """La colección cambió: los resultados cacheados ya no son válidos"""
+        if self.query_cache is not None:
+            self.query_cache.bump_generation()
+    
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Estadísticas de las cachés de embeddings y de resultados"""
+        return {
+            "embeddings": self.embedding_cache.stats() if self.embedding_cache else {},
+            "queries": self.query_cache.stats() if self.query_cache else {}
+        }
+    
+    def count_documents(self) -> int:
+        """Número aproximado de puntos en la colección"""
+        if not self._collection_available():
+            return 0
+        return self.vector_resilience.call(self.vector_store.count)
+    
+    def search_similar(self, query: str, limit: int = 5, score_threshold: Optional[float] = None,
+                       hnsw_ef: Optional[int] = None, oversampling: Optional[float] = None,
+                       search_filter: Optional[SearchFilter] = None,
+                       namespaces: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Busca documentos similares usando búsqueda vectorial
+        
+        ¿Por qué estos parámetros?
+        - limit=5: Balance entre contexto y velocidad
+        - score_threshold: Filtro de calidad (por defecto MIN_SCORE_THRESHOLD)
+        - hnsw_ef / oversampling: recall vs latencia por consulta (índices HNSW
+          y colecciones cuantizadas; por defecto SEARCH_HNSW_EF / SEARCH_OVERSAMPLING)
+        - search_filter: solo documentos con esa categoría, fuente, autor o fecha
+        - namespaces: buscar en varias colecciones a la vez y combinar su top-k
+        """
+        return self.search_similar_batch(
+            [query], limit=limit, score_threshold=score_threshold,
+            hnsw_ef=hnsw_ef, oversampling=oversampling, search_filter=search_filter,
+            namespaces=namespaces
+        )[0]
+    
+    def search_similar_batch(self, queries: Sequence[str], limit: int = 5,
+                             score_threshold: Optional[float] = None,
+                             hnsw_ef: Optional[int] = None,
+                             oversampling: Optional[float] = None,
+                             search_filter: Optional[SearchFilter] = None,
+                             namespaces: Optional[Sequence[str]] = None) -> List[List[Dict]]:
+        """
+        Busca documentos similares para varias consultas a la vez
+        
+        ¿Por qué agrupar consultas?
+        - Un solo round trip a Ollama para todos los embeddings
+        - Una sola petición search_batch a Qdrant (una por namespace, en paralelo)
+        
+        Retorna una lista de resultados por consulta, en el mismo orden.
+        Si Ollama o Qdrant fallan lanza BackendError (no una lista vacía).
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        
+        if score_threshold is None:
+            score_threshold = self.collection_config.min_score_threshold
+        search_params = self.collection_config.search_params(hnsw_ef, oversampling)
+        
+        if namespaces:
+            # Sin caché: las escrituras en otros namespaces no invalidan la de este cliente
+            return self._fan_out_search(
+                self.get_embeddings(queries), namespaces, limit, score_threshold,
+                search_params, search_filter=search_filter
+            )
+        
+        if self.query_cache is None:
+            return self._search_batch(queries, limit, score_threshold, search_params, search_filter)
+        
+        # Resolver desde caché las consultas ya vistas en esta generación
+        generation = self.query_cache.generation
+        options = (limit, score_threshold, search_params.model_dump() if search_params else None,
+                   search_filter)
+        cached = [self.query_cache.get(make_key("search", query, *options)) for query in queries]
+        missing = list(dict.fromkeys(
+            query for query, results in zip(queries, cached) if results is None
+        ))
+        get_metrics().incr("query_cache_hits", len(queries) - sum(r is None for r in cached), kind="search")
+        
+        fetched = {}
+        if missing:
+            search_results = self._search_batch(missing, limit, score_threshold, search_params, search_filter)
+            for query, results in zip(missing, search_results):
+                fetched[query] = results
+                self.query_cache.put(make_key("search", query, *options), results, generation)
         
-        ¿Por qué limitar la longitud del contexto?
-        - Los LLMs tienen límites de tokens
-        - Demasiado contexto puede confundir al modelo
-        - Balance entre información relevante y eficiencia
+        return [
+            [dict(doc) for doc in (results if results is not None else fetched[query])]
+            for query, results in zip(queries, cached)
+        ]
+    
+    def _search_batch(self, queries: List[str], limit: int, score_threshold: float,
+                      search_params: Optional[SearchParams],
+                      search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """Embebe y busca en el backend (BackendError si Ollama o Qdrant fallan)"""
+        # Generar embeddings de las consultas
+        query_embeddings = self.get_embeddings(queries)
+        
+        # Búsqueda en el backend vectorial
+        all_results = self._vector_search(query_embeddings, limit, score_threshold, search_params,
+                                          search_filter=search_filter)
+        
+        logger.debug("✅ Encontrados %d documentos similares", sum(len(r) for r in all_results))
+        return all_results
+    
+    def _vector_search(self, query_embeddings: np.ndarray, limit: int, score_threshold: float,
+                       search_params: Optional[SearchParams],
+                       with_vectors: bool = False,
+                       search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """Búsqueda instrumentada en el backend vectorial"""
+        if not self._collection_available():
+            return [[] for _ in range(len(query_embeddings))]
+        metrics = get_metrics()
+        with metrics.span("vector_search", backend=self.vector_backend):
+            all_results = self.vector_resilience.call(
+                lambda: self.vector_store.search_batch(
+                    query_embeddings,
+                    limit=limit,
+                    score_threshold=score_threshold,
+                    search_params=search_params,
+                    with_vectors=with_vectors,
+                    search_filter=search_filter
+                ),
+                hedge=True
+            )
+        metrics.incr("vector_searches", len(all_results))
+        metrics.incr("search_results", sum(len(results) for results in all_results))
+        return all_results
+    
+    def _fan_out_search(self, query_embeddings: np.ndarray, namespaces: Sequence[str], limit: int,
+                        score_threshold: float, search_params: Optional[SearchParams],
+                        with_vectors: bool = False,
+                        search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
         """
-        similar_docs = self.search_similar(query)
+        Busca los mismos vectores en varios namespaces a la vez y combina el top-k
         
-        if not similar_docs:
-            return "No se encontró información relevante en la base de conocimiento."
+        - Un hilo por namespace: la latencia es la del namespace más lento
+        - Un namespace sin colección cuenta como vacío (la búsqueda no la crea)
+        - Los scores se combinan brutos o normalizados por namespace (NAMESPACE_SCORE_NORMALIZATION)
+        """
+        namespaces = list(dict.fromkeys(namespaces))
+        clients = [self.namespace_client(namespace) for namespace in namespaces]
         
-        # Concatenar documentos hasta el límite
-        context_parts = []
-        current_length = 0
+        def search(client: "RAGClient") -> List[List[Dict]]:
+            return client._vector_search(query_embeddings, limit, score_threshold, search_params,
+                                         with_vectors=with_vectors, search_filter=search_filter)
         
-        for doc in similar_docs:
-            text = doc["text"]
-            if current_length + len(text) <= max_context_length:
-                context_parts.append(f"[Fuente ID: {doc['id']}, Score: {doc['score']:.3f}]\n{text}")
-                current_length += len(text)
+        with get_metrics().span("namespace_fan_out", namespaces=len(clients)):
+            if len(clients) == 1:
+                results_by_namespace = [search(clients[0])]
             else:
-                break
+                with ThreadPoolExecutor(max_workers=len(clients)) as executor:
+                    results_by_namespace = list(executor.map(search, clients))
+        
+        higher_is_better = self.collection_config.distance != "euclid"
+        return [
+            merge_hits(
+                {namespace: results[i] for namespace, results in zip(namespaces, results_by_namespace)},
+                limit, self.namespace_config.normalization, higher_is_better
+            )
+            for i in range(len(query_embeddings))
+        ]
+    
+    def get_context_for_query(self, query: str, max_tokens: Optional[int] = None,
+                              search_filter: Optional[SearchFilter] = None,
+                              namespaces: Optional[Sequence[str]] = None,
+                              max_context_length: Optional[int] = None) -> str:
+        """
+        Obtiene contexto relevante para una consulta (función principal de RAG)
+        
+        ¿Cómo se arma el contexto?
+        - Se recuperan CONTEXT_CANDIDATES resultados con sus vectores
+          (solo los que cumplen search_filter, si se indica; de todos los
+          namespaces pedidos, combinados en un único top-k)
+        - Se eligen por MMR (relevancia + diversidad) sin duplicados
+        - Se respeta un presupuesto en tokens (CONTEXT_MAX_TOKENS por defecto;
+          max_context_length, en caracteres, queda como alias obsoleto)
+        """
+        max_tokens = resolve_max_tokens(max_tokens, max_context_length) or self.context_config.max_tokens
+        if self.query_cache is None or namespaces:
+            return self._build_context(query, max_tokens, search_filter, namespaces)[0]
         
-        context = "\n\n---\n\n".join(context_parts)
+        key = make_key("context", query, max_tokens, search_filter)
+        generation = self.query_cache.generation
+        context = self.query_cache.get(key)
+        if context is not None:
+            get_metrics().incr("query_cache_hits", kind="context")
+        else:
+            context, found = self._build_context(query, max_tokens, search_filter)
+            # No cachear una colección vacía: puede llenarse en cualquier momento
+            if found:
+                self.query_cache.put(key, context, generation)
+        return context
+    
+    def _build_context(self, query: str, max_tokens: int,
+                       search_filter: Optional[SearchFilter] = None,
+                       namespaces: Optional[Sequence[str]] = None) -> Tuple[str, bool]:
+        """Recupera candidatos con vectores y los empaqueta; retorna (contexto, hubo_resultados)"""
+        query_embeddings = self.get_embeddings([query])
+        query_vector = query_embeddings[0]
+        options = dict(
+            limit=self.context_config.candidates,
+            score_threshold=self.collection_config.min_score_threshold,
+            search_params=self.collection_config.search_params(),
+            with_vectors=True,
+            search_filter=search_filter
+        )
+        if namespaces:
+            candidates = self._fan_out_search(query_embeddings, namespaces, **options)[0]
+        else:
+            candidates = self._vector_search(query_embeddings, **options)[0]
         
-        return context if context else "No se encontró información relevante." 
\ No newline at end of file
+        metrics = get_metrics()
+        with metrics.span("context_assembly"):
+            context = build_context(
+                candidates,
+                max_tokens,
+                query_vector,
+                mmr_lambda=self.context_config.mmr_lambda,
+                duplicate_threshold=self.context_config.duplicate_threshold
+            )
+        metrics.incr("context_bytes", len(context.encode("utf-8")))
+        return context, bool(candidates)
+
+def get_rag_client() -> RAGClient:
+    """
+    Retorna el RAGClient compartido para la configuración actual del entorno
+    
+    ¿Por qué compartir el cliente?
+    - Las herramientas se ejecutan en cada turno de cada agente
+    - Reutiliza la conexión a Qdrant, la sesión HTTP y la caché de embeddings
+    - Un cliente por configuración: cambiar de colección crea otro cliente
+    """
+    key = (
+        os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+        os.getenv("EMBEDDING_MODEL", "nomic-embed-text:latest"),
+        os.getenv("QDRANT_URL", "http://localhost:6333"),
+        os.getenv("QDRANT_COLLECTION_NAME", "knowledge_base"),
+        os.getenv("VECTOR_BACKEND", "qdrant"),
+        os.getenv("QDRANT_PATH", ""),
+    )
+    
+    client = _shared_clients.get(key)
+    if client is None:
+        with _shared_clients_lock:
+            client = _shared_clients.get(key)
+            if client is None:
+                client = RAGClient()
+                _shared_clients[key] = client
+    return client
+
+def reset_rag_clients():
+    """Olvida los clientes compartidos (útil en pruebas o tras cambiar configuración)"""
+    with _shared_clients_lock:
+        _shared_clients.clear()
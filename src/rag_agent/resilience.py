@@ -0,0 +1,283 @@
+"""
+Timeouts, reintentos con backoff y circuit breaker para Ollama y Qdrant
+
+¿Por qué una capa de resiliencia?
+- Sin timeout, un Ollama colgado bloquea el hilo del agente indefinidamente
+- Los fallos transitorios (5xx, conexión rechazada, timeouts) suelen resolverse
+  reintentando con espera exponencial y jitter
+- Si el backend está caído, el circuit breaker falla de inmediato en lugar de
+  acumular esperas; tras reset_timeout deja pasar una petición de prueba
+- Opcional: una petición duplicada (hedging) recorta la latencia de cola
+
+Los errores se propagan como BackendError: un fallo ya no se confunde con
+"sin resultados".
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import requests
+
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BackendError(Exception):
+    """Ollama o Qdrant fallaron (después de los reintentos)"""
+
+
+class TransientError(BackendError):
+    """Fallo reintentable: 5xx, 429, conexión o timeout"""
+
+
+class CircuitOpenError(BackendError):
+    """El circuit breaker está abierto: el backend se considera caído"""
+
+
+def is_transient(error: BaseException) -> bool:
+    """¿Vale la pena reintentar? (los errores de programación o 4xx no)"""
+    if isinstance(error, TransientError):
+        return True
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, TimeoutError, ConnectionError)):
+        return True
+    # httpx y qdrant-client: imports diferidos, solo si el error viene de ellos
+    module = type(error).__module__
+    if module.startswith("httpx"):
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    if module.startswith("qdrant_client"):
+        from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+        if isinstance(error, ResponseHandlingException):
+            return True
+        if isinstance(error, UnexpectedResponse):
+            return error.status_code is None or error.status_code >= 500 or error.status_code == 429
+    return False
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Reintentos con backoff exponencial y "full jitter"
+
+    La espera antes del reintento n es uniforme en [0, min(max, base * 2^n)]:
+    los clientes que fallaron a la vez no reintentan todos al mismo tiempo.
+    """
+    attempts: int = 3
+    backoff_base: float = 0.2
+    backoff_max: float = 5.0
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    closed -> open tras failure_threshold fallos seguidos; open -> half_open
+    tras reset_timeout segundos (una sola petición de prueba); un éxito lo cierra
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Lanza CircuitOpenError si hay que fallar rápido"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        raise CircuitOpenError(f"{self.name} no disponible (circuit breaker abierto)")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("✅ %s disponible de nuevo (circuit breaker cerrado)", self.name)
+            self.failures = 0
+            self.state = "closed"
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (
+                    self.state == "closed" and self.failures >= self.failure_threshold):
+                if self.state == "closed":
+                    logger.warning("⚠️ %s falló %d veces seguidas: circuit breaker abierto",
+                                   self.name, self.failures)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                get_metrics().incr("circuit_opened", backend=self.name)
+
+
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+    return _hedge_executor
+
+
+class Resilience:
+    """
+    Ejecuta llamadas a un backend con reintentos, circuit breaker y hedging
+
+    - call(fn): versión síncrona (requests, QdrantClient, NumPy)
+    - acall(factory): versión asíncrona; factory crea una corrutina nueva por intento
+    - idempotent=False desactiva reintentos y hedging (la llamada se hace una vez)
+    """
+
+    def __init__(self, name: str, retry: Optional[RetryPolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None, hedge_after: Optional[float] = None):
+        self.name = name
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge_after = hedge_after
+
+    def call(self, fn: Callable[[], T], idempotent: bool = True, hedge: bool = False) -> T:
+        attempts = self.retry.attempts if idempotent else 1
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                if hedge and idempotent and self.hedge_after is not None:
+                    result = self._hedged(fn)
+                else:
+                    result = fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt, attempts):
+                    raise
+                time.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, factory: Callable[[], Awaitable[T]], idempotent: bool = True,
+                    hedge: bool = False) -> T:
+        attempts = self.retry.attempts if idempotent else 1
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                if hedge and idempotent and self.hedge_after is not None:
+                    result = await self._ahedged(factory)
+                else:
+                    result = await factory()
+            except Exception as e:
+                if not self._should_retry(e, attempt, attempts):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _should_retry(self, error: Exception, attempt: int, attempts: int) -> bool:
+        """
+        Registra el fallo; True si hay que reintentar
+
+        Si no se reintenta el error se propaga; los transitorios agotados se
+        convierten en BackendError para que los llamadores distingan el fallo.
+        """
+        if not is_transient(error):
+            # El backend respondió (4xx, datos inválidos): no cuenta para el breaker
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if attempt + 1 >= attempts:
+            get_metrics().incr("backend_failures", backend=self.name)
+            if not isinstance(error, BackendError):
+                raise BackendError(f"{self.name}: {error}") from error
+            return False
+        get_metrics().incr("backend_retries", backend=self.name)
+        logger.debug("🔁 Reintentando %s tras error: %s", self.name, error)
+        return True
+
+    def _hedged(self, fn: Callable[[], T]) -> T:
+        """Si la primera petición tarda más de hedge_after, lanza otra y usa la primera que responda"""
+        executor = _get_hedge_executor()
+        first = executor.submit(fn)
+        try:
+            return first.result(timeout=self.hedge_after)
+        except FutureTimeout:
+            pass
+
+        get_metrics().incr("hedged_requests", backend=self.name)
+        second = executor.submit(fn)
+        done, _ = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is None:
+            return winner.result()
+        # La más rápida falló: esperar a la otra
+        return (second if winner is first else first).result()
+
+    async def _ahedged(self, factory: Callable[[], Awaitable[T]]) -> T:
+        first = asyncio.ensure_future(factory())
+        done, _ = await asyncio.wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        get_metrics().incr("hedged_requests", backend=self.name)
+        second = asyncio.ensure_future(factory())
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "Resilience":
+        """
+        - RETRY_ATTEMPTS, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX (segundos)
+        - CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT (segundos)
+        - {prefix}_HEDGE_AFTER_MS: vacío desactiva el hedging (p. ej. OLLAMA_HEDGE_AFTER_MS)
+        """
+        hedge_after = os.getenv(f"{prefix}_HEDGE_AFTER_MS", "")
+        return cls(
+            name,
+            RetryPolicy(
+                attempts=max(1, int(os.getenv("RETRY_ATTEMPTS", "3"))),
+                backoff_base=float(os.getenv("RETRY_BACKOFF_BASE", "0.2")),
+                backoff_max=float(os.getenv("RETRY_BACKOFF_MAX", "5")),
+            ),
+            CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30")),
+            ),
+            hedge_after=float(hedge_after) / 1000 if hedge_after else None,
+        )
@@ -0,0 +1,117 @@
+"""
+Filtros de búsqueda sobre los metadatos de los documentos
+
+¿Por qué filtrar en el backend?
+- Sin filtro los agentes buscan en toda la colección y reciben resultados de
+  otras categorías que ocupan contexto sin aportar nada
+- Qdrant aplica el filtro durante el recorrido del grafo HNSW (con índices de
+  payload): el top-k ya sale filtrado, sin post-filtrado que lo deje corto
+- El backend NumPy descarta las filas que no cumplen antes de elegir el top-k
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from qdrant_client.models import DatetimeRange, FieldCondition, Filter, MatchAny
+
+FilterValue = Optional[Union[str, Sequence[str]]]
+
+# Campos de metadatos filtrables por valor exacto (índice keyword)
+KEYWORD_FIELDS = ("category", "source", "added_by")
+
+# Campo con la fecha de escritura (índice datetime)
+DATETIME_FIELD = "added_at"
+
+
+def utc_now_iso() -> str:
+    """Marca de tiempo RFC 3339 en UTC para metadata["added_at"]"""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _parse_datetime(value: Union[str, datetime]) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Fechas sin zona horaria se interpretan en UTC (igual que Qdrant)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _as_list(value: FilterValue) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """
+    Restricciones sobre metadata.*: todas deben cumplirse
+
+    - category / source / added_by: un valor o una lista (basta con uno)
+    - added_after / added_before: rango sobre metadata.added_at (inclusive)
+    """
+    category: FilterValue = None
+    source: FilterValue = None
+    added_by: FilterValue = None
+    added_after: Optional[Union[str, datetime]] = None
+    added_before: Optional[Union[str, datetime]] = None
+
+    def __post_init__(self):
+        # Listas a tuplas: el filtro es inmutable y su repr sirve de clave de caché
+        for name in KEYWORD_FIELDS:
+            value = getattr(self, name)
+            if value is not None and not isinstance(value, str):
+                object.__setattr__(self, name, tuple(value))
+
+    @classmethod
+    def build(cls, **fields: Any) -> Optional["SearchFilter"]:
+        """SearchFilter con los campos no vacíos, o None si no hay ninguno"""
+        fields = {name: value for name, value in fields.items() if value not in (None, "", [])}
+        return cls(**fields) if fields else None
+
+    def keyword_conditions(self) -> Dict[str, List[str]]:
+        conditions = {}
+        for name in KEYWORD_FIELDS:
+            values = _as_list(getattr(self, name))
+            if values:
+                conditions[name] = values
+        return conditions
+
+    def to_qdrant(self) -> Filter:
+        must = [
+            FieldCondition(key=f"metadata.{name}", match=MatchAny(any=values))
+            for name, values in self.keyword_conditions().items()
+        ]
+        if self.added_after is not None or self.added_before is not None:
+            must.append(FieldCondition(
+                key=f"metadata.{DATETIME_FIELD}",
+                range=DatetimeRange(
+                    gte=_parse_datetime(self.added_after) if self.added_after is not None else None,
+                    lte=_parse_datetime(self.added_before) if self.added_before is not None else None,
+                )
+            ))
+        return Filter(must=must)
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Misma semántica que to_qdrant (los valores lista cumplen si alguno coincide)"""
+        for name, values in self.keyword_conditions().items():
+            stored = metadata.get(name)
+            stored = stored if isinstance(stored, list) else [stored]
+            if not any(value in values for value in stored):
+                return False
+
+        if self.added_after is None and self.added_before is None:
+            return True
+        stored = metadata.get(DATETIME_FIELD)
+        if not stored:
+            return False
+        after = _parse_datetime(self.added_after) if self.added_after is not None else None
+        before = _parse_datetime(self.added_before) if self.added_before is not None else None
+        for value in stored if isinstance(stored, list) else [stored]:
+            try:
+                moment = _parse_datetime(value)
+            except (TypeError, ValueError):
+                continue
+            if (after is None or moment >= after) and (before is None or moment <= before):
+                return True
+        return False
@@ -0,0 +1,457 @@
+"""
+Servicio de recuperación residente (asyncio, solo biblioteca estándar)
+
+¿Por qué un proceso residente?
+- Cada llamada del CLI y cada proceso de crew pagaba la creación de clientes,
+  la verificación de la colección y conexiones en frío
+- Un único RAGClient "caliente" atiende a todos: cachés de embeddings y de
+  consultas compartidas, conexiones a Ollama y Qdrant ya abiertas
+- Consultas idénticas en vuelo se fusionan: un solo embedding y una sola
+  búsqueda, y todos los que preguntaron reciben el mismo resultado
+
+Endpoints (JSON sobre HTTP/1.1, con keep-alive):
+- POST /search  {"query", "limit", "score_threshold", "category", "source", "namespaces"}
+- POST /context {"query", "max_tokens", "category", "source", "namespaces"}
+- POST /add     {"text", "metadata", "namespace"}
+- GET  /health
+
+Las herramientas de CrewAI usan el servicio si RAG_SERVICE_URL está definida
+(ver get_service_client).
+
+Uso:
+    python -m rag_agent.service --host 127.0.0.1 --port 8765
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from .dedup import WriteResult
+from .metrics import configure_logging, get_metrics
+from .resilience import BackendError, Resilience, TransientError
+from .search_filter import SearchFilter
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1 << 20
+
+_STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value: Any) -> Any:
+    # Scores y vectores del backend NumPy
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"No serializable: {type(value).__name__}")
+
+
+class InFlightRequests:
+    """
+    Fusión de peticiones idénticas en vuelo (single-flight)
+
+    La primera petición con una clave ejecuta la llamada; las que llegan
+    mientras tanto esperan el mismo futuro. Al terminar la clave se libera:
+    las repeticiones posteriores las atiende la caché de consultas del cliente.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]], endpoint: str = "") -> Any:
+        future = self._pending.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._pending[key] = future
+            future.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.coalesced += 1
+            get_metrics().incr("coalesced_requests", endpoint=endpoint)
+        # shield: si un cliente se desconecta no se cancela la llamada de los demás
+        return await asyncio.shield(future)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    def _done(self, key: str, future: asyncio.Future):
+        self._pending.pop(key, None)
+        if not future.cancelled():
+            # Marca la excepción como leída aunque todos los que esperaban se hayan ido
+            future.exception()
+
+
+class RetrievalService:
+    """
+    Servidor HTTP mínimo sobre asyncio.start_server con un RAGClient compartido
+
+    El RAGClient es síncrono: cada llamada corre en un pool de hilos acotado
+    (RAG_SERVICE_WORKERS) y el event loop solo atiende conexiones.
+    """
+
+    def __init__(self, rag_client=None, workers: Optional[int] = None):
+        if rag_client is None:
+            from .rag_client import get_rag_client
+            rag_client = get_rag_client()
+        self.rag_client = rag_client
+        self.inflight = InFlightRequests()
+        self.requests = 0
+        self.host: Optional[str] = None
+        self.port: Optional[int] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or int(os.getenv("RAG_SERVICE_WORKERS", "8")),
+            thread_name_prefix="rag_service"
+        )
+        self._routes = {
+            ("POST", "/search"): ("search", self.search),
+            ("POST", "/context"): ("context", self.context),
+            ("POST", "/add"): ("add", self.add),
+            ("GET", "/health"): ("health", self.health),
+        }
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _call(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def warm_up(self):
+        """Backend y colección listos antes de aceptar conexiones"""
+        await self._call(lambda: self.rag_client.vector_store)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> asyncio.AbstractServer:
+        await self.warm_up()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        self.host, self.port = server.sockets[0].getsockname()[:2]
+        logger.info("🚀 Servicio RAG escuchando en %s (colección '%s')",
+                    self.url, self.rag_client.collection_name)
+        return server
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    # --- Endpoints ---
+
+    @staticmethod
+    def _query_params(body: Dict[str, Any]) -> Dict[str, Any]:
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "'query' es obligatorio")
+        namespaces = body.get("namespaces") or None
+        return {
+            "query": query,
+            "category": body.get("category"),
+            "source": body.get("source"),
+            "namespaces": list(namespaces) if namespaces else None,
+        }
+
+    @staticmethod
+    def _key(endpoint: str, params: Dict[str, Any]) -> str:
+        return endpoint + ":" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    async def search(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        params = self._query_params(body)
+        params["limit"] = int(body.get("limit", 5))
+        params["score_threshold"] = body.get("score_threshold")
+
+        def run():
+            return self.rag_client.search_similar(
+                params["query"], limit=params["limit"], score_threshold=params["score_threshold"],
+                search_filter=SearchFilter.build(category=params["category"], source=params["source"]),
+                namespaces=params["namespaces"]
+            )
+
+        results = await self.inflight.run(self._key("search", params), lambda: self._call(run), "search")
+        return {"results": results}
+
+    async def context(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        params = self._query_params(body)
+        params["max_tokens"] = body.get("max_tokens")
+
+        def run():
+            return self.rag_client.get_context_for_query(
+                params["query"], max_tokens=params["max_tokens"],
+                search_filter=SearchFilter.build(category=params["category"], source=params["source"]),
+                namespaces=params["namespaces"]
+            )
+
+        context = await self.inflight.run(self._key("context", params), lambda: self._call(run), "context")
+        return {"context": context}
+
+    async def add(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Escritura deduplicada (o encolada si WRITE_BEHIND_ENABLED); no se fusiona"""
+        text = body.get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, "'text' es obligatorio")
+        metadata = body.get("metadata") or {}
+        namespace = body.get("namespace")
+
+        def run():
+            from .write_buffer import get_write_buffer
+
+            rag_client = self.rag_client.namespace_client(namespace) if namespace else self.rag_client
+            write_buffer = get_write_buffer(rag_client)
+            if write_buffer is not None:
+                write_buffer.enqueue(text, metadata)
+                return {"action": "queued"}
+            result = rag_client.add_document_unique(text, metadata)
+            if result.changed:
+                from .answer_cache import invalidate_answer_cache
+                invalidate_answer_cache()
+            return {
+                "action": result.action,
+                "point_id": result.point_id,
+                "duplicate_of": result.duplicate_of,
+                "score": result.score,
+                "duplicates_avoided": rag_client.duplicates_avoided,
+            }
+
+        return await self._call(run)
+
+    async def health(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "collection": self.rag_client.collection_name,
+            "requests": self.requests,
+            "coalesced": self.inflight.coalesced,
+            "in_flight": self.inflight.in_flight,
+        }
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """(estado HTTP, respuesta JSON) para una petición"""
+        route = self._routes.get((method, path.split("?", 1)[0]))
+        if route is None:
+            if any(route_path == path for _, route_path in self._routes):
+                return 405, {"error": f"Método {method} no permitido"}
+            return 404, {"error": f"Ruta desconocida: {path}"}
+
+        endpoint, handler = route
+        self.requests += 1
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "El cuerpo debe ser un objeto JSON")
+            with get_metrics().span("service_request", endpoint=endpoint):
+                return 200, await handler(payload)
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        except BackendError as e:
+            # Ollama/Qdrant caídos: el cliente ya reintentó, no tiene sentido repetir
+            return 503, {"error": str(e)}
+        except Exception as e:
+            logger.exception("❌ Error atendiendo %s", path)
+            return 500, {"error": str(e)}
+
+    # --- HTTP ---
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader) -> bytes:
+        try:
+            return await reader.readline()
+        except ValueError:
+            # StreamReader convierte LimitOverrunError en ValueError
+            raise HTTPError(400, "Línea de cabecera demasiado larga")
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+        request_line = await self._read_line(reader)
+        if not request_line:
+            return None
+        try:
+            method, path, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise HTTPError(400, "Línea de petición inválida")
+
+        headers = {}
+        while True:
+            line = await self._read_line(reader)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length inválido")
+        if length < 0:
+            raise HTTPError(400, "Content-Length inválido")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Cuerpo mayor de {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path, headers, body
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+                        keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+class ServiceClient:
+    """
+    Cliente HTTP del servicio para las herramientas (requests con keep-alive)
+
+    - Reintenta fallos de conexión y 5xx con la capa de resiliencia
+      (RAG_SERVICE_HEDGE_AFTER_MS activa el hedging en search/context)
+    - 503 significa que Ollama/Qdrant fallaron tras los reintentos del propio
+      servicio: se propaga como BackendError sin volver a intentarlo
+    """
+
+    def __init__(self, base_url: str, timeout: Optional[float] = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (
+            float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+            timeout or float(os.getenv("RAG_SERVICE_TIMEOUT", "60"))
+        )
+        self.session = requests.Session()
+        self.resilience = Resilience.from_env("rag_service", "RAG_SERVICE")
+
+    def _post(self, path: str, payload: Dict[str, Any], idempotent: bool = True) -> Dict[str, Any]:
+        def call():
+            response = self.session.post(self.base_url + path, json=payload, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.json()
+            try:
+                error = response.json().get("error", response.text)
+            except ValueError:
+                error = response.text
+            message = f"Servicio RAG ({response.status_code}): {error}"
+            if response.status_code >= 500 and response.status_code != 503:
+                raise TransientError(message)
+            raise BackendError(message)
+
+        return self.resilience.call(call, idempotent=idempotent, hedge=idempotent)
+
+    def search(self, query: str, limit: int = 5, score_threshold: Optional[float] = None,
+               category: Optional[str] = None, source: Optional[str] = None,
+               namespaces: Optional[Sequence[str]] = None) -> list:
+        return self._post("/search", {
+            "query": query, "limit": limit, "score_threshold": score_threshold,
+            "category": category, "source": source, "namespaces": namespaces,
+        })["results"]
+
+    def context(self, query: str, max_tokens: Optional[int] = None, category: Optional[str] = None,
+                source: Optional[str] = None, namespaces: Optional[Sequence[str]] = None) -> str:
+        return self._post("/context", {
+            "query": query, "max_tokens": max_tokens,
+            "category": category, "source": source, "namespaces": namespaces,
+        })["context"]
+
+    def add(self, text: str, metadata: Optional[Dict[str, Any]] = None,
+            namespace: Optional[str] = None) -> Tuple[Optional[WriteResult], int]:
+        """(WriteResult, duplicados evitados); WriteResult es None si quedó encolado"""
+        response = self._post("/add", {"text": text, "metadata": metadata, "namespace": namespace},
+                              idempotent=False)
+        if response["action"] == "queued":
+            return None, 0
+        result = WriteResult(response["action"], response.get("point_id"),
+                             response.get("duplicate_of"), response.get("score"))
+        return result, response.get("duplicates_avoided", 0)
+
+
+_service_clients: Dict[str, ServiceClient] = {}
+_service_clients_lock = threading.Lock()
+
+
+def get_service_client() -> Optional[ServiceClient]:
+    """
+    Cliente del servicio residente si RAG_SERVICE_URL está definida; None para
+    usar los clientes en el propio proceso
+    """
+    url = os.getenv("RAG_SERVICE_URL", "").strip()
+    if not url:
+        return None
+    with _service_clients_lock:
+        client = _service_clients.get(url)
+        if client is None:
+            client = ServiceClient(url)
+            _service_clients[url] = client
+    return client
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """
+    Run the resident retrieval service.
+    """
+    parser = argparse.ArgumentParser(description="Servicio de recuperación RAG residente")
+    parser.add_argument("--host", default=os.getenv("RAG_SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("RAG_SERVICE_PORT", "8765")))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Hilos para las llamadas al RAGClient (por defecto RAG_SERVICE_WORKERS)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    service = RetrievalService(workers=args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("👋 Servicio detenido")
+    finally:
+        from .write_buffer import close_write_buffers
+
+        # Lo encolado por /add no se pierde al detener el servicio
+        close_write_buffers()
+        service.close()
+        get_metrics().flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,13 @@ Script para inicializar y poblar la base de conocimiento RAG
 import os
 import sys
 from pathlib import Path
-from .rag_client import RAGClient
+from typing import List, Tuple
+from .answer_cache import invalidate_answer_cache
+from .chunking import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_file
+from .ingest_manifest import IngestManifest, file_hash
+from .metrics import configure_logging
+from .rag_client import document_id, get_rag_client
+from .search_filter import utc_now_iso
 
 def load_initial_documents():
     """
@@ -24,7 +30,7 @@ def load_initial_documents():
     - Conceptos fundamentales de RAG
     """
     
-    rag_client = RAGClient()
+    rag_client = get_rag_client()
     
     # Documentos base sobre IA y LLMs
     ai_documents = [
@@ -51,16 +57,17 @@ def load_initial_documents():
     ]
     
     print("🚀 Iniciando carga de documentos base sobre IA...")
-    for doc in ai_documents:
-        success = rag_client.add_document(doc["text"], doc["metadata"])
-        if success:
-            print(f"✅ Documento sobre {doc['metadata']['topic']} añadido")
-        else:
-            print(f"❌ Error añadiendo documento sobre {doc['metadata']['topic']}")
+    # Carga masiva: embeddings y upsert en un solo lote
+    result = rag_client.add_documents((doc["text"], doc["metadata"]) for doc in ai_documents)
+    
+    for failure in result.failed:
+        topic = ai_documents[failure.index]["metadata"]["topic"]
+        print(f"❌ Error añadiendo documento sobre {topic}: {failure.error}")
+    print(f"✅ {result.added} documentos base añadidos")
     
     return len(ai_documents)
 
-def load_knowledge_folder():
+def load_knowledge_folder(full_resync: bool = False):
     """
     Carga documentos de la carpeta knowledge/
     
@@ -68,41 +75,118 @@ def load_knowledge_folder():
     - Contiene información específica del usuario
     - Permite personalización del sistema
     - Aprovecha datos existentes del proyecto
+    
+    ¿Por qué ingesta incremental?
+    - El manifiesto (INGEST_MANIFEST_PATH) recuerda hash, mtime e IDs de cada archivo
+    - Solo se embeben archivos nuevos o modificados
+    - Los puntos de archivos editados o eliminados se borran de Qdrant
     """
     
-    rag_client = RAGClient()
+    rag_client = get_rag_client()
     knowledge_path = Path("knowledge")
     
     if not knowledge_path.exists():
         print("⚠️ Carpeta 'knowledge' no encontrada")
         return 0
     
+    manifest = IngestManifest.load(ingest_manifest_path(), ingest_fingerprint(rag_client))
+    
+    # Si la colección está vacía el manifiesto no refleja lo que hay en Qdrant
+    if full_resync or (manifest.files and rag_client.count_documents() == 0):
+        manifest.files.clear()
+    
     docs_loaded = 0
+    skipped = 0
+    sources = []
     
-    for file_path in knowledge_path.glob("*.txt"):
+    for file_path in sorted(knowledge_path.glob("*.txt")):
+        source = str(file_path)
+        sources.append(source)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                
-                if content:
-                    metadata = {
-                        "category": "user_data",
-                        "source": str(file_path),
-                        "filename": file_path.name
-                    }
-                    
-                    success = rag_client.add_document(content, metadata)
-                    if success:
-                        print(f"✅ Archivo {file_path.name} cargado")
-                        docs_loaded += 1
-                    else:
-                        print(f"❌ Error cargando {file_path.name}")
+            if manifest.is_unchanged(source, file_path):
+                skipped += 1
+                continue
+            
+            content_hash = file_hash(file_path)
+            previous = manifest.get(source)
+            point_ids, failed = load_file_chunks(rag_client, file_path)
+            
+            if failed:
+                # Se registra sin hash para reintentar en la próxima ejecución,
+                # conservando los IDs antiguos para poder purgarlos después
+                old_ids = previous.point_ids if previous else []
+                manifest.record(source, file_path, None, list(dict.fromkeys(old_ids + point_ids)))
+                print(f"❌ Error cargando {file_path.name} ({failed} fragmentos fallidos)")
+                continue
+            
+            stale_ids = sorted(set(previous.point_ids) - set(point_ids)) if previous else []
+            if rag_client.delete_documents(stale_ids):
+                manifest.record(source, file_path, content_hash, point_ids)
+            else:
+                # Sin hash: el próximo setup reintenta el borrado de los IDs obsoletos
+                manifest.record(source, file_path, None, list(dict.fromkeys(stale_ids + point_ids)))
+            print(f"✅ Archivo {file_path.name} cargado ({len(point_ids)} fragmentos)")
+            docs_loaded += 1
                         
         except Exception as e:
             print(f"❌ Error procesando {file_path}: {e}")
     
+    # Archivos eliminados de knowledge/: purgar sus puntos
+    for source in manifest.missing_sources(sources):
+        entry = manifest.get(source)
+        if rag_client.delete_documents(entry.point_ids):
+            manifest.remove(source)
+            print(f"🗑️ Archivo eliminado: {source}")
+    
+    manifest.save()
+    
+    if skipped:
+        print(f"⏭️ {skipped} archivos sin cambios omitidos")
+    
     return docs_loaded
 
+def ingest_manifest_path() -> str:
+    return os.getenv("INGEST_MANIFEST_PATH", ".rag_cache/ingest_manifest.json")
+
+def ingest_fingerprint(rag_client) -> dict:
+    """Configuración de la que depende el manifiesto de ingesta (ver IngestManifest)"""
+    return {
+        "qdrant_url": rag_client.qdrant_url,
+        "collection": rag_client.collection_name,
+        "embedding_model": rag_client.embedding_model,
+        "chunk_max_tokens": DEFAULT_MAX_TOKENS,
+        "chunk_overlap_tokens": DEFAULT_OVERLAP_TOKENS
+    }
+
+def load_file_chunks(rag_client, file_path: Path) -> Tuple[List[str], int]:
+    """
+    Fragmenta un archivo y añade sus fragmentos a la base de conocimiento
+    
+    ¿Por qué fragmentos y no el archivo completo?
+    - Cada vector representa un pasaje concreto, no un resumen diluido
+    - Las búsquedas devuelven pasajes cortos: prompts más pequeños
+    - El archivo se lee en streaming y se embebe/escribe por lotes (add_documents)
+    
+    Retorna (IDs de los puntos escritos, número de fragmentos fallidos).
+    """
+    result = rag_client.add_documents(_chunk_documents(file_path))
+    return result.ids, len(result.failed)
+
+def _chunk_documents(file_path: Path):
+    """Genera (texto, metadata, point_id) por cada fragmento del archivo"""
+    for chunk in chunk_file(file_path):
+        # source = archivo padre; los offsets permiten ubicar el fragmento
+        metadata = {
+            "category": "user_data",
+            "source": str(file_path),
+            "filename": file_path.name,
+            "chunk_index": chunk.index,
+            "char_start": chunk.start,
+            "char_end": chunk.end,
+            "added_at": utc_now_iso()
+        }
+        yield chunk.text, metadata, document_id(f"{file_path}:{chunk.start}:{chunk.text}")
+
 def test_rag_functionality():
     """
     Prueba básica de funcionalidad RAG
@@ -115,7 +199,7 @@ def test_rag_functionality():
     
     print("\n🧪 Probando funcionalidad RAG...")
     
-    rag_client = RAGClient()
+    rag_client = get_rag_client()
     
     # Prueba de búsqueda
     test_queries = [
@@ -124,9 +208,11 @@ def test_rag_functionality():
         "¿Qué información hay sobre el usuario?"
     ]
     
-    for query in test_queries:
+    # Todas las consultas de prueba en un solo lote
+    all_results = rag_client.search_similar_batch(test_queries, limit=2)
+    
+    for query, results in zip(test_queries, all_results):
         print(f"\n🔍 Consulta: {query}")
-        results = rag_client.search_similar(query, limit=2)
         
         if results:
             for i, result in enumerate(results, 1):
@@ -139,19 +225,27 @@ def main():
     """
     Función principal del script de setup
     """
+    configure_logging()
     print("🎯 Iniciando configuración de la base de conocimiento RAG")
     print("=" * 60)
     
     try:
+        documents_before = get_rag_client().count_documents()
+        
         # 1. Cargar documentos base
         base_docs = load_initial_documents()
         print(f"\n📚 Documentos base cargados: {base_docs}")
         
-        # 2. Cargar carpeta knowledge
-        knowledge_docs = load_knowledge_folder()
+        # 2. Cargar carpeta knowledge (--full fuerza la re-ingesta completa)
+        knowledge_docs = load_knowledge_folder(full_resync="--full" in sys.argv)
         print(f"📁 Documentos de knowledge/ cargados: {knowledge_docs}")
         
-        # 3. Pruebas de funcionalidad
+        # 3. Solo si la base de conocimiento cambió (archivos cargados, puntos
+        #    nuevos o purgados) las respuestas cacheadas dejan de valer
+        if knowledge_docs or get_rag_client().count_documents() != documents_before:
+            invalidate_answer_cache()
+        
+        # 4. Pruebas de funcionalidad
         test_rag_functionality()
         
         print("\n" + "=" * 60)
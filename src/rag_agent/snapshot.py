@@ -0,0 +1,291 @@
+"""
+Snapshots portables de la base de conocimiento: embeddings precalculados
+
+¿Por qué exportar los vectores?
+- Cada nodo nuevo o entorno de CI re-embebía el mismo corpus con Ollama (minutos)
+- Importar un snapshot solo escribe en el backend: segundos y sin Ollama
+- El manifiesto de ingesta viaja con el snapshot: un `setup` posterior solo
+  re-embebe los archivos que cambiaron
+
+Formato (un directorio):
+- vectors.npy: matriz float16 (N x dimensión), se abre memory-mapped al importar
+- payloads.jsonl: una línea {"id", "payload"} por punto, en el mismo orden
+- manifest.json: modelo de embeddings, dimensión, métrica y número de puntos;
+  se escribe el último (sin manifiesto el snapshot está incompleto)
+
+Uso:
+    python -m rag_agent.snapshot export snapshots/kb
+    python -m rag_agent.snapshot import snapshots/kb --replace
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .answer_cache import invalidate_answer_cache
+from .ingest_manifest import IngestManifest, ManifestEntry
+from .metrics import configure_logging
+from .namespaces import DEFAULT_NAMESPACE
+from .search_filter import utc_now_iso
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+def _ingest_section(rag_client) -> Optional[Dict[str, Any]]:
+    """Archivos del manifiesto de ingesta local (si corresponde a esta colección)"""
+    from .setup_knowledge_base import ingest_fingerprint, ingest_manifest_path
+
+    fingerprint = ingest_fingerprint(rag_client)
+    manifest = IngestManifest.load(ingest_manifest_path(), fingerprint)
+    if not manifest.files:
+        return None
+    return {
+        "chunk_max_tokens": fingerprint["chunk_max_tokens"],
+        "chunk_overlap_tokens": fingerprint["chunk_overlap_tokens"],
+        "files": {source: asdict(entry) for source, entry in sorted(manifest.files.items())},
+    }
+
+
+def export_snapshot(rag_client, directory: Union[str, Path], batch_size: int = 512) -> Dict[str, Any]:
+    """
+    Exporta la colección de rag_client a `directory` y retorna el manifiesto
+
+    Los vectores se escriben por lotes: la memoria no depende del tamaño de la colección.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Un export interrumpido no debe parecer un snapshot válido
+    (directory / MANIFEST_FILE).unlink(missing_ok=True)
+
+    store = rag_client.vector_store
+    raw_path = directory / (VECTORS_FILE + ".raw")
+    count = 0
+    with open(raw_path, "wb") as raw, \
+            open(directory / PAYLOADS_FILE, "w", encoding="utf-8") as payloads:
+        for ids, vectors, batch_payloads in store.scroll(batch_size):
+            raw.write(np.ascontiguousarray(vectors, dtype="<f2").tobytes())
+            for point_id, payload in zip(ids, batch_payloads):
+                payloads.write(json.dumps({"id": point_id, "payload": payload}, ensure_ascii=False) + "\n")
+            count += len(ids)
+
+    # Cabecera .npy con la forma final + los datos ya escritos
+    dimension = rag_client.collection_config.dimension
+    tmp_path = directory / (VECTORS_FILE + ".tmp")
+    with open(tmp_path, "wb") as target, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(target, {
+            "descr": np.lib.format.dtype_to_descr(np.dtype("<f2")),
+            "fortran_order": False,
+            "shape": (count, dimension),
+        })
+        shutil.copyfileobj(raw, target)
+    os.replace(tmp_path, directory / VECTORS_FILE)
+    raw_path.unlink()
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": utc_now_iso(),
+        "collection": rag_client.collection_name,
+        "embedding_model": rag_client.embedding_model,
+        "dimension": dimension,
+        "distance": rag_client.collection_config.distance,
+        "dtype": "float16",
+        "count": count,
+        "vectors": VECTORS_FILE,
+        "payloads": PAYLOADS_FILE,
+    }
+    ingest = _ingest_section(rag_client)
+    if ingest:
+        manifest["ingest"] = ingest
+    (directory / MANIFEST_FILE).write_text(
+        json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    logger.info("📦 Snapshot de '%s' exportado: %d puntos en %s",
+                rag_client.collection_name, count, directory)
+    return manifest
+
+
+def read_manifest(directory: Union[str, Path]) -> Dict[str, Any]:
+    path = Path(directory) / MANIFEST_FILE
+    if not path.exists():
+        raise ValueError(f"{directory} no es un snapshot completo (falta {MANIFEST_FILE})")
+    manifest = json.loads(path.read_text(encoding="utf-8"))
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Versión de snapshot no soportada: {manifest.get('version')}")
+    return manifest
+
+
+def _check_compatible(rag_client, manifest: Dict[str, Any], force: bool):
+    """Vectores de otro modelo no son comparables con las consultas de este"""
+    if manifest["dimension"] != rag_client.collection_config.dimension:
+        raise ValueError(f"El snapshot tiene dimensión {manifest['dimension']}, "
+                         f"pero EMBEDDING_DIMENSION={rag_client.collection_config.dimension}")
+    if manifest["embedding_model"] != rag_client.embedding_model:
+        message = (f"El snapshot se generó con {manifest['embedding_model']}, "
+                   f"pero EMBEDDING_MODEL={rag_client.embedding_model}")
+        if not force:
+            raise ValueError(message + " (usa --force si los modelos son equivalentes)")
+        logger.warning("⚠️ %s", message)
+    if manifest["distance"] != rag_client.collection_config.distance:
+        logger.warning("⚠️ El snapshot usa la métrica %s y la colección %s",
+                       manifest["distance"], rag_client.collection_config.distance)
+
+
+def _iter_batches(vectors: np.ndarray, payloads_path: Path,
+                  batch_size: int) -> Iterator[Tuple[List[Any], np.ndarray, List[Dict]]]:
+    with open(payloads_path, encoding="utf-8") as payloads:
+        start = 0
+        ids, batch_payloads = [], []
+        for line in payloads:
+            point = json.loads(line)
+            ids.append(point["id"])
+            batch_payloads.append(point["payload"])
+            if len(ids) == batch_size:
+                yield ids, vectors[start:start + len(ids)].astype(np.float32), batch_payloads
+                start += len(ids)
+                ids, batch_payloads = [], []
+        if ids:
+            yield ids, vectors[start:start + len(ids)].astype(np.float32), batch_payloads
+
+
+def _restore_ingest_manifest(rag_client, ingest: Dict[str, Any], replace: bool):
+    """
+    Fusiona los archivos del snapshot en el manifiesto de ingesta local
+
+    El mtime no coincide en otra máquina: is_unchanged confirma por hash y
+    solo se re-embeben los archivos realmente distintos.
+    """
+    from .setup_knowledge_base import ingest_fingerprint, ingest_manifest_path
+
+    if rag_client.namespace != DEFAULT_NAMESPACE:
+        # El manifiesto de ingesta describe knowledge/ en la colección principal
+        logger.info("ℹ️ Namespace '%s': el manifiesto de ingesta del snapshot no se restaura",
+                    rag_client.namespace)
+        return
+    fingerprint = ingest_fingerprint(rag_client)
+    if (ingest["chunk_max_tokens"], ingest["chunk_overlap_tokens"]) != (
+            fingerprint["chunk_max_tokens"], fingerprint["chunk_overlap_tokens"]):
+        logger.warning("⚠️ El snapshot usa otros parámetros de fragmentación: "
+                       "el próximo setup re-ingestará todo")
+        return
+    manifest = IngestManifest.load(ingest_manifest_path(), fingerprint)
+    if replace:
+        manifest.files.clear()
+    manifest.files.update(
+        (source, ManifestEntry(**entry)) for source, entry in ingest["files"].items()
+    )
+    manifest.save()
+
+
+def import_snapshot(rag_client, directory: Union[str, Path], batch_size: int = 512,
+                    replace: bool = False, force: bool = False) -> int:
+    """
+    Carga un snapshot en la colección de rag_client sin llamar a Ollama
+
+    - replace: vacía la colección antes de importar (si no, los IDs iguales se sobrescriben)
+    - force: acepta un snapshot de otro modelo de embeddings con la misma dimensión
+
+    Retorna el número de puntos importados.
+    """
+    directory = Path(directory)
+    manifest = read_manifest(directory)
+    _check_compatible(rag_client, manifest, force)
+
+    vectors = np.load(directory / manifest["vectors"], mmap_mode="r")
+    if vectors.shape != (manifest["count"], manifest["dimension"]):
+        raise ValueError(f"vectors.npy tiene forma {vectors.shape}, "
+                         f"se esperaba {(manifest['count'], manifest['dimension'])}")
+
+    store = rag_client.vector_store
+    if replace:
+        rag_client.vector_resilience.call(store.clear)
+        rag_client.vector_resilience.call(lambda: store.ensure_collection(rag_client.collection_config))
+
+    imported = 0
+    for ids, batch_vectors, payloads in _iter_batches(vectors, directory / manifest["payloads"],
+                                                      batch_size):
+        # Sin esperar la indexación de cada lote: solo el último confirma
+        last = imported + len(ids) >= manifest["count"]
+        rag_client.upsert_points(ids, batch_vectors, payloads, wait=last)
+        imported += len(ids)
+    if imported != manifest["count"]:
+        raise ValueError(f"payloads.jsonl tiene {imported} puntos, el manifiesto {manifest['count']}")
+
+    if manifest.get("ingest"):
+        _restore_ingest_manifest(rag_client, manifest["ingest"], replace)
+    # La base de conocimiento cambió: las respuestas cacheadas ya no valen
+    invalidate_answer_cache()
+    logger.info("📥 Snapshot importado en '%s': %d puntos", rag_client.collection_name, imported)
+    return imported
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """
+    Export or import a knowledge-base snapshot (precomputed embeddings).
+    """
+    parser = argparse.ArgumentParser(description="Exporta o importa un snapshot de la base de conocimiento")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Exportar la colección a un directorio")
+    export_parser.add_argument("directory", type=Path)
+
+    import_parser = subparsers.add_parser("import", help="Importar un snapshot sin re-embeber")
+    import_parser.add_argument("directory", type=Path)
+    import_parser.add_argument("--replace", action="store_true",
+                               help="Vaciar la colección antes de importar")
+    import_parser.add_argument("--force", action="store_true",
+                               help="Aceptar un snapshot de otro modelo de embeddings")
+
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument("--namespace", default=None,
+                               help="Namespace (colección) a exportar o importar")
+        subparser.add_argument("--batch-size", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    from .rag_client import get_rag_client
+    from .resilience import BackendError
+
+    rag_client = get_rag_client()
+    if args.namespace:
+        rag_client = rag_client.namespace_client(args.namespace)
+
+    start = time.perf_counter()
+    try:
+        if args.command == "export":
+            manifest = export_snapshot(rag_client, args.directory, args.batch_size)
+            print(f"📦 {manifest['count']} puntos exportados a {args.directory} "
+                  f"en {time.perf_counter() - start:.1f}s")
+        else:
+            imported = import_snapshot(rag_client, args.directory, args.batch_size,
+                                       replace=args.replace, force=args.force)
+            print(f"📥 {imported} puntos importados en '{rag_client.collection_name}' "
+                  f"en {time.perf_counter() - start:.1f}s")
+    except (ValueError, OSError, BackendError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+def export_main():
+    main(["export", *sys.argv[1:]])
+
+
+def import_main():
+    main(["import", *sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    main()
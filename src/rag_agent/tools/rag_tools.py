@@ -1,20 +1,103 @@
+import asyncio
+import functools
+import json
 from crewai.tools import BaseTool
-from typing import Type, List, Dict, Any
+from typing import Type, List, Dict, Any, Optional
 from pydantic import BaseModel, Field
-from ..rag_client import RAGClient
+from ..rag_client import get_rag_client
+from ..async_rag_client import async_backend_supported, get_async_rag_client
+from ..answer_cache import invalidate_answer_cache, record_tool_output
+from ..dedup import WriteResult
+from ..write_buffer import get_write_buffer
+from ..metrics import get_metrics
+from ..search_filter import SearchFilter, utc_now_iso
+from ..service import get_service_client
 
 class RAGSearchInput(BaseModel):
     """Input schema para búsqueda RAG."""
     query: str = Field(..., description="Consulta o pregunta para buscar en la base de conocimiento")
     max_results: int = Field(default=5, description="Número máximo de resultados a retornar")
+    category: Optional[str] = Field(
+        default=None,
+        description="Solo documentos de esta categoría (p. ej. 'tools', 'ai_fundamentals', 'user_data')"
+    )
+    source: Optional[str] = Field(default=None, description="Solo documentos de esta fuente")
+    namespaces: Optional[List[str]] = Field(
+        default=None,
+        description="Bases de conocimiento (equipos/clientes) en las que buscar a la vez; "
+                    "por defecto solo la principal"
+    )
 
 class RAGAddDocumentInput(BaseModel):
     """Input schema para añadir documentos."""
     text: str = Field(..., description="Texto del documento a añadir a la base de conocimiento")
     category: str = Field(default="general", description="Categoría del documento")
     source: str = Field(default="unknown", description="Fuente del documento")
+    namespace: Optional[str] = Field(
+        default=None, description="Base de conocimiento (equipo/cliente) donde guardarlo"
+    )
+
+class AsyncRAGTool(BaseTool):
+    """
+    Base de las herramientas RAG con ruta de ejecución asíncrona
+    
+    ¿Por qué arun?
+    - BaseTool.run es bloqueante; arun espera a _arun en el event loop actual
+    - Permite atender muchos crews concurrentes sin un hilo por llamada
+    """
+    
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any):
+        """
+        Envuelve _run y _arun de cada herramienta con un span de métricas
+        y registra su salida para la caché de respuestas (collect_tool_outputs)
+        
+        ¿Por qué aquí y no en run?
+        - CrewAI llama directamente a _run (CrewStructuredTool.func)
+        
+        _run delega en _run_impl (sin instrumentar): _arun la usa en un hilo
+        sin duplicar el span ni la salida registrada.
+        """
+        super().__pydantic_init_subclass__(**kwargs)
+        if "_run" in cls.__dict__:
+            cls._run = _instrumented_run(cls.__dict__["_run"])
+        if "_arun" in cls.__dict__:
+            cls._arun = _instrumented_arun(cls.__dict__["_arun"])
+    
+    async def arun(self, *args: Any, **kwargs: Any) -> Any:
+        result = await self._arun(*args, **kwargs)
+        self.current_usage_count += 1
+        return result
+
+def _tool_input(args, kwargs) -> str:
+    return json.dumps(kwargs or list(args), ensure_ascii=False, default=str)
+
+def _instrumented_run(run):
+    @functools.wraps(run)
+    def wrapper(self, *args, **kwargs):
+        with get_metrics().span("tool", tool=self.name):
+            result = run(self, *args, **kwargs)
+        record_tool_output(self.name, _tool_input(args, kwargs), result)
+        return result
+    return wrapper
+
+def _instrumented_arun(arun):
+    @functools.wraps(arun)
+    async def wrapper(self, *args, **kwargs):
+        with get_metrics().span("tool", tool=self.name):
+            result = await arun(self, *args, **kwargs)
+        record_tool_output(self.name, _tool_input(args, kwargs), result)
+        return result
+    return wrapper
+
+def _sync_fallback() -> bool:
+    """
+    La ruta asíncrona solo habla con un servidor Qdrant: con el servicio
+    residente o un backend embebido se usa la ruta síncrona (ver async_backend_supported)
+    """
+    return get_service_client() is not None or not async_backend_supported()
 
-class RAGSearchTool(BaseTool):
+class RAGSearchTool(AsyncRAGTool):
     """
     Herramienta para buscar información en la base de conocimiento vectorial
     
@@ -27,29 +110,70 @@ class RAGSearchTool(BaseTool):
     description: str = (
         "Busca información relevante en la base de conocimiento usando búsqueda semántica. "
         "Úsala cuando necesites información específica sobre un tema para responder preguntas "
-        "o completar tareas con datos precisos."
+        "o completar tareas con datos precisos. Opcionalmente filtra por category o source."
     )
     args_schema: Type[BaseModel] = RAGSearchInput
     
-    def _run(self, query: str, max_results: int = 5) -> str:
+    def _run(self, query: str, max_results: int = 5, category: Optional[str] = None,
+             source: Optional[str] = None, namespaces: Optional[List[str]] = None) -> str:
         """
         Ejecuta la búsqueda RAG
+        """
+        return self._run_impl(query, max_results, category, source, namespaces)
+    
+    def _run_impl(self, query: str, max_results: int, category: Optional[str],
+                  source: Optional[str], namespaces: Optional[List[str]]) -> str:
+        try:
+            # Servicio residente (RAG_SERVICE_URL): cliente caliente compartido entre procesos
+            service = get_service_client()
+            if service is not None:
+                context = service.context(query, max_tokens=750, category=category, source=source,
+                                          namespaces=namespaces)
+                return self._format_response(query, context)
+            
+            # Cliente RAG compartido (se conecta una sola vez por proceso)
+            rag_client = get_rag_client()
+            # Obtener contexto relevante (filtrado en el backend, no después)
+            context = rag_client.get_context_for_query(
+                query, max_tokens=750, search_filter=SearchFilter.build(category=category, source=source),
+                namespaces=namespaces
+            )
+            return self._format_response(query, context)
+            
+        except Exception as e:
+            return f"❌ Error en búsqueda RAG: {str(e)}"
+    
+    async def _arun(self, query: str, max_results: int = 5, category: Optional[str] = None,
+                    source: Optional[str] = None, namespaces: Optional[List[str]] = None) -> str:
+        """
+        Versión asíncrona de la búsqueda RAG (no bloquea el event loop)
+        """
+        if namespaces or _sync_fallback():
+            # Varios namespaces, servicio residente o backend embebido: ruta síncrona en un hilo
+            return await asyncio.to_thread(self._run_impl, query, max_results, category, source, namespaces)
+        try:
+            rag_client = get_async_rag_client()
+            context = await rag_client.get_context_for_query(
+                query, max_tokens=750, search_filter=SearchFilter.build(category=category, source=source)
+            )
+            return self._format_response(query, context)
+            
+        except Exception as e:
+            return f"❌ Error en búsqueda RAG: {str(e)}"
+    
+    def _format_response(self, query: str, context: str) -> str:
+        """
+        Formatea el contexto para el agente
         
         ¿Por qué retornar string y no objeto?
         - CrewAI espera strings como output de herramientas
         - Formato legible para que el LLM pueda procesarlo
         """
-        try:
-            # Crear cliente RAG
-            rag_client = RAGClient()
-            # Obtener contexto relevante
-            context = rag_client.get_context_for_query(query, max_context_length=3000)
-            
-            if "No se encontró información" in context:
-                return f"❌ No se encontró información relevante para la consulta: '{query}'"
-            
-            # Formatear respuesta para el agente
-            formatted_response = f"""
+        if "No se encontró información" in context:
+            return f"❌ No se encontró información relevante para la consulta: '{query}'"
+        
+        # Formatear respuesta para el agente
+        formatted_response = f"""
 🔍 RESULTADOS DE BÚSQUEDA RAG:
 Consulta: {query}
 
@@ -58,12 +182,9 @@ Consulta: {query}
 
 💡 Esta información proviene de la base de conocimiento vectorial y es relevante para tu consulta.
 """
-            return formatted_response
-            
-        except Exception as e:
-            return f"❌ Error en búsqueda RAG: {str(e)}"
+        return formatted_response
 
-class RAGAddDocumentTool(BaseTool):
+class RAGAddDocumentTool(AsyncRAGTool):
     """
     Herramienta para añadir documentos a la base de conocimiento
     
@@ -79,30 +200,103 @@ class RAGAddDocumentTool(BaseTool):
     )
     args_schema: Type[BaseModel] = RAGAddDocumentInput
     
-    def _run(self, text: str, category: str = "general", source: str = "unknown") -> str:
+    def _run(self, text: str, category: str = "general", source: str = "unknown",
+             namespace: Optional[str] = None) -> str:
         """
         Añade documento a la base de conocimiento
         """
+        return self._run_impl(text, category, source, namespace)
+    
+    def _run_impl(self, text: str, category: str, source: str, namespace: Optional[str]) -> str:
         try:
-            # Crear cliente RAG
-            rag_client = RAGClient()
-            metadata = {
-                "category": category,
-                "source": source,
-                "added_by": "agent"
-            }
+            service = get_service_client()
+            if service is not None:
+                result, duplicates_avoided = service.add(text, self._metadata(category, source), namespace)
+                if result is None:
+                    return self._format_queued(category, source)
+                return self._format_response(result, category, source, duplicates_avoided)
             
-            success = rag_client.add_document(text, metadata)
+            # Colección del namespace, si se indica (None = la principal)
+            namespace_client = get_rag_client().namespace_client(namespace) if namespace else None
             
-            if success:
-                return f"✅ Documento añadido exitosamente a la categoría '{category}' desde fuente '{source}'"
-            else:
-                return f"❌ Error al añadir documento a la base de conocimiento"
+            # Escritura diferida: retornar en cuanto el documento está encolado
+            write_buffer = get_write_buffer(namespace_client)
+            if write_buffer is not None:
+                write_buffer.enqueue(text, self._metadata(category, source))
+                return self._format_queued(category, source)
+            
+            # Cliente RAG compartido (se conecta una sola vez por proceso)
+            rag_client = namespace_client or get_rag_client()
+            result = rag_client.add_document_unique(text, self._metadata(category, source))
+            if result.changed:
+                # Las respuestas cacheadas no conocen el documento nuevo
+                invalidate_answer_cache()
+            return self._format_response(result, category, source, rag_client.duplicates_avoided)
                 
         except Exception as e:
             return f"❌ Error añadiendo documento: {str(e)}"
+    
+    async def _arun(self, text: str, category: str = "general", source: str = "unknown",
+                    namespace: Optional[str] = None) -> str:
+        """
+        Versión asíncrona: añade documento sin bloquear el event loop
+        """
+        if namespace or _sync_fallback():
+            # Namespaces, servicio residente o backend embebido: ruta síncrona (en un hilo)
+            return await asyncio.to_thread(self._run_impl, text, category, source, namespace)
+        try:
+            write_buffer = get_write_buffer()
+            if write_buffer is not None:
+                write_buffer.enqueue(text, self._metadata(category, source))
+                return self._format_queued(category, source)
+            
+            rag_client = get_async_rag_client()
+            result = await rag_client.add_document_unique(text, self._metadata(category, source))
+            if result.changed:
+                await asyncio.to_thread(invalidate_answer_cache)
+            return self._format_response(result, category, source, rag_client.duplicates_avoided)
+                
+        except Exception as e:
+            return f"❌ Error añadiendo documento: {str(e)}"
+    
+    def _metadata(self, category: str, source: str) -> Dict[str, Any]:
+        return {
+            "category": category,
+            "source": source,
+            "added_by": "agent",
+            "added_at": utc_now_iso()
+        }
+    
+    def _format_queued(self, category: str, source: str) -> str:
+        return (f"✅ Documento encolado para la categoría '{category}' desde fuente '{source}' "
+                f"(se guardará en segundo plano)")
+    
+    def _format_response(self, result: WriteResult, category: str, source: str,
+                         duplicates_avoided: int = 0) -> str:
+        """
+        Informa qué pasó con la escritura
+        
+        ¿Por qué detallar los duplicados?
+        - El agente sabe que ese hallazgo ya estaba y no insiste en guardarlo
+        - El total de duplicados evitados muestra cuánto crecimiento se ahorró
+        """
+        if not result.ok:
+            return f"❌ Error al añadir documento a la base de conocimiento"
+        if not result.duplicate:
+            return f"✅ Documento añadido exitosamente a la categoría '{category}' desde fuente '{source}'"
+        
+        actions = {
+            "skipped": "no se volvió a guardar",
+            "merged": "se combinaron los metadatos",
+            "replaced": "se reemplazó por el texto nuevo",
+        }
+        return (
+            f"♻️ Ya existía un documento casi idéntico (ID {result.duplicate_of}, "
+            f"similitud {result.score:.3f}): {actions[result.action]}. "
+            f"Duplicados evitados: {duplicates_avoided}"
+        )
 
-class RAGContextTool(BaseTool):
+class RAGContextTool(AsyncRAGTool):
     """
     Herramienta especializada para obtener contexto específico para preguntas
     
@@ -118,19 +312,52 @@ class RAGContextTool(BaseTool):
     )
     args_schema: Type[BaseModel] = RAGSearchInput
     
-    def _run(self, query: str, max_results: int = 3) -> str:
+    def _run(self, query: str, max_results: int = 3, category: Optional[str] = None,
+             source: Optional[str] = None, namespaces: Optional[List[str]] = None) -> str:
         """
         Obtiene contexto limpio para el LLM
         """
+        return self._run_impl(query, max_results, category, source, namespaces)
+    
+    def _run_impl(self, query: str, max_results: int, category: Optional[str],
+                  source: Optional[str], namespaces: Optional[List[str]]) -> str:
         try:
-            # Crear cliente RAG
-            rag_client = RAGClient()
-            context = rag_client.get_context_for_query(query, max_context_length=2000)
+            service = get_service_client()
+            if service is not None:
+                context = service.context(query, max_tokens=500, category=category, source=source,
+                                          namespaces=namespaces)
+                return self._format_response(context)
             
-            if "No se encontró información" in context:
-                return "CONTEXTO: No hay información específica disponible en la base de conocimiento para esta consulta."
+            # Cliente RAG compartido (se conecta una sola vez por proceso)
+            rag_client = get_rag_client()
+            context = rag_client.get_context_for_query(
+                query, max_tokens=500, search_filter=SearchFilter.build(category=category, source=source),
+                namespaces=namespaces
+            )
+            return self._format_response(context)
             
-            return f"CONTEXTO RELEVANTE:\n{context}"
+        except Exception as e:
+            return f"ERROR AL OBTENER CONTEXTO: {str(e)}"
+    
+    async def _arun(self, query: str, max_results: int = 3, category: Optional[str] = None,
+                    source: Optional[str] = None, namespaces: Optional[List[str]] = None) -> str:
+        """
+        Versión asíncrona: obtiene contexto sin bloquear el event loop
+        """
+        if namespaces or _sync_fallback():
+            return await asyncio.to_thread(self._run_impl, query, max_results, category, source, namespaces)
+        try:
+            rag_client = get_async_rag_client()
+            context = await rag_client.get_context_for_query(
+                query, max_tokens=500, search_filter=SearchFilter.build(category=category, source=source)
+            )
+            return self._format_response(context)
             
         except Exception as e:
-            return f"ERROR AL OBTENER CONTEXTO: {str(e)}" 
\ No newline at end of file
+            return f"ERROR AL OBTENER CONTEXTO: {str(e)}"
+    
+    def _format_response(self, context: str) -> str:
+        if "No se encontró información" in context:
+            return "CONTEXTO: No hay información específica disponible en la base de conocimiento para esta consulta."
+        
+        return f"CONTEXTO RELEVANTE:\n{context}"
@@ -0,0 +1,768 @@
+"""
+Backends de almacenamiento vectorial para RAGClient
+
+¿Por qué backends intercambiables?
+- Qdrant (servidor, local en disco o :memory:) para colecciones grandes
+- NumPy embebido para despliegues pequeños: sin salto HTTP en cada búsqueda
+- Todos retornan exactamente el mismo formato de resultados
+"""
+
+import dataclasses
+import json
+import logging
+import os
+import threading
+import uuid
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    PointIdsList, PointStruct, Prefetch, QueryRequest, SearchParams
+)
+
+from .collection_config import FULL_VECTOR, PREFIX_VECTOR, CollectionConfig
+from .search_filter import SearchFilter
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# El log de operaciones se compacta en points.json al superar este tamaño
+# (o el del propio points.json): coste amortizado O(1) por escritura
+NUMPY_LOG_COMPACT_BYTES = 1 << 20
+
+PointId = Union[str, int]
+
+# Lote de puntos tal como están guardados: (IDs, matriz de vectores, payloads)
+PointBatch = Tuple[List[PointId], np.ndarray, List[Dict[str, Any]]]
+
+
+def normalize_point_id(point_id: PointId) -> PointId:
+    """
+    Normaliza un ID igual que Qdrant: enteros tal cual, UUID/hex a UUID canónico
+    """
+    if isinstance(point_id, int):
+        return point_id
+    return str(uuid.UUID(str(point_id)))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def format_hits(hits) -> List[Dict]:
+    """
+    Convierte los resultados de Qdrant en diccionarios simples
+
+    Los IDs se normalizan: el servidor retorna UUID canónicos pero el modo
+    local de qdrant-client retorna el ID tal como se insertó.
+    Si la búsqueda pidió vectores se incluyen en "vector" (el completo, si
+    la colección tiene vectores con nombre).
+    """
+    results = []
+    for hit in hits:
+        result = {
+            "text": hit.payload.get("text", ""),
+            "metadata": hit.payload.get("metadata", {}),
+            "score": hit.score,
+            "id": normalize_point_id(hit.id)
+        }
+        vector = hit.vector
+        if isinstance(vector, dict):
+            vector = vector.get(FULL_VECTOR)
+        if vector is not None:
+            result["vector"] = vector
+        results.append(result)
+    return results
+
+
+def two_stage_request(vector: Sequence[float], config: CollectionConfig, limit: int,
+                      score_threshold: Optional[float] = None,
+                      search_params: Optional[SearchParams] = None,
+                      with_vectors: bool = False, query_filter=None) -> QueryRequest:
+    """
+    Consulta Matryoshka para la Query API de Qdrant
+
+    - prefetch: candidatos con el prefijo (índice HNSW pequeño, filtros incluidos)
+    - query: los candidatos se reordenan con el vector completo
+    """
+    values = [float(value) for value in vector]
+    return QueryRequest(
+        prefetch=Prefetch(
+            query=values[:config.prefix_dimension],
+            using=PREFIX_VECTOR,
+            limit=config.prefix_candidates(limit),
+            filter=query_filter,
+            params=search_params
+        ),
+        query=values,
+        using=FULL_VECTOR,
+        limit=limit,
+        score_threshold=score_threshold,
+        with_payload=True,
+        with_vector=[FULL_VECTOR] if with_vectors else False
+    )
+
+
+def query_request(vector: Sequence[float], config: Optional[CollectionConfig], limit: int,
+                  score_threshold: Optional[float] = None,
+                  search_params: Optional[SearchParams] = None,
+                  with_vectors: bool = False, query_filter=None) -> QueryRequest:
+    """
+    Consulta de la Query API para una colección con o sin prefijo Matryoshka
+
+    query_batch_points reemplaza a search_batch (obsoleto en qdrant-client).
+    """
+    if config is not None and config.prefix_dimension is not None:
+        return two_stage_request(vector, config, limit, score_threshold, search_params,
+                                 with_vectors, query_filter)
+    return QueryRequest(
+        query=[float(value) for value in vector],
+        filter=query_filter,
+        limit=limit,
+        score_threshold=score_threshold,
+        params=search_params,
+        with_payload=True,
+        with_vector=with_vectors
+    )
+
+
+def existing_layout(collection_name: str, info, config: CollectionConfig) -> CollectionConfig:
+    """
+    Esquema de una colección ya creada: el de la colección manda sobre el entorno
+
+    Avisa si la dimensión no coincide con EMBEDDING_DIMENSION o si
+    MATRYOSHKA_DIMENSION no coincide con los vectores de la colección.
+    """
+    vectors = info.config.params.vectors
+    prefix_dimension = None
+    if isinstance(vectors, dict):
+        prefix_dimension = vectors[PREFIX_VECTOR].size if PREFIX_VECTOR in vectors else None
+        vectors = vectors.get(FULL_VECTOR)
+    size = getattr(vectors, "size", None)
+    if size is not None and size != config.dimension:
+        logger.warning("⚠️ La colección '%s' tiene dimensión %s, pero EMBEDDING_DIMENSION=%s",
+                       collection_name, size, config.dimension)
+    if prefix_dimension != config.prefix_dimension:
+        logger.warning("⚠️ La colección '%s' tiene prefijo Matryoshka %s, pero MATRYOSHKA_DIMENSION=%s "
+                       "(se usa el de la colección; recréala para cambiarlo)",
+                       collection_name, prefix_dimension, config.prefix_dimension)
+    return dataclasses.replace(config, prefix_dimension=prefix_dimension)
+
+
+class VectorStore:
+    """
+    Interfaz común de los backends
+
+    Los payloads tienen la forma {"text": ..., "metadata": {...}} y los
+    resultados de búsqueda la forma {"text", "metadata", "score", "id"}.
+    """
+
+    collection_name: str
+
+    def ensure_collection(self, config: CollectionConfig) -> bool:
+        """Crea la colección si no existe; retorna True si la creó"""
+        raise NotImplementedError
+
+    def upsert(self, ids: Sequence[PointId], vectors: Sequence[Sequence[float]],
+               payloads: Sequence[Dict[str, Any]], wait: bool = True):
+        raise NotImplementedError
+
+    def search_batch(self, vectors: np.ndarray, limit: int,
+                     score_threshold: Optional[float] = None,
+                     search_params: Optional[SearchParams] = None,
+                     with_vectors: bool = False,
+                     search_filter: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """
+        Busca varios vectores a la vez
+
+        search_params solo aplica a índices aproximados; con with_vectors cada
+        resultado incluye además su "vector" (para MMR en el ensamblado de contexto).
+        search_filter restringe la búsqueda por metadatos antes de elegir el top-k.
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: Sequence[PointId]):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def exists(self) -> bool:
+        """True si la colección ya existe (sin crearla)"""
+        raise NotImplementedError
+
+    def scroll(self, batch_size: int = 256) -> Iterator[PointBatch]:
+        """
+        Recorre todos los puntos por lotes (vectores completos en float32)
+
+        Para exportar la colección sin volver a calcular embeddings.
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """Elimina la colección completa (ensure_collection la vuelve a crear)"""
+        raise NotImplementedError
+
+    def for_collection(self, collection_name: str) -> "VectorStore":
+        """Otro store del mismo backend (misma conexión/directorio) para otra colección"""
+        raise NotImplementedError
+
+
+class QdrantVectorStore(VectorStore):
+    """Backend Qdrant: servidor remoto, modo local en disco o :memory:"""
+
+    def __init__(self, client: QdrantClient, collection_name: str):
+        self.client = client
+        self.collection_name = collection_name
+        # Esquema real de la colección (lo fija ensure_collection)
+        self.config: Optional[CollectionConfig] = None
+
+    @property
+    def two_stage(self) -> bool:
+        return self.config is not None and self.config.prefix_dimension is not None
+
+    def ensure_collection(self, config: CollectionConfig) -> bool:
+        collections = self.client.get_collections()
+        collection_names = [col.name for col in collections.collections]
+        if self.collection_name in collection_names:
+            info = self.client.get_collection(self.collection_name)
+            self.config = existing_layout(self.collection_name, info, config)
+            self._ensure_payload_indexes(config, info.payload_schema or {})
+            return False
+
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            **config.create_collection_kwargs()
+        )
+        self.config = config
+        self._ensure_payload_indexes(config, {})
+        return True
+
+    def _ensure_payload_indexes(self, config: CollectionConfig, existing: Dict[str, Any]):
+        """Crea los índices de payload que falten (también en colecciones ya existentes)"""
+        for field_name, schema in config.payload_index_schemas().items():
+            if field_name in existing:
+                continue
+            with warnings.catch_warnings():
+                # El modo local de qdrant-client ignora los índices y lo avisa en cada llamada
+                warnings.filterwarnings("ignore", message="Payload indexes have no effect")
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=schema
+                )
+            logger.debug("✅ Índice de payload '%s' (%s) en '%s'", field_name, schema, self.collection_name)
+
+    def upsert(self, ids, vectors, payloads, wait: bool = True):
+        # IDs canónicos: el modo local guarda el ID tal cual y luego no coincidiría
+        # con los IDs normalizados que retornan las búsquedas
+        points = [
+            PointStruct(
+                id=normalize_point_id(point_id),
+                vector=self.config.point_vector(vector) if self.two_stage else [float(value) for value in vector],
+                payload=payload
+            )
+            for point_id, vector, payload in zip(ids, vectors, payloads)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+
+    def search_batch(self, vectors, limit, score_threshold=None, search_params=None,
+                     with_vectors=False, search_filter=None):
+        # El filtro se evalúa dentro del recorrido HNSW (con los índices de payload)
+        query_filter = search_filter.to_qdrant() if search_filter is not None else None
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                query_request(vector, self.config, limit, score_threshold, search_params,
+                              with_vectors, query_filter)
+                for vector in vectors
+            ]
+        )
+        return [format_hits(response.points) for response in responses]
+
+    def delete(self, ids):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=[normalize_point_id(point_id) for point_id in ids])
+        )
+
+    def count(self) -> int:
+        return self.client.count(collection_name=self.collection_name, exact=False).count
+
+    def exists(self) -> bool:
+        collections = self.client.get_collections()
+        return self.collection_name in [col.name for col in collections.collections]
+
+    def scroll(self, batch_size: int = 256) -> Iterator[PointBatch]:
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=[FULL_VECTOR] if self.two_stage else True
+            )
+            if records:
+                vectors = [
+                    record.vector[FULL_VECTOR] if isinstance(record.vector, dict) else record.vector
+                    for record in records
+                ]
+                yield ([normalize_point_id(record.id) for record in records],
+                       np.asarray(vectors, dtype=np.float32),
+                       [record.payload or {} for record in records])
+            if offset is None:
+                return
+
+    def clear(self):
+        self.client.delete_collection(collection_name=self.collection_name)
+
+    def for_collection(self, collection_name: str) -> "QdrantVectorStore":
+        return QdrantVectorStore(self.client, collection_name)
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Backend embebido: búsqueda exacta por fuerza bruta con NumPy
+
+    ¿Cómo funciona?
+    - Vectores normalizados float32 en una matriz (memory-mapped si hay `path`)
+    - Similitud coseno = producto punto vectorizado contra toda la matriz
+    - Top-k con argpartition (O(n)) y orden solo de los k candidatos
+    - Pensado para pocos miles de fragmentos: sin red, sin servidor
+
+    Con DISTANCE_METRIC=dot los vectores no se normalizan; con euclidean el
+    score es la distancia (menor es mejor y score_threshold es un máximo),
+    igual que en Qdrant.
+
+    En disco se guardan `vectors.f32` (matriz con capacidad reservada),
+    `points.json` (IDs, payloads, dimensión y métrica) y un log de operaciones
+    (`points.<n>.log`): cada upsert/delete añade una línea en lugar de
+    reescribir points.json, que solo se regenera al compactar el log.
+
+    Un directorio tiene un solo escritor: en el proceso se comparte una
+    instancia por ruta (ver shared) y otro proceso que intente escribir
+    falla en lugar de pisar los archivos (usa Qdrant o RAG_SERVICE_URL).
+
+    Con prefix_dimension (Matryoshka) se mantiene además en RAM una matriz con
+    el prefijo de cada vector: la primera etapa recorre solo esa matriz y la
+    completa (memory-mapped) solo se lee para reordenar los candidatos.
+    """
+
+    def __init__(self, collection_name: str, path: Optional[Union[str, Path]] = None):
+        self.collection_name = collection_name
+        self.path = Path(path) / collection_name if path else None
+
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._log_generation = 0
+        self._log_bytes = 0
+        self._snapshot_bytes = 0
+        self._dim: Optional[int] = None
+        self._distance = "cosine"
+        self._ids: List[PointId] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._rows: Dict[PointId, int] = {}
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._prefix_dim: Optional[int] = None
+        self._prefix_oversampling = 4.0
+        self._prefix = np.empty((0, 0), dtype=np.float32)
+
+        if self.path is not None and (self.path / "points.json").exists():
+            self._load()
+
+    @classmethod
+    def shared(cls, collection_name: str, path: Optional[Union[str, Path]] = None) -> "NumpyVectorStore":
+        """
+        Instancia única por directorio en este proceso
+
+        ¿Por qué?
+        - Dos instancias sobre los mismos archivos tienen estados distintos en
+          memoria y cada una sobrescribe lo que escribió la otra
+        """
+        if not path:
+            return cls(collection_name)
+        key = (Path(path) / collection_name).resolve()
+        with _shared_numpy_stores_lock:
+            store = _shared_numpy_stores.get(key)
+            if store is None:
+                store = cls(collection_name, path)
+                _shared_numpy_stores[key] = store
+        return store
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def _log_path(self) -> Path:
+        return self.path / f"points.{self._log_generation}.log"
+
+    def _lock_directory(self):
+        """Toma el directorio como escritor (bloqueo exclusivo entre procesos)"""
+        if self.path is None or self._lock_file is not None or fcntl is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path / ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(f"Otro proceso escribe en {self.path}: NumPy admite un solo "
+                               f"escritor (usa Qdrant o el servicio residente, RAG_SERVICE_URL)")
+        self._lock_file = lock_file
+
+    def _load(self):
+        snapshot = (self.path / "points.json").read_text(encoding="utf-8")
+        meta = json.loads(snapshot)
+        self._snapshot_bytes = len(snapshot)
+        self._dim = meta["dim"]
+        self._distance = meta.get("distance", "cosine")
+        self._ids = [
+            point_id if isinstance(point_id, int) else str(point_id) for point_id in meta["ids"]
+        ]
+        self._payloads = meta["payloads"]
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+        self._prefix_dim = meta.get("prefix_dim")
+        self._prefix_oversampling = meta.get("prefix_oversampling", 4.0)
+        self._log_generation = meta.get("log_generation", 0)
+        pending_moves = self._replay_log()
+        # La capacidad puede haber crecido después de escribir points.json
+        file_rows = self._vectors_path.stat().st_size // (self._dim * 4) if self._vectors_path.exists() else 0
+        capacity = max(meta["capacity"], file_rows)
+        if capacity == 0:
+            self._matrix = np.empty((0, self._dim), dtype=np.float32)
+        else:
+            self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                     shape=(capacity, self._dim))
+            # Repetirlos es inocuo: cada origen queda fuera de las filas vivas y ningún
+            # movimiento posterior del mismo delete lo sobrescribe. El prefijo se
+            # calcula justo después, ya con las filas movidas
+            for row, last in pending_moves:
+                self._matrix[row] = self._matrix[last]
+            self._matrix.flush()
+        if self._prefix_dim is not None:
+            # El prefijo no se persiste: se recalcula una vez al abrir
+            self._prefix = np.zeros((self._matrix.shape[0], self._prefix_dim), dtype=np.float32)
+            self._prefix[:len(self._ids)] = self._prefix_rows(self._matrix[:len(self._ids)])
+
+    def _replay_log(self) -> List[Tuple[int, int]]:
+        """
+        Aplica a IDs y payloads las operaciones posteriores a points.json
+
+        Retorna los movimientos de filas del último delete del log: el proceso
+        pudo caerse entre registrarlo y mover los vectores, así que se repiten
+        (ver delete).
+        """
+        pending_moves = []
+        if not self._log_path.exists():
+            return pending_moves
+        with open(self._log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Última línea a medio escribir durante un fallo
+                    logger.warning("⚠️ Línea inválida en %s descartada", self._log_path)
+                    break
+                ids = [point_id if isinstance(point_id, int) else str(point_id) for point_id in entry["ids"]]
+                if entry["op"] == "upsert":
+                    self._upsert_rows(ids, entry["payloads"])
+                    pending_moves = []
+                else:
+                    pending_moves = self._delete_rows(ids)
+                self._log_bytes += len(line.encode("utf-8"))
+        return pending_moves
+
+    def _append_log(self, entry: Dict[str, Any]):
+        """Registra una operación en disco (O(tamaño de la operación), no de la colección)"""
+        if self.path is None:
+            return
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_bytes += len(line.encode("utf-8"))
+
+    def _compact_if_needed(self):
+        if self.path is not None and self._log_bytes > max(NUMPY_LOG_COMPACT_BYTES, self._snapshot_bytes):
+            self._save()
+
+    def _save(self):
+        """Compacta: escribe points.json completo y empieza un log nuevo"""
+        if self.path is None:
+            return
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+        old_log = self._log_path
+        meta = {
+            "dim": self._dim,
+            "distance": self._distance,
+            "prefix_dim": self._prefix_dim,
+            "prefix_oversampling": self._prefix_oversampling,
+            "capacity": int(self._matrix.shape[0]),
+            "log_generation": self._log_generation + 1,
+            "ids": self._ids,
+            "payloads": self._payloads,
+        }
+        snapshot = json.dumps(meta, ensure_ascii=False)
+        tmp_path = self.path / "points.json.tmp"
+        tmp_path.write_text(snapshot, encoding="utf-8")
+        # Tras el replace el log anterior ya no se lee: borrarlo es opcional
+        os.replace(tmp_path, self.path / "points.json")
+        old_log.unlink(missing_ok=True)
+        self._log_generation += 1
+        self._snapshot_bytes = len(snapshot)
+        self._log_bytes = 0
+
+    def _reserve(self, rows: int):
+        """Asegura capacidad para `rows` filas (crecimiento geométrico)"""
+        capacity = self._matrix.shape[0]
+        if rows <= capacity:
+            return
+
+        new_capacity = max(rows, capacity * 2, 64)
+        if self._prefix_dim is not None:
+            prefix = np.zeros((new_capacity, self._prefix_dim), dtype=np.float32)
+            prefix[:len(self._ids)] = self._prefix[:len(self._ids)]
+            self._prefix = prefix
+        if self.path is None:
+            matrix = np.zeros((new_capacity, self._dim), dtype=np.float32)
+            matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+            self._matrix = matrix
+            return
+
+        if isinstance(self._matrix, np.memmap):
+            self._matrix.flush()
+            del self._matrix
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self._dim * 4)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                 shape=(new_capacity, self._dim))
+
+    def ensure_collection(self, config: CollectionConfig) -> bool:
+        with self._lock:
+            if self._dim is not None:
+                return False
+            self._lock_directory()
+            self._dim = config.dimension
+            self._distance = config.distance
+            self._matrix = np.empty((0, self._dim), dtype=np.float32)
+            self._prefix_dim = config.prefix_dimension
+            self._prefix_oversampling = config.prefix_oversampling
+            if self._prefix_dim is not None:
+                self._prefix = np.empty((0, self._prefix_dim), dtype=np.float32)
+            if self.path is not None:
+                self.path.mkdir(parents=True, exist_ok=True)
+                self._vectors_path.touch()
+                self._save()
+            return True
+
+    def upsert(self, ids, vectors, payloads, wait: bool = True):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if vectors.shape[1] != self._dim:
+            raise ValueError(f"Dimensión {vectors.shape[1]} distinta de la colección ({self._dim})")
+        if self._distance == "cosine":
+            vectors = _normalize(vectors)
+
+        with self._lock:
+            self._lock_directory()
+            new_ids = [normalize_point_id(point_id) for point_id in ids]
+            payloads = list(payloads)
+            self._reserve(len(self._ids) + len(new_ids))
+            rows = self._upsert_rows(new_ids, payloads)
+            self._matrix[rows] = vectors
+            if self._prefix_dim is not None:
+                self._prefix[rows] = self._prefix_rows(vectors)
+            if isinstance(self._matrix, np.memmap):
+                # Los vectores llegan a disco antes que la operación que los referencia
+                self._matrix.flush()
+            self._append_log({"op": "upsert", "ids": new_ids, "payloads": payloads})
+            self._compact_if_needed()
+
+    def _upsert_rows(self, ids: List[PointId], payloads: List[Dict[str, Any]]) -> List[int]:
+        """Asigna fila a cada ID (nueva al final o la existente); retorna las filas"""
+        rows = []
+        for point_id, payload in zip(ids, payloads):
+            row = self._rows.get(point_id)
+            if row is None:
+                row = len(self._ids)
+                self._rows[point_id] = row
+                self._ids.append(point_id)
+                self._payloads.append(payload)
+            else:
+                self._payloads[row] = payload
+            rows.append(row)
+        return rows
+
+    def _prefix_rows(self, vectors: np.ndarray) -> np.ndarray:
+        """Prefijo Matryoshka de cada fila (renormalizado con coseno)"""
+        prefix = np.asarray(vectors[:, :self._prefix_dim], dtype=np.float32)
+        return _normalize(prefix) if self._distance == "cosine" else prefix
+
+    def _score(self, queries: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        """Scores (consultas x filas) en una sola multiplicación de matrices"""
+        scores = queries @ matrix.T
+        if self._distance == "euclid":
+            squared = (queries ** 2).sum(axis=1)[:, None] + (matrix ** 2).sum(axis=1)[None, :]
+            scores = np.sqrt(np.maximum(squared - 2 * scores, 0))
+        return scores
+
+    def search_batch(self, vectors, limit, score_threshold=None, search_params=None,
+                     with_vectors=False, search_filter=None):
+        # Búsqueda exacta: search_params (hnsw_ef, oversampling) no aplica
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        if self._distance == "cosine":
+            queries = _normalize(queries)
+        euclid = self._distance == "euclid"
+
+        with self._lock:
+            count = len(self._ids)
+            if count == 0:
+                return [[] for _ in range(len(queries))]
+
+            matrix = self._matrix[:count]
+            available = count
+            allowed = None
+            if search_filter is not None:
+                # Pre-filtrado: las filas excluidas nunca entran en el top-k
+                allowed = np.fromiter(
+                    (search_filter.matches(payload.get("metadata", {})) for payload in self._payloads),
+                    dtype=bool, count=count
+                )
+                available = int(allowed.sum())
+                if available == 0:
+                    return [[] for _ in range(len(queries))]
+            k = min(limit, available)
+
+            if self._prefix_dim is None:
+                stage_scores = self._score(queries, matrix)
+                candidates = k
+            else:
+                # Etapa 1: solo la matriz de prefijos (en RAM, pocas dimensiones)
+                stage_scores = self._score(self._prefix_rows(queries), self._prefix[:count])
+                candidates = min(max(k, int(limit * self._prefix_oversampling)), available)
+            # rank: mayor es mejor en todas las métricas
+            ranks = -stage_scores if euclid else stage_scores
+            if allowed is not None:
+                ranks = np.where(allowed[None, :], ranks, -np.inf)
+
+            all_results = []
+            for i, row_ranks in enumerate(ranks):
+                top = np.argpartition(-row_ranks, candidates - 1)[:candidates]
+                if self._prefix_dim is None:
+                    top_scores = stage_scores[i, top]
+                else:
+                    # Etapa 2: reordenar los candidatos con el vector completo
+                    top_scores = self._score(queries[i:i + 1], matrix[top])[0]
+                order = np.argsort(top_scores if euclid else -top_scores, kind="stable")[:k]
+                results = []
+                for row, score in zip(top[order], top_scores[order]):
+                    score = float(score)
+                    if score_threshold is not None and (
+                        score > score_threshold if euclid else score < score_threshold
+                    ):
+                        break
+                    payload = self._payloads[row]
+                    result = {
+                        "text": payload.get("text", ""),
+                        "metadata": payload.get("metadata", {}),
+                        "score": score,
+                        "id": self._ids[row]
+                    }
+                    if with_vectors:
+                        result["vector"] = np.array(matrix[row])
+                    results.append(result)
+                all_results.append(results)
+            return all_results
+
+    def delete(self, ids):
+        with self._lock:
+            self._lock_directory()
+            ids = [normalize_point_id(point_id) for point_id in ids]
+            moves = self._delete_rows(ids)
+            # Primero el log (con fsync) y después los vectores: si el proceso cae
+            # entre ambos pasos, al abrir se repiten los movimientos (ver _load)
+            self._append_log({"op": "delete", "ids": ids})
+            self._move_rows(moves)
+            self._compact_if_needed()
+
+    def _move_rows(self, moves: List[Tuple[int, int]]):
+        """Aplica los movimientos (hueco, última) de un delete a vectores y prefijos"""
+        for row, last in moves:
+            self._matrix[row] = self._matrix[last]
+            if self._prefix_dim is not None:
+                self._prefix[row] = self._prefix[last]
+
+    def _delete_rows(self, ids: List[PointId]) -> List[Tuple[int, int]]:
+        """
+        Quita los IDs moviendo la última fila a cada hueco (matriz compacta)
+
+        Retorna los movimientos (hueco, última) que hay que aplicar, en orden, a los vectores.
+        """
+        moves = []
+        for point_id in ids:
+            row = self._rows.pop(point_id, None)
+            if row is None:
+                continue
+            last = len(self._ids) - 1
+            if row != last:
+                self._ids[row] = self._ids[last]
+                self._payloads[row] = self._payloads[last]
+                self._rows[self._ids[row]] = row
+                moves.append((row, last))
+            self._ids.pop()
+            self._payloads.pop()
+        return moves
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def exists(self) -> bool:
+        return self._dim is not None
+
+    def scroll(self, batch_size: int = 256) -> Iterator[PointBatch]:
+        start = 0
+        while True:
+            # Copia bajo el lock: un delete concurrente mueve filas
+            with self._lock:
+                end = min(start + batch_size, len(self._ids))
+                if start >= end:
+                    return
+                batch = (list(self._ids[start:end]), np.array(self._matrix[start:end]),
+                         list(self._payloads[start:end]))
+            yield batch
+            start = end
+
+    def clear(self):
+        with self._lock:
+            self._lock_directory()
+            if isinstance(self._matrix, np.memmap):
+                del self._matrix
+            self._dim = None
+            self._prefix_dim = None
+            self._ids, self._payloads, self._rows = [], [], {}
+            self._matrix = np.empty((0, 0), dtype=np.float32)
+            self._prefix = np.empty((0, 0), dtype=np.float32)
+            self._log_bytes = self._snapshot_bytes = 0
+            if self.path is not None:
+                for name in ("points.json", "vectors.f32"):
+                    (self.path / name).unlink(missing_ok=True)
+                for log_path in self.path.glob("points.*.log"):
+                    log_path.unlink()
+
+    def for_collection(self, collection_name: str) -> "NumpyVectorStore":
+        return NumpyVectorStore.shared(collection_name, path=self.path.parent if self.path else None)
+
+
+_shared_numpy_stores: Dict[Path, NumpyVectorStore] = {}
+_shared_numpy_stores_lock = threading.Lock()
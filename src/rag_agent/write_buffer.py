@@ -0,0 +1,372 @@
+"""
+Escritura diferida (write-behind) de los documentos que añaden los agentes
+
+¿Por qué diferir las escrituras?
+- Cada rag_add_document bloquea el turno del agente en un embedding y un upsert
+- El agente casi nunca vuelve a leer en el mismo turno lo que acaba de guardar
+- Un hilo en segundo plano agrupa las escrituras: un embedding y un upsert por lote
+
+¿Cómo se evita perder escrituras?
+- Cada documento se añade (con fsync, fuera del lock: los productores no se
+  esperan entre sí) a un archivo de derrame JSONL antes de encolarse; tras
+  escribir un lote el archivo se reescribe con lo pendiente
+- Cada buffer tiene su propio archivo (<base>.<pid>-<id>.jsonl): varios
+  procesos sobre la misma colección no se pisan lo pendiente
+- Al arrancar, se vuelven a encolar los archivos de la colección cuyo
+  proceso ya terminó (p. ej. tras un fallo)
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Union
+
+from .answer_cache import invalidate_answer_cache
+from .metrics import get_metrics
+from .rag_client import RAGClient, get_rag_client
+
+logger = logging.getLogger(__name__)
+
+# <base>.<pid>-<id>.jsonl: el PID dice si el dueño del archivo sigue vivo
+_SPILL_OWNER_RE = re.compile(r"(\d+)-[0-9a-f]+")
+
+# Archivos de derrame de los buffers abiertos en este proceso
+_live_spill_paths: Set[Path] = set()
+_live_spill_paths_lock = threading.Lock()
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill(pid, 0) no es una consulta en Windows; recuperar es seguro
+        # porque las escrituras son idempotentes (mismo ID por texto)
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindBuffer:
+    """
+    Cola de documentos que un hilo escribe por lotes con add_documents_unique
+
+    - max_batch: escribe en cuanto hay tantos documentos pendientes
+    - flush_interval: escribe como mucho tras estos segundos de espera
+    - max_backoff: espera máxima entre reintentos tras lotes fallidos (la espera
+      se duplica en cada fallo; encolar más documentos no la acorta)
+    - spill_path: ruta base del derrame; el buffer escribe en su propio
+      <base>.<pid>-<id>.jsonl y recupera los archivos huérfanos de la base
+    - flush(): espera a que todo lo encolado esté escrito (p. ej. al terminar el crew)
+    """
+
+    def __init__(self, rag_client: RAGClient, spill_path: Union[str, Path],
+                 max_batch: int = 32, flush_interval: float = 2.0, max_backoff: float = 60.0):
+        self.rag_client = rag_client
+        self.base_path = Path(spill_path)
+        self.spill_path = self.base_path.with_name(
+            f"{self.base_path.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}{self.base_path.suffix}"
+        )
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+
+        self._pending: List[Dict[str, Any]] = []
+        # Documentos que se están escribiendo en el derrame (aún no encolados)
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._oldest = time.monotonic()
+        self._flush_requested = False
+        self._failures = 0
+        self._retry_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.failed_batches = 0
+
+        self._recover()
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def _orphan_spill_files(self) -> List[Path]:
+        """Archivos de derrame de la colección sin un buffer vivo que los atienda"""
+        base = self.base_path
+        orphans = [base] if base.exists() else []
+        with _live_spill_paths_lock:
+            live = set(_live_spill_paths)
+        for path in sorted(base.parent.glob(f"{base.stem}.*{base.suffix}")):
+            owner = _SPILL_OWNER_RE.fullmatch(path.name[len(base.stem) + 1:-len(base.suffix) or None])
+            if owner is None or path in live:
+                continue
+            pid = int(owner.group(1))
+            if pid == os.getpid() or not _process_alive(pid):
+                orphans.append(path)
+        return orphans
+
+    def _recover(self):
+        """
+        Vuelve a encolar lo que quedó en archivos de derrame huérfanos
+
+        Cada archivo se reclama con un rename atómico a un nombre de este
+        proceso: si dos procesos arrancan a la vez solo uno lo recupera.
+        """
+        with _live_spill_paths_lock:
+            _live_spill_paths.add(self.spill_path)
+        if not self.base_path.parent.exists():
+            return
+        claimed = []
+        write_ids = set()
+        for orphan in self._orphan_spill_files():
+            claim = self.spill_path.with_name(
+                f"{self.base_path.stem}.{os.getpid()}-{uuid.uuid4().hex[:8]}{self.base_path.suffix}"
+            )
+            try:
+                os.replace(orphan, claim)
+            except FileNotFoundError:
+                continue
+            claimed.append(claim)
+            with open(claim, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última línea a medio escribir durante un fallo
+                        logger.warning("⚠️ Línea inválida en %s descartada", orphan)
+                        continue
+                    if entry["write_id"] not in write_ids:
+                        write_ids.add(entry["write_id"])
+                        self._pending.append(entry)
+        if not claimed:
+            return
+        # Primero durable en el archivo propio, luego se borran los reclamados
+        self._rewrite_spill()
+        for claim in claimed:
+            claim.unlink(missing_ok=True)
+        if self._pending:
+            logger.info("♻️ Recuperados %d documentos pendientes de %d archivos de derrame",
+                        len(self._pending), len(claimed))
+
+    def enqueue(self, text: str, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Encola un documento y retorna de inmediato su ID de escritura"""
+        entry = {"write_id": uuid.uuid4().hex, "text": text, "metadata": metadata or {}}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El buffer de escritura está cerrado")
+            # Si _rewrite_spill reemplaza el archivo mientras tanto, lo incluye
+            self._in_flight[entry["write_id"]] = entry
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            with self._lock:
+                del self._in_flight[entry["write_id"]]
+            raise
+        with self._lock:
+            del self._in_flight[entry["write_id"]]
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(entry)
+            self.enqueued += 1
+            self._changed.notify_all()
+        get_metrics().incr("write_behind_enqueued")
+        return entry["write_id"]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # Esperar a un lote lleno, al intervalo del más antiguo, a flush() o a close()
+                while not self._closed and not self._flush_requested:
+                    now = time.monotonic()
+                    if self._retry_at is not None and now < self._retry_at:
+                        # Backoff tras un fallo: los enqueue notifican, pero no lo acortan
+                        self._changed.wait(self._retry_at - now)
+                        continue
+                    if len(self._pending) >= self.max_batch:
+                        break
+                    if not self._pending:
+                        self._changed.wait()
+                        continue
+                    remaining = self._oldest + self.flush_interval - now
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                if self._closed and not self._pending:
+                    return
+                batch = self._pending[:self.max_batch]
+
+            written = self._write(batch) if batch else True
+
+            with self._lock:
+                if written:
+                    del self._pending[:len(batch)]
+                    self._rewrite_spill()
+                    self._oldest = time.monotonic()
+                    self._failures, self._retry_at = 0, None
+                elif self._closed:
+                    # Sin reintentos al cerrar: lo pendiente sigue en el archivo
+                    self._changed.notify_all()
+                    return
+                else:
+                    # Ollama/Qdrant caídos: reintentar con espera exponencial
+                    # (flush() y close() sí la acortan: son peticiones explícitas)
+                    self._failures += 1
+                    delay = min(self.max_backoff, self.flush_interval * 2 ** (self._failures - 1))
+                    self._retry_at = time.monotonic() + delay
+                    self._flush_requested = False
+                if not self._pending:
+                    self._flush_requested = False
+                self._changed.notify_all()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        metrics = get_metrics()
+        try:
+            with metrics.span("write_behind_flush"):
+                results = self.rag_client.add_documents_unique(
+                    [(entry["text"], entry["metadata"]) for entry in batch]
+                )
+        except Exception as e:
+            logger.error("❌ Error escribiendo lote diferido: %s", e)
+            results = []
+        if not results or not all(result.ok for result in results):
+            self.failed_batches += 1
+            metrics.incr("write_behind_failed_batches")
+            logger.warning("⚠️ Lote de %d documentos no escrito; se reintentará", len(batch))
+            return False
+        self.written += len(batch)
+        metrics.incr("write_behind_written", len(batch))
+        if any(result.changed for result in results):
+            invalidate_answer_cache()
+        return True
+
+    def _rewrite_spill(self):
+        """
+        Reemplaza atómicamente el archivo de derrame por lo aún pendiente
+
+        Incluye los documentos en vuelo: su línea pudo ir al archivo reemplazado
+        (si también llega al nuevo, _recover descarta el duplicado por write_id).
+        """
+        entries = self._pending + list(self._in_flight.values())
+        if not entries:
+            self.spill_path.unlink(missing_ok=True)
+            return
+        tmp_path = self.spill_path.with_name(self.spill_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spill_path)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Escribe ya lo pendiente y espera; retorna False si venció el timeout o falló"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            start_failures = self.failed_batches
+            self._flush_requested = True
+            self._changed.notify_all()
+            while self._pending and self._worker.is_alive():
+                # Un lote fallido no se reintenta aquí: queda en el archivo de derrame
+                if self.failed_batches != start_failures:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return not self._pending
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Escribe lo pendiente y detiene el hilo"""
+        self.flush(timeout)
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+        self._worker.join(timeout)
+        with _live_spill_paths_lock:
+            # Lo que no se pudo escribir queda huérfano para el próximo buffer
+            _live_spill_paths.discard(self.spill_path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "pending": len(self._pending),
+                "failed_batches": self.failed_batches,
+            }
+
+    @classmethod
+    def from_env(cls, rag_client: RAGClient) -> Optional["WriteBehindBuffer"]:
+        """
+        - WRITE_BEHIND_ENABLED: "true" activa la escritura diferida (desactivada por defecto)
+        - WRITE_BEHIND_BATCH_SIZE: documentos por lote
+        - WRITE_BEHIND_FLUSH_INTERVAL: segundos máximos de espera antes de escribir
+        - WRITE_BEHIND_MAX_BACKOFF: espera máxima entre reintentos si el backend falla
+        - WRITE_BEHIND_SPILL_PATH: ruta base del derrame (por defecto en .rag_cache/);
+          cada proceso añade su sufijo <pid>-<id>
+        """
+        if os.getenv("WRITE_BEHIND_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+        spill_path = os.getenv("WRITE_BEHIND_SPILL_PATH") or \
+            f".rag_cache/write_behind_{rag_client.collection_name}.jsonl"
+        return cls(
+            rag_client,
+            spill_path,
+            max_batch=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "32")),
+            flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "2.0")),
+            max_backoff=float(os.getenv("WRITE_BEHIND_MAX_BACKOFF", "60")),
+        )
+
+
+_write_buffers: Dict[int, WriteBehindBuffer] = {}
+_write_buffers_lock = threading.Lock()
+
+
+def get_write_buffer(rag_client: Optional[RAGClient] = None) -> Optional[WriteBehindBuffer]:
+    """
+    Buffer de escritura de un cliente (por defecto el RAGClient compartido);
+    None si la escritura diferida está desactivada
+    """
+    if os.getenv("WRITE_BEHIND_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    rag_client = rag_client or get_rag_client()
+    with _write_buffers_lock:
+        buffer = _write_buffers.get(id(rag_client))
+        if buffer is None or buffer.rag_client is not rag_client:
+            buffer = WriteBehindBuffer.from_env(rag_client)
+            _write_buffers[id(rag_client)] = buffer
+    return buffer
+
+
+def flush_write_buffers(timeout: Optional[float] = None) -> bool:
+    """Escribe lo pendiente de todos los buffers (al terminar un crew o el proceso)"""
+    with _write_buffers_lock:
+        buffers = list(_write_buffers.values())
+    return all([buffer.flush(timeout) for buffer in buffers])
+
+
+def close_write_buffers(timeout: Optional[float] = 30.0):
+    with _write_buffers_lock:
+        buffers = list(_write_buffers.values())
+        _write_buffers.clear()
+    for buffer in buffers:
+        buffer.close(timeout)
+
+
+# Al salir del proceso se escribe lo pendiente; si falla, queda en el archivo
+atexit.register(close_write_buffers)
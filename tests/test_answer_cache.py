@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché semántica de respuestas
+"""
+
+import pytest
+
+from src.rag_agent import crew as crew_module
+from src.rag_agent import answer_cache as answer_cache_module
+from src.rag_agent.answer_cache import SemanticAnswerCache, collect_tool_outputs, get_answer_cache
+from src.rag_agent.crew import RagAgent
+from src.rag_agent.tools.rag_tools import RAGAddDocumentTool
+from tests.test_rag_client import client  # noqa: F401 (fixture)
+
+
+@pytest.fixture
+def cache(client):
+    return SemanticAnswerCache(client, threshold=0.95, ttl_seconds=3600)
+
+
+def test_hit_requires_similarity_scope_and_freshness(cache):
+    cache.store_answer("bases de datos vectoriales", "crew", "Informe sobre Qdrant")
+
+    hit = cache.lookup("bases de datos vectoriales", "crew")
+    assert hit.answer == "Informe sobre Qdrant"
+    assert cache.lookup("modelos locales con Ollama", "crew") is None
+    assert cache.lookup("bases de datos vectoriales", "otro-scope") is None
+
+    cache.ttl_seconds = 0
+    assert cache.lookup("bases de datos vectoriales", "crew") is None
+    assert cache.stats() | {"hit_rate": 0} == {
+        "hits": 1, "misses": 3, "expired": 1, "stores": 1, "hit_rate": 0, "entries": 0
+    }
+
+
+def test_invalidate_drops_all_answers(cache):
+    cache.store_answer("bases de datos vectoriales", "crew", "Informe")
+    cache.invalidate()
+
+    assert cache.lookup("bases de datos vectoriales", "crew") is None
+    assert cache.store_answer("bases de datos vectoriales", "crew", "Informe nuevo")
+    assert cache.lookup("bases de datos vectoriales", "crew").answer == "Informe nuevo"
+
+
+def test_kickoff_serves_cached_answer_without_running_the_crew(cache, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crew_module, "get_answer_cache", lambda: cache)
+    inputs = {"topic": "bases de datos vectoriales", "current_year": "2025"}
+    question, scope = RagAgent.answer_cache_key(inputs)
+    cache.store_answer(question, scope, "# Informe cacheado")
+
+    agent = RagAgent()
+    monkeypatch.setattr(type(agent), "crew", lambda self: pytest.fail("no debe ejecutar el crew"))
+    result = agent.kickoff(inputs)
+
+    assert result.raw == "# Informe cacheado"
+    assert (tmp_path / "report.md").read_text(encoding="utf-8") == "# Informe cacheado"
+
+
+def test_tool_outputs_are_collected(client, monkeypatch):
+    monkeypatch.setattr("src.rag_agent.tools.rag_tools.get_rag_client", lambda: client)
+
+    with collect_tool_outputs() as outputs:
+        RAGAddDocumentTool()._run(text="Qdrant es una base vectorial", category="tools")
+
+    assert outputs[0]["tool"] == "rag_add_document"
+    assert "Qdrant es una base vectorial" in outputs[0]["input"]
+    assert outputs[0]["output"].startswith("✅")
+
+
+def test_cache_is_opt_in_and_agent_writes_invalidate_it(cache, client, monkeypatch):
+    monkeypatch.delenv("ANSWER_CACHE_ENABLED", raising=False)
+    assert get_answer_cache() is None
+
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+    monkeypatch.setattr(answer_cache_module, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr("src.rag_agent.tools.rag_tools.get_rag_client", lambda: client)
+    cache.store_answer("bases de datos vectoriales", "crew", "Informe")
+
+    tool = RAGAddDocumentTool()
+    tool._run(text="Qdrant es una base vectorial", category="tools")
+    assert cache.lookup("bases de datos vectoriales", "crew") is None
+
+    # Un duplicado omitido no cambia la colección: la caché sigue válida
+    cache.store_answer("bases de datos vectoriales", "crew", "Informe nuevo")
+    tool._run(text="Qdrant es una base vectorial", category="tools")
+    assert cache.lookup("bases de datos vectoriales", "crew").answer == "Informe nuevo"
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Pruebas del cliente RAG asíncrono sin servicios externos
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from qdrant_client import AsyncQdrantClient
+
+from src.rag_agent import async_rag_client as async_module
+from src.rag_agent.async_rag_client import AsyncRAGClient
+from src.rag_agent import rag_client as rag_client_module
+from src.rag_agent.query_cache import QueryCache
+from tests.test_rag_client import fake_vector
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    monkeypatch.setattr(async_module, "AsyncQdrantClient", lambda url, **kwargs: AsyncQdrantClient(":memory:"))
+    calls = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        calls.append(payload["input"])
+        return httpx.Response(200, json={"embeddings": [fake_vector(t) for t in payload["input"]]})
+
+    def build():
+        client = AsyncRAGClient()
+        client.http_client = httpx.AsyncClient(
+            base_url=client.ollama_base_url, transport=httpx.MockTransport(handler)
+        )
+        client.calls = calls
+        return client
+
+    return build
+
+
+def test_async_add_and_search(client):
+    async def scenario():
+        rag = client()
+        texts = ["Qdrant es una base vectorial", "Ollama ejecuta modelos locales"]
+        results = await asyncio.gather(*(rag.add_document(t, {"category": "tools"}) for t in texts))
+        found = await rag.search_similar(texts[1], limit=1, score_threshold=0.9)
+        context = await rag.get_context_for_query(texts[0])
+        await rag.aclose()
+        return results, found, context, rag.calls
+
+    results, found, context, calls = asyncio.run(scenario())
+
+    assert results == [True, True]
+    assert found[0]["text"] == "Ollama ejecuta modelos locales"
+    assert "Qdrant es una base vectorial" in context
+    assert len(calls) == 4
+
+
+def test_async_embeddings_batches_run_concurrently(client):
+    async def scenario():
+        rag = client()
+        embeddings = await rag.get_embeddings([f"t{i}" for i in range(5)], batch_size=2)
+        await rag.aclose()
+        return embeddings, rag.calls
+
+    embeddings, calls = asyncio.run(scenario())
+
+    assert embeddings.shape == (5, 768)
+    assert sorted(len(batch) for batch in calls) == [1, 2, 2]
+
+
+def test_async_add_document_unique_merges_duplicates(client):
+    async def scenario():
+        rag = client()
+        rag.dedup_config.mode = "merge"
+        first = await rag.add_document_unique("Qdrant es una base vectorial", {"source": "web"})
+        second = await rag.add_document_unique("Qdrant es una base vectorial", {"source": "paper"})
+        found = await rag.search_similar("Qdrant es una base vectorial", limit=5)
+        await rag.aclose()
+        return first, second, found, rag.duplicates_avoided
+
+    query_cache = QueryCache.from_env("knowledge_base")
+    generation = query_cache.generation
+    rag_client_module.reset_rag_clients()
+    first, second, found, avoided = asyncio.run(scenario())
+
+    assert (first.action, second.action, avoided) == ("added", "merged", 1)
+    assert len(found) == 1 and found[0]["metadata"]["source"] == ["web", "paper"]
+    # Cada escritura asíncrona invalida las cachés de consultas de la colección
+    # sin construir el RAGClient síncrono
+    assert query_cache.generation == generation + 2
+    assert rag_client_module._shared_clients == {}
+
+
+def test_async_two_stage_search_with_matryoshka_prefix(client, monkeypatch):
+    monkeypatch.setenv("MATRYOSHKA_DIMENSION", "64")
+
+    async def scenario():
+        rag = client()
+        rag.dedup_config.mode = "merge"
+        await rag.add_document_unique("Qdrant es una base vectorial", {"source": "web"})
+        merged = await rag.add_document_unique("Qdrant es una base vectorial", {"source": "paper"})
+        await rag.add_document("Ollama ejecuta modelos locales")
+        found = await rag.search_similar("Ollama ejecuta modelos locales", limit=1, score_threshold=0.9)
+        context = await rag.get_context_for_query("Qdrant es una base vectorial")
+        await rag.aclose()
+        return merged, found, context
+
+    merged, found, context = asyncio.run(scenario())
+
+    assert merged.action == "merged"
+    # Score del vector completo (reordenación), no del prefijo
+    assert found[0]["text"] == "Ollama ejecuta modelos locales"
+    assert found[0]["score"] == pytest.approx(1.0, abs=1e-5)
+    assert "Qdrant es una base vectorial" in context
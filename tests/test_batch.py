@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Pruebas del runner por lotes (sin LLM: RagAgent se sustituye por un crew falso)
+"""
+
+import asyncio
+import io
+import json
+from types import SimpleNamespace
+
+from src.rag_agent import batch
+from src.rag_agent import crew as crew_module
+
+
+def test_iter_topics_reads_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "topics.jsonl"
+    jsonl.write_text('{"topic": "RAG"}\n\n"Qdrant"\n{"topic": "Ollama", "current_year": "2024"}\n',
+                     encoding="utf-8")
+    csv_file = tmp_path / "topics.csv"
+    csv_file.write_text("topic,audience\nRAG,devs\n,vacío\nQdrant,ops\nOllama\n", encoding="utf-8")
+
+    assert list(batch.iter_topics(jsonl)) == [
+        {"topic": "RAG"}, {"topic": "Qdrant"}, {"topic": "Ollama", "current_year": "2024"}
+    ]
+    assert list(batch.iter_topics(csv_file)) == [
+        {"topic": "RAG", "audience": "devs"}, {"topic": "Qdrant", "audience": "ops"},
+        # Fila corta: la columna que falta queda vacía
+        {"topic": "Ollama", "audience": ""},
+    ]
+
+
+def test_run_topics_caps_concurrency_and_writes_each_result(monkeypatch):
+    state = {"running": 0, "peak": 0}
+
+    class FakeRagAgent:
+        async def kickoff_async(self, inputs):
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(0.01)
+            state["running"] -= 1
+            if inputs["topic"] == "falla":
+                raise RuntimeError("LLM caído")
+            return SimpleNamespace(raw=f"Reporte de {inputs['topic']}", tasks_output=[1])
+
+    monkeypatch.setattr(crew_module, "RagAgent", FakeRagAgent)
+    monkeypatch.setattr(batch, "get_rag_client", lambda: SimpleNamespace(vector_store=None))
+    topics = ({"topic": name} for name in ["a", "b", "falla", "c", "d", "e"])
+    output = io.StringIO()
+
+    report = asyncio.run(batch.run_topics(topics, output, concurrency=2))
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert state["peak"] == 2
+    assert report["topics"] == 6 and report["ok"] == 5 and report["failed"] == 1
+    assert {r["topic"] for r in records} == {"a", "b", "falla", "c", "d", "e"}
+    assert all(r["inputs"]["current_year"] for r in records)
+    assert report["latency"]["p50_s"] >= 0.01
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Pruebas del benchmark offline: Ollama falso determinista y reporte JSON
+"""
+
+import json
+
+import numpy as np
+import requests
+
+from src.rag_agent.benchmarks import (
+    FakeOllamaServer, fake_embedding, run_benchmark, run_matryoshka_benchmark
+)
+from src.rag_agent.benchmarks.import_time import (
+    FORBIDDEN_IMPORTS, import_subtree, measure_import, parse_importtime
+)
+
+
+def test_fake_ollama_is_deterministic_and_semantic():
+    with FakeOllamaServer(dimension=64, latency_ms=1) as server:
+        response = requests.post(
+            f"{server.url}/api/embed",
+            json={"model": "fake", "input": ["bases de datos vectoriales", "otra cosa"]}
+        )
+    embeddings = np.asarray(response.json()["embeddings"])
+
+    assert embeddings.shape == (2, 64)
+    np.testing.assert_allclose(embeddings[0], fake_embedding("bases de datos vectoriales", 64), atol=1e-6)
+    assert server.requests == 1 and server.texts == 2
+    # Textos que comparten palabras quedan más cerca
+    related = fake_embedding("bases vectoriales", 64) @ embeddings[0]
+    unrelated = fake_embedding("modelos locales", 64) @ embeddings[0]
+    assert related > unrelated
+
+
+def test_run_benchmark_reports_throughput_and_percentiles(tmp_path):
+    knowledge = tmp_path / "knowledge"
+    knowledge.mkdir()
+    (knowledge / "a.txt").write_text(
+        "Qdrant es una base de datos vectorial rápida.\n\nOllama ejecuta modelos de lenguaje locales.",
+        encoding="utf-8"
+    )
+
+    report = run_benchmark([3], num_queries=5, dimension=32, knowledge_dir=knowledge)
+
+    run = report["runs"][0]
+    assert run["setup"]["files_loaded"] == 3
+    assert run["setup"]["points"] >= 3
+    for name in ("search_similar", "get_context_for_query"):
+        assert run[name]["count"] == 5
+        assert run[name]["p50_ms"] <= run[name]["p95_ms"] <= run[name]["p99_ms"]
+    json.dumps(report)
+
+
+def test_import_time_budget_for_the_cli_entry_point():
+    # -X importtime: el subárbol de rag_agent.main no incluye el arranque del intérprete
+    sample = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       500 |        500 | site",
+        "import time:        40 |         40 |   datetime",
+        "import time:        60 |        100 | rag_agent.main",
+    ])
+    entries = import_subtree(parse_importtime(sample), "rag_agent.main")
+    assert [name for name, *_ in entries] == ["datetime", "rag_agent.main"]
+
+    report = measure_import("rag_agent.main", repeat=1, budget_ms=1000,
+                            forbidden=FORBIDDEN_IMPORTS["rag_agent.main"])
+    # El CLI no carga CrewAI ni Qdrant hasta que un comando los necesita
+    assert report["forbidden_imports"] == []
+    assert report["within_budget"]
+
+
+def test_matryoshka_benchmark_reports_recall_against_exact_search():
+    report = run_matryoshka_benchmark(num_points=500, dimension=64, prefix_dimensions=[16],
+                                      num_queries=10, limit=5)
+
+    exact, prefix = report["runs"]
+    assert exact["prefix_dimension"] is None and exact["recall_at_k"] == 1.0
+    assert prefix["prefix_dimension"] == 16
+    assert 0.5 < prefix["recall_at_k"] <= 1.0
+    assert prefix["scanned_mb"] < exact["scanned_mb"]
+    json.dumps(report)
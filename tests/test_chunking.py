@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la fragmentación en streaming
+"""
+
+from pathlib import Path
+
+import pytest
+
+from src.rag_agent.chunking import chunk_file, chunk_text, count_tokens
+
+KNOWLEDGE = Path(__file__).resolve().parent.parent / "knowledge"
+
+
+@pytest.mark.parametrize("path", sorted(KNOWLEDGE.glob("*.txt")), ids=lambda p: p.name)
+def test_chunk_offsets_point_into_original_file(path):
+    original = path.read_text(encoding="utf-8")
+
+    chunks = list(chunk_file(path, max_tokens=100, overlap_tokens=20))
+
+    assert len(chunks) > 1
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert original[chunk.start:chunk.end] == chunk.text
+        assert chunk.token_count <= 100
+
+
+def test_chunks_split_on_sentences_with_overlap():
+    text = " ".join(f"Frase número {i} del documento." for i in range(30))
+
+    chunks = list(chunk_text(text, max_tokens=30, overlap_tokens=8))
+
+    assert all(c.text.endswith(".") for c in chunks)
+    for previous, following in zip(chunks, chunks[1:]):
+        assert following.start < previous.end
+        last_sentence = previous.text.rsplit("Frase", 1)[1]
+        assert following.text.startswith("Frase" + last_sentence)
+
+
+def test_paragraph_boundary_starts_new_chunk():
+    text = "Uno dos tres cuatro cinco seis.\n\nSegundo párrafo aquí."
+
+    chunks = list(chunk_text(text, max_tokens=12, overlap_tokens=0))
+
+    assert [c.text for c in chunks] == ["Uno dos tres cuatro cinco seis.", "Segundo párrafo aquí."]
+
+
+def test_oversized_sentence_is_split_by_words():
+    text = " ".join(["palabra"] * 50)
+
+    chunks = list(chunk_text(text, max_tokens=10, overlap_tokens=0))
+
+    assert len(chunks) == 5
+    assert all(count_tokens(c.text) == 10 for c in chunks)
+
+
+def test_chunk_file_is_lazy(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("Hola mundo.\n", encoding="utf-8")
+
+    chunks = chunk_file(path)
+
+    assert next(chunks).text == "Hola mundo."
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Pruebas del ensamblado de contexto: presupuesto en tokens, MMR y duplicados
+"""
+
+import numpy as np
+
+from src.rag_agent.chunking import count_tokens
+from src.rag_agent.context_packer import (
+    NO_RESULTS_MESSAGE,
+    build_context,
+    format_passage,
+    select_passages,
+)
+
+
+def doc(text, score, vector=None, id_="x"):
+    result = {"text": text, "metadata": {}, "score": score, "id": id_}
+    if vector is not None:
+        result["vector"] = np.asarray(vector, dtype=np.float32)
+    return result
+
+
+def test_skips_documents_that_do_not_fit():
+    big = doc("palabra " * 300, 0.9, id_="big")
+    small = doc("Qdrant es una base vectorial", 0.8, id_="small")
+
+    passages = select_passages([big, small], max_tokens=50)
+
+    assert [p["id"] for p in passages] == ["small"]
+
+
+def test_respects_token_budget():
+    docs = [doc(f"pasaje número {i} con algo de texto", 1 - i / 10, id_=str(i)) for i in range(10)]
+    budget = 60
+
+    context = build_context(docs, max_tokens=budget)
+
+    assert count_tokens(context) <= budget
+    assert "[Fuente ID: 0," in context
+
+
+def test_drops_exact_and_near_duplicates():
+    docs = [
+        doc("Qdrant es una base vectorial", 0.9, [1, 0, 0], "a"),
+        doc("Qdrant es una base vectorial", 0.9, [1, 0, 0], "a-copia"),
+        doc("Qdrant es una base de datos vectorial", 0.88, [0.999, -0.04, 0], "b"),
+        doc("Ollama ejecuta modelos locales", 0.7, [0, 1, 0], "c"),
+    ]
+
+    passages = select_passages(docs, max_tokens=500, query_vector=[1, 0.2, 0])
+
+    assert [p["id"] for p in passages] == ["a", "c"]
+
+
+def test_mmr_prefers_diverse_passages():
+    docs = [
+        doc("tema A primera versión", 0.95, [1, 0.1, 0], "a1"),
+        doc("tema A segunda versión", 0.94, [1, 0.05, 0], "a2"),
+        doc("tema B", 0.80, [0.6, 0.8, 0], "b"),
+    ]
+    budget = sum(count_tokens(format_passage(d)) for d in docs[:2]) + 8
+
+    passages = select_passages(docs, max_tokens=budget, query_vector=[1, 0.3, 0],
+                               mmr_lambda=0.5, duplicate_threshold=1.1)
+
+    assert [p["id"] for p in passages] == ["a1", "b"]
+
+
+def test_empty_results_message():
+    assert build_context([], max_tokens=100) == NO_RESULTS_MESSAGE
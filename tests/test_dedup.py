@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la supresión de casi-duplicados en las escrituras de los agentes
+"""
+
+import pytest
+
+from src.rag_agent.benchmarks.fake_ollama import fake_embedding
+from src.rag_agent.collection_config import CollectionConfig
+from src.rag_agent.dedup import DedupConfig, hamming_distance, merge_metadata, simhash
+from src.rag_agent.tools.rag_tools import RAGAddDocumentTool
+from tests.test_rag_client import FakeResponse, client  # noqa: F401 (fixture)
+
+FINDING = "Qdrant usa HNSW para búsquedas vectoriales rápidas en colecciones grandes de documentos"
+REWORDED = "Qdrant usa HNSW para búsquedas vectoriales rápidas en colecciones grandes de documentos."
+UNRELATED = "Ollama ejecuta modelos de lenguaje localmente sin depender de servicios externos"
+
+
+@pytest.fixture
+def word_client(client):
+    """Embeddings por palabra: las reformulaciones quedan cerca, como con un modelo real"""
+    client.http_session.post = lambda url, json=None, **kwargs: FakeResponse(
+        {"embeddings": [fake_embedding(text).tolist() for text in json["input"]]}
+    )
+    return client
+
+
+def test_simhash_separates_rewordings_from_other_texts():
+    longer = FINDING + " y filtra por payload con índices de palabras clave para acotar los resultados"
+
+    assert hamming_distance(simhash(FINDING), simhash(REWORDED)) == 0
+    assert hamming_distance(simhash(longer), simhash(longer.replace("rápidas", "veloces"))) <= 6
+    assert hamming_distance(simhash(FINDING), simhash(UNRELATED)) > 16
+
+
+def test_merge_metadata_accumulates_distinct_values():
+    merged = merge_metadata({"source": "web", "category": "db"}, {"source": "paper", "category": "db",
+                                                                  "added_by": "agent"})
+    assert merged == {"source": ["web", "paper"], "category": "db", "added_by": "agent",
+                      "duplicates": 1}
+
+
+def test_dedup_on_euclid_collections_compares_cosine_similarity(word_client, monkeypatch):
+    monkeypatch.setenv("DISTANCE_METRIC", "euclidean")
+    word_client.collection_config = CollectionConfig.from_env()
+    word_client.add_document_unique(FINDING)
+
+    # El score del backend es una distancia: sin re-puntuar todo contaría como duplicado
+    assert word_client.add_document_unique(UNRELATED).action == "added"
+    result = word_client.add_document_unique(REWORDED)
+    assert result.action == "skipped" and result.score > 0.92
+    assert word_client.count_documents() == 2
+
+
+@pytest.mark.parametrize("mode, action", [("skip", "skipped"), ("merge", "merged"),
+                                          ("replace", "replaced")])
+def test_add_document_unique_modes(word_client, mode, action):
+    word_client.dedup_config = DedupConfig(mode=mode)
+    assert word_client.add_document_unique(FINDING, {"source": "web"}).action == "added"
+
+    result = word_client.add_document_unique(REWORDED, {"source": "paper"})
+
+    assert result.action == action and result.score > 0.92
+    assert word_client.count_documents() == 1
+    assert word_client.duplicates_avoided == 1
+    assert word_client.add_document_unique(UNRELATED).action == "added"
+
+    stored = word_client.search_similar(REWORDED, limit=1)[0]
+    if mode == "merge":
+        assert stored["metadata"]["source"] == ["web", "paper"]
+    assert stored["text"] == (REWORDED if mode == "replace" else FINDING)
+
+
+def test_simhash_check_rejects_semantic_neighbours(word_client):
+    word_client.dedup_config = DedupConfig(threshold=0.5, simhash=True, simhash_max_distance=3)
+    word_client.add_document_unique(FINDING)
+
+    # Mismo vocabulario en otro orden: cerca en embeddings, lejos en shingles
+    shuffled = " ".join(reversed(FINDING.split()))
+    assert word_client.add_document_unique(shuffled).action == "added"
+    assert word_client.add_document_unique(REWORDED).action == "skipped"
+
+
+def test_tool_reports_avoided_duplicates(word_client, monkeypatch):
+    monkeypatch.setattr("src.rag_agent.tools.rag_tools.get_rag_client", lambda: word_client)
+    tool = RAGAddDocumentTool()
+
+    assert tool._run(text=FINDING).startswith("✅")
+    response = tool._run(text=REWORDED)
+    assert response.startswith("♻️") and "Duplicados evitados: 1" in response
+
+
+def test_replace_with_identical_text_keeps_the_point(word_client):
+    word_client.dedup_config = DedupConfig(mode="replace")
+    word_client.add_document_unique(FINDING)
+
+    assert word_client.add_document_unique(FINDING).action == "replaced"
+    assert word_client.count_documents() == 1
+
+
+def test_batch_write_dedups_within_the_batch(word_client):
+    results = word_client.add_documents_unique([(FINDING, {}), (UNRELATED, {}), (REWORDED, {})])
+
+    assert [result.action for result in results] == ["added", "added", "skipped"]
+    assert results[2].duplicate_of == results[0].point_id
+    assert word_client.count_documents() == 2
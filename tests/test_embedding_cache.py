@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché de embeddings en dos niveles
+"""
+
+import numpy as np
+
+from src.rag_agent.embedding_cache import EmbeddingCache
+
+
+def test_memory_lru_evicts_oldest_entries():
+    cache = EmbeddingCache("modelo", max_entries=2)
+    cache.put_many(["a", "b"], np.ones((2, 3)))
+    cache.get_many(["a"])
+    cache.put_many(["c"], np.ones((1, 3)))
+
+    assert [v is not None for v in cache.get_many(["a", "b", "c"])] == [True, False, True]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_store_survives_restart_and_counts_hits(tmp_path):
+    path = str(tmp_path / "cache.db")
+    vectors = np.arange(6, dtype=np.float32).reshape(2, 3)
+    EmbeddingCache("modelo", path=path).put_many(["a", "b"], vectors)
+
+    cache = EmbeddingCache("modelo", path=path)
+    first = cache.get_many(["a", "b", "z"])
+    cache.get_many(["a"])
+
+    np.testing.assert_array_equal(first[1], vectors[1])
+    assert first[2] is None
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (2, 1, 1)
+
+
+def test_model_change_invalidates_disk_entries(tmp_path):
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache("modelo-a", path=path).put_many(["a"], np.ones((1, 3)))
+
+    assert EmbeddingCache("modelo-b", path=path).get_many(["a"]) == [None]
+    assert EmbeddingCache("modelo-a", path=path).get_many(["a"]) == [None]
+
+
+def test_float16_storage_round_trip(tmp_path):
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache("modelo", path=path, dtype="float16").put_many(["a"], np.full((1, 3), 0.5))
+
+    vector = EmbeddingCache("modelo", path=path).get_many(["a"])[0]
+
+    assert vector.dtype == np.float32
+    np.testing.assert_array_equal(vector, [0.5, 0.5, 0.5])
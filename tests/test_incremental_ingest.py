@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la ingesta incremental de knowledge/ con manifiesto
+"""
+
+import pytest
+from qdrant_client import QdrantClient
+
+from src.rag_agent import rag_client as rag_client_module
+from src.rag_agent.rag_client import get_rag_client, reset_rag_clients
+from src.rag_agent.setup_knowledge_base import load_knowledge_folder
+from tests.test_rag_client import FakeSession
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    monkeypatch.setenv("INGEST_MANIFEST_PATH", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(rag_client_module, "QdrantClient", lambda url, **kwargs: QdrantClient(":memory:"))
+    reset_rag_clients()
+    client = get_rag_client()
+    client.http_session = FakeSession()
+    (tmp_path / "knowledge").mkdir()
+    yield tmp_path, client
+    reset_rag_clients()
+
+
+def stored_texts(client):
+    points, _ = client.qdrant_client.scroll(client.collection_name, limit=100)
+    return sorted(point.payload["text"] for point in points)
+
+
+def test_rerun_skips_unchanged_and_purges_stale_points(workspace):
+    root, client = workspace
+    (root / "knowledge" / "a.txt").write_text("Primer archivo.", encoding="utf-8")
+    (root / "knowledge" / "b.txt").write_text("Segundo archivo.", encoding="utf-8")
+
+    assert load_knowledge_folder() == 2
+    client.http_session.calls.clear()
+
+    # Sin cambios: no se llama a Ollama
+    assert load_knowledge_folder() == 0
+    assert client.http_session.calls == []
+
+    # Editar a.txt y borrar b.txt
+    (root / "knowledge" / "a.txt").write_text("Primer archivo editado.", encoding="utf-8")
+    (root / "knowledge" / "b.txt").unlink()
+
+    assert load_knowledge_folder() == 1
+    assert stored_texts(client) == ["Primer archivo editado."]
+    assert [call[1]["input"] for call in client.http_session.calls] == [["Primer archivo editado."]]
+
+
+def test_full_resync_reingests_everything(workspace):
+    root, client = workspace
+    (root / "knowledge" / "a.txt").write_text("Primer archivo.", encoding="utf-8")
+    load_knowledge_folder()
+
+    assert load_knowledge_folder(full_resync=True) == 1
+    assert stored_texts(client) == ["Primer archivo."]
+
+
+def test_failed_stale_delete_is_retried_on_next_run(workspace, monkeypatch):
+    root, client = workspace
+    (root / "knowledge" / "a.txt").write_text("Primer archivo.", encoding="utf-8")
+    load_knowledge_folder()
+    (root / "knowledge" / "a.txt").write_text("Primer archivo editado.", encoding="utf-8")
+
+    original = client.delete_documents
+    monkeypatch.setattr(client, "delete_documents", lambda point_ids: not point_ids)
+    assert load_knowledge_folder() == 1
+    assert stored_texts(client) == ["Primer archivo editado.", "Primer archivo."]
+
+    # El manifiesto conserva los IDs obsoletos: el siguiente setup los purga
+    monkeypatch.setattr(client, "delete_documents", original)
+    load_knowledge_folder()
+    assert stored_texts(client) == ["Primer archivo editado."]
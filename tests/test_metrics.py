@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la instrumentación: spans, contadores y sinks
+"""
+
+import json
+
+import pytest
+
+from src.rag_agent.metrics import JsonLinesSink, Metrics, PrometheusTextSink, set_metrics
+from tests.test_rag_client import client  # noqa: F401 (fixture)
+
+
+@pytest.fixture
+def metrics():
+    metrics = Metrics()
+    set_metrics(metrics)
+    yield metrics
+    set_metrics(None)
+
+
+def test_spans_and_counters_reach_sinks(tmp_path):
+    metrics = Metrics([JsonLinesSink(tmp_path / "m.jsonl"), PrometheusTextSink(tmp_path / "m.prom")])
+
+    with metrics.span("vector_search", backend="qdrant"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.span("embedding"):
+            raise ValueError("falla")
+    metrics.incr("search_results", 3)
+    metrics.incr("search_results", 2)
+    metrics.flush()
+
+    events = [json.loads(line) for line in (tmp_path / "m.jsonl").read_text().splitlines()]
+    assert [e["name"] for e in events] == ["vector_search", "embedding", "search_results", "search_results"]
+    assert events[1]["error"] is True
+
+    prom = (tmp_path / "m.prom").read_text()
+    assert "# TYPE rag_vector_search_seconds summary" in prom
+    assert 'rag_vector_search_seconds_count{backend="qdrant"} 1' in prom
+    assert "rag_search_results_total 5" in prom
+    assert "embedding" in metrics.summary()
+
+
+def test_rag_client_records_hot_path(client, metrics):
+    client.add_document("Qdrant es una base vectorial")
+    client.search_similar("Qdrant es una base vectorial")
+    client.get_context_for_query("Qdrant es una base vectorial")
+
+    snapshot = metrics.snapshot()
+    spans = {span["name"]: span["count"] for span in snapshot["spans"]}
+    counters = {counter["name"]: counter["value"] for counter in snapshot["counters"]}
+
+    assert spans["embedding"] == 3
+    assert spans["vector_upsert"] == 1
+    assert spans["vector_search"] == 2
+    assert spans["context_assembly"] == 1
+    assert counters["search_results"] == 2
+    assert counters["ollama_response_bytes"] > 0
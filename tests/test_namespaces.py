@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los namespaces (una colección por equipo/tenant) y la búsqueda en paralelo
+"""
+
+import asyncio
+
+import pytest
+
+from src.rag_agent.answer_cache import collect_tool_outputs
+from src.rag_agent.namespaces import NamespaceConfig, merge_hits, normalize_scores
+from src.rag_agent.tools import rag_tools
+from tests.test_rag_client import client  # noqa: F401 (fixture)
+
+
+def test_namespace_collections_from_env(monkeypatch):
+    monkeypatch.setenv("RAG_NAMESPACES", "equipo_a=kb_equipo_a, legal")
+    config = NamespaceConfig.from_env("knowledge_base")
+
+    assert config.collection_for("default") == "knowledge_base"
+    assert config.collection_for("equipo_a") == "kb_equipo_a"
+    assert config.collection_for("legal") == "legal"
+    assert config.collection_for("cliente-42") == "knowledge_base_cliente-42"
+    with pytest.raises(ValueError):
+        config.collection_for("../otra")
+
+
+def test_scores_are_normalized_per_namespace():
+    assert normalize_scores([0.9, 0.8, 0.7], "minmax") == pytest.approx([1.0, 0.5, 0.0])
+    assert normalize_scores([0.5], "minmax") == [1.0]
+    # euclid: menor distancia es mejor
+    assert normalize_scores([1.0, 3.0], "minmax", higher_is_better=False) == pytest.approx([1.0, 0.0])
+
+    hits = {
+        "a": [{"id": 1, "score": 0.95}, {"id": 2, "score": 0.94}],
+        "b": [{"id": 3, "score": 0.60}, {"id": 4, "score": 0.40}],
+    }
+
+    # Por defecto, scores brutos: un namespace poco relevante no desplaza al otro
+    merged = merge_hits(hits, limit=3)
+    assert [(hit["namespace"], hit["id"]) for hit in merged] == [("a", 1), ("a", 2), ("b", 3)]
+
+    # minmax (opcional): el mejor de "b" compite con el de "a" pese a su score bruto menor
+    merged = merge_hits(hits, limit=3, method="minmax")
+    assert [(hit["namespace"], hit["id"]) for hit in merged] == [("a", 1), ("b", 3), ("a", 2)]
+    assert merged[1]["raw_score"] == 0.60
+
+    # euclid sin normalizar: orden por distancia creciente, mostrando la distancia
+    distances = {"a": [{"id": 1, "score": 0.83}], "b": [{"id": 2, "score": 0.21}]}
+    merged = merge_hits(distances, limit=2, higher_is_better=False)
+    assert [(hit["id"], hit["score"]) for hit in merged] == [(2, 0.21), (1, 0.83)]
+
+
+def test_fan_out_search_merges_namespaces(client):
+    team_a = client.namespace_client("equipo_a")
+    team_b = client.namespace_client("equipo_b")
+    assert team_a.collection_name == "knowledge_base_equipo_a"
+    assert client.namespace_client("equipo_a") is team_a
+    assert client.namespace_client("default") is client
+
+    team_a.add_document("Qdrant es una base vectorial", {"category": "tools"})
+    team_b.add_document("Ollama ejecuta modelos locales", {"category": "tools"})
+    client.http_session.calls.clear()
+
+    # Aislados: la colección principal no ve lo de los equipos
+    assert client.search_similar("Qdrant es una base vectorial") == []
+
+    results = client.search_similar_batch(
+        ["Qdrant es una base vectorial", "Ollama ejecuta modelos locales"],
+        namespaces=["equipo_a", "equipo_b"]
+    )
+    assert [hits[0]["namespace"] for hits in results] == ["equipo_a", "equipo_b"]
+    # Un solo embedding para ambas consultas y todos los namespaces
+    assert len(client.http_session.calls) == 2
+
+    context = client.get_context_for_query("Ollama ejecuta modelos locales",
+                                           namespaces=["equipo_a", "equipo_b"])
+    assert "Ollama ejecuta modelos locales" in context
+
+
+def test_reads_do_not_create_namespace_collections(client):
+    client.add_document("Qdrant es una base vectorial")
+
+    results = client.search_similar("Qdrant es una base vectorial", namespaces=["default", "desconocido"])
+    assert [hit["namespace"] for hit in results] == ["default"]
+    assert client.namespace_client("desconocido").count_documents() == 0
+    assert not client.qdrant_client.collection_exists("knowledge_base_desconocido")
+
+    # La primera escritura sí crea la colección
+    client.namespace_client("desconocido").add_document("Ollama ejecuta modelos locales")
+    assert client.qdrant_client.collection_exists("knowledge_base_desconocido")
+
+
+def test_tools_accept_namespaces(client, monkeypatch):
+    monkeypatch.setattr(rag_tools, "get_rag_client", lambda: client)
+
+    response = rag_tools.RAGAddDocumentTool()._run(
+        text="Contrato marco firmado en 2026", category="legal", namespace="legal"
+    )
+    assert response.startswith("✅")
+    assert client.namespace_client("legal").count_documents() == 1
+
+    found = rag_tools.RAGSearchTool()._run("Contrato marco firmado en 2026", namespaces=["default", "legal"])
+    assert "Contrato marco firmado en 2026" in found
+
+
+def test_async_namespace_search_records_one_tool_output(client, monkeypatch):
+    monkeypatch.setattr(rag_tools, "get_rag_client", lambda: client)
+    client.namespace_client("legal").add_document("Contrato marco firmado en 2026")
+
+    async def search():
+        with collect_tool_outputs() as outputs:
+            await rag_tools.RAGSearchTool()._arun("Contrato marco firmado en 2026", namespaces=["legal"])
+        return outputs
+
+    outputs = asyncio.run(search())
+    # _arun delega en la implementación sin instrumentar: una sola salida y un solo span
+    assert len(outputs) == 1 and "Contrato marco firmado en 2026" in outputs[0]["output"]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Pruebas del modo retrieval-first (contexto recuperado antes del kickoff)
+"""
+
+from src.rag_agent import crew as crew_module
+from src.rag_agent.crew import RagAgent
+from src.rag_agent.prefetch import NO_PREFETCHED_CONTEXT, prefetch_context, prefetch_queries
+from tests.test_rag_client import client  # noqa: F401 (fixture)
+
+
+def test_prefetch_queries_from_topic_and_sub_queries():
+    assert prefetch_queries({"topic": "RAG"}) == ["RAG"]
+    assert prefetch_queries({"topic": "RAG", "sub_queries": "Qdrant; Ollama\nRAG;"}) == [
+        "RAG", "Qdrant", "Ollama"
+    ]
+    assert prefetch_queries({"question": "¿Qué es RAG?", "topic": "x",
+                             "sub_queries": ["HNSW"]}) == ["¿Qué es RAG?", "HNSW"]
+
+
+def test_prefetch_context_packs_each_query_once(client):
+    texts = ["Qdrant es una base vectorial", "Ollama ejecuta modelos locales"]
+    for text in texts:
+        assert client.add_document(text, {"category": "tools"})
+
+    context = prefetch_context(texts + ["consulta sin resultados"], max_tokens=600,
+                               rag_client=client)
+
+    assert context.index(f"### {texts[0]}") < context.index(f"### {texts[1]}")
+    assert "consulta sin resultados" not in context
+    assert prefetch_context([], rag_client=client) == ""
+
+
+def test_inject_rag_context_is_opt_in(monkeypatch):
+    calls = []
+    monkeypatch.setattr(crew_module, "prefetch_context",
+                        lambda queries: calls.append(queries) or "contexto precargado")
+    monkeypatch.delenv("RETRIEVAL_FIRST", raising=False)
+    agent = RagAgent()
+    inputs = {"topic": "RAG", "sub_queries": "Qdrant"}
+
+    assert agent.inject_rag_context(inputs)["rag_context"] == NO_PREFETCHED_CONTEXT
+    assert calls == []
+
+    monkeypatch.setenv("RETRIEVAL_FIRST", "true")
+    injected = agent.inject_rag_context(inputs)
+    assert injected["rag_context"] == "contexto precargado"
+    assert calls == [["RAG", "Qdrant"]]
+    # Los inputs originales (clave de la caché de respuestas) no cambian
+    assert "rag_context" not in inputs
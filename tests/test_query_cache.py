@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la caché de resultados de búsqueda
+"""
+
+from src.rag_agent.query_cache import QueryCache, bump_collection_generation, make_key
+
+
+def test_lru_eviction_and_hit_rate():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["hit_rate"] == 2 / 3
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("src.rag_agent.query_cache.time.monotonic", lambda: now[0])
+    cache = QueryCache(ttl_seconds=10)
+    cache.put("a", 1)
+
+    now[0] += 11
+
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_generation_bump_invalidates_and_rejects_late_writes():
+    cache = QueryCache()
+    cache.put("a", 1)
+    generation = cache.generation
+
+    cache.bump_generation()
+    cache.put("b", 2, generation)
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+
+def test_collection_generation_is_shared_between_caches():
+    sync_cache, other_cache = QueryCache(collection="docs"), QueryCache(collection="otra")
+    sync_cache.put("a", 1)
+    other_cache.put("a", 1)
+
+    bump_collection_generation("docs")
+
+    assert sync_cache.get("a") is None
+    assert other_cache.get("a") == 1
+
+
+def test_keys_distinguish_parameters():
+    assert make_key("search", "q", 5, 0.4) != make_key("search", "q", 5, 0.5)
+    assert make_key("search", "q", 5, {"b": 1, "a": 2}) == make_key("search", "q", 5, {"a": 2, "b": 1})
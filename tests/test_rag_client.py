@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Pruebas del cliente RAG sin servicios externos
+
+¿Por qué sin Ollama ni Qdrant reales?
+- Qdrant corre en modo local (:memory:)
+- Las peticiones HTTP a Ollama se sustituyen por embeddings deterministas
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+from src.rag_agent import rag_client as rag_client_module
+from src.rag_agent.rag_client import RAGClient
+from src.rag_agent.resilience import BackendError, RetryPolicy
+
+DIMENSION = 768
+
+
+def fake_vector(text):
+    """Vector determinista a partir del hash del texto"""
+    seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+    return np.random.default_rng(seed).standard_normal(DIMENSION).tolist()
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    @property
+    def content(self):
+        return json.dumps(self._payload).encode()
+
+    def json(self):
+        return self._payload
+
+
+class FakeSession:
+    """Sustituto de requests.Session que imita /api/embed"""
+
+    def __init__(self):
+        self.calls = []
+
+    def post(self, url, json=None, **kwargs):
+        self.calls.append((url, json))
+        return FakeResponse({"embeddings": [fake_vector(text) for text in json["input"]]})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    monkeypatch.setattr(rag_client_module, "QdrantClient", lambda url, **kwargs: QdrantClient(":memory:"))
+    client = RAGClient()
+    client.http_session = FakeSession()
+    return client
+
+
+def test_get_embeddings_splits_into_batches(client):
+    texts = [f"documento {i}" for i in range(10)]
+
+    embeddings = client.get_embeddings(texts, batch_size=4)
+
+    assert embeddings.shape == (10, DIMENSION)
+    assert embeddings.dtype == np.float32
+    assert [len(call[1]["input"]) for call in client.http_session.calls] == [4, 4, 2]
+    assert all(call[0].endswith("/api/embed") for call in client.http_session.calls)
+    np.testing.assert_allclose(embeddings[3], fake_vector("documento 3"), rtol=1e-6)
+
+
+def test_get_embeddings_raises_after_retries(client):
+    calls = []
+
+    def failing_post(*args, **kwargs):
+        calls.append(kwargs["timeout"])
+        return FakeResponse({}, status_code=500)
+
+    client.http_session.post = failing_post
+    client.ollama_resilience.retry = RetryPolicy(attempts=2, backoff_base=0)
+
+    with pytest.raises(BackendError):
+        client.get_embeddings(["hola"])
+    # Un fallo ya no se confunde con "sin resultados"
+    with pytest.raises(BackendError):
+        client.search_similar("hola")
+    assert len(calls) == 4
+    assert calls[0] == client.ollama_timeout
+
+
+def test_get_embeddings_does_not_retry_client_errors(client):
+    calls = []
+
+    def missing_model(*args, **kwargs):
+        calls.append(1)
+        return FakeResponse({}, status_code=404)
+
+    client.http_session.post = missing_model
+
+    with pytest.raises(BackendError):
+        client.get_embeddings(["hola"])
+    assert len(calls) == 1
+
+
+def test_search_similar_batch_finds_added_documents(client):
+    texts = ["Qdrant es una base vectorial", "Ollama ejecuta modelos locales"]
+    for text, embedding in zip(texts, client.get_embeddings(texts)):
+        assert client.add_document(text, {"category": "tools"}, embedding=embedding)
+    client.http_session.calls.clear()
+
+    results = client.search_similar_batch(texts, limit=1, score_threshold=0.9)
+
+    assert len(client.http_session.calls) == 1
+    assert [r[0]["text"] for r in results] == texts
+
+
+def test_embedding_cache_skips_known_texts(client, tmp_path):
+    from src.rag_agent.embedding_cache import EmbeddingCache
+
+    client.embedding_cache = EmbeddingCache(client.embedding_model, path=str(tmp_path / "cache.db"))
+    client.get_embeddings(["uno", "dos"])
+
+    embeddings = client.get_embeddings(["dos", "tres", "uno"])
+
+    assert [call[1]["input"] for call in client.http_session.calls] == [["uno", "dos"], ["tres"]]
+    np.testing.assert_allclose(embeddings[2], fake_vector("uno"), rtol=1e-6)
+
+
+def test_shared_client_connects_once(monkeypatch):
+    from src.rag_agent.rag_client import get_rag_client, reset_rag_clients
+
+    created = []
+
+    def make_client(url, **kwargs):
+        created.append(url)
+        return QdrantClient(":memory:")
+
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    monkeypatch.setattr(rag_client_module, "QdrantClient", make_client)
+    reset_rag_clients()
+    try:
+        client = get_rag_client()
+        assert created == []
+
+        client.http_session = FakeSession()
+        client.search_similar("hola")
+        client.search_similar("adiós")
+
+        assert get_rag_client() is client
+        assert len(created) == 1
+    finally:
+        reset_rag_clients()
+
+
+def test_add_documents_batches_and_reports_failures(client):
+    documents = [(f"documento {i}", {"i": i}) for i in range(7)]
+    documents.append(("con id propio", {}, "00000000-0000-0000-0000-000000000001"))
+    original_post = client.http_session.post
+
+    def flaky_post(url, json=None, **kwargs):
+        if "documento 4" in json["input"]:
+            return FakeResponse({}, status_code=500)
+        return original_post(url, json=json, **kwargs)
+
+    client.http_session.post = flaky_post
+
+    result = client.add_documents(iter(documents), batch_size=3, parallel=2)
+
+    assert result.added == 5
+    assert [f.index for f in result.failed] == [3, 4, 5]
+    assert "00000000-0000-0000-0000-000000000001" in result.ids
+    assert client.count_documents() == 5
+
+
+def test_add_documents_is_silent(client, capsys):
+    client.add_documents([("silencioso", None)])
+
+    assert "silencioso" not in capsys.readouterr().out
+
+
+def test_query_cache_serves_repeats_until_a_write(client):
+    from src.rag_agent.query_cache import QueryCache
+
+    client.query_cache = QueryCache()
+    client.add_document("Qdrant es una base vectorial")
+    client.http_session.calls.clear()
+
+    first = client.search_similar("Qdrant es una base vectorial")
+    client.get_context_for_query("Qdrant es una base vectorial")
+    client.get_context_for_query("Qdrant es una base vectorial")
+    assert client.search_similar("Qdrant es una base vectorial") == first
+    assert first
+    # búsqueda + contexto (el contexto recupera también los vectores)
+    assert len(client.http_session.calls) == 2
+
+    client.add_document("Ollama ejecuta modelos locales")
+    client.search_similar("Qdrant es una base vectorial")
+
+    assert len(client.http_session.calls) == 4
+    assert client.cache_stats()["queries"]["hits"] >= 2
+
+
+def test_numpy_backend_selected_by_config(monkeypatch):
+    from src.rag_agent.vector_store import NumpyVectorStore
+
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    monkeypatch.setenv("VECTOR_BACKEND", "numpy")
+    monkeypatch.setenv("NUMPY_STORE_PATH", "")
+    client = RAGClient()
+    client.http_session = FakeSession()
+
+    client.add_document("Qdrant es una base vectorial")
+
+    assert isinstance(client.vector_store, NumpyVectorStore)
+    assert client.search_similar("Qdrant es una base vectorial")[0]["score"] == pytest.approx(1.0)
+
+
+def test_async_tools_fall_back_to_the_sync_client_without_a_qdrant_server(monkeypatch):
+    import asyncio
+
+    from src.rag_agent.tools import rag_tools
+
+    monkeypatch.setenv("EMBEDDING_CACHE_ENABLED", "false")
+    monkeypatch.setenv("VECTOR_BACKEND", "numpy")
+    monkeypatch.setenv("NUMPY_STORE_PATH", "")
+    client = RAGClient()
+    client.http_session = FakeSession()
+    monkeypatch.setattr(rag_tools, "get_rag_client", lambda: client)
+    # Un AsyncQdrantClient consultaría otra base: no debe crearse
+    monkeypatch.setattr(rag_tools, "get_async_rag_client", lambda: pytest.fail("cliente asíncrono"))
+
+    added = asyncio.run(rag_tools.RAGAddDocumentTool()._arun(text="Qdrant es una base vectorial"))
+    found = asyncio.run(rag_tools.RAGSearchTool()._arun("Qdrant es una base vectorial"))
+
+    assert added.startswith("✅")
+    assert "Qdrant es una base vectorial" in found
+
+
+def test_filtered_search_and_context(client, monkeypatch):
+    from src.rag_agent.query_cache import QueryCache
+    from src.rag_agent.search_filter import SearchFilter
+    from src.rag_agent.tools import rag_tools
+
+    client.query_cache = QueryCache()
+    text = "Qdrant es una base vectorial"
+    client.add_document(text, {"category": "tools", "source": "setup"})
+
+    assert client.search_similar(text, search_filter=SearchFilter(category="tools"))
+    # Mismo texto, otro filtro: no se sirve desde la caché del primero
+    assert client.search_similar(text, search_filter=SearchFilter(category="user_data")) == []
+    assert text in client.get_context_for_query(text, search_filter=SearchFilter(source="setup"))
+
+    monkeypatch.setattr(rag_tools, "get_rag_client", lambda: client)
+    tool = rag_tools.RAGSearchTool()
+    assert text in tool._run(text, category="tools")
+    assert "No se encontró" in tool._run(text, category="user_data")
+
+
+def test_max_context_length_is_a_deprecated_alias(client):
+    text = "Qdrant es una base vectorial"
+    client.add_document(text)
+
+    with pytest.warns(DeprecationWarning, match="max_tokens"):
+        context = client.get_context_for_query(text, max_context_length=2000)
+
+    assert text in context
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la capa de resiliencia (reintentos, circuit breaker, hedging)
+"""
+
+import asyncio
+import time
+
+import pytest
+import requests
+
+from src.rag_agent.resilience import (
+    BackendError,
+    CircuitBreaker,
+    CircuitOpenError,
+    Resilience,
+    RetryPolicy,
+    TransientError,
+)
+
+
+def fast_resilience(attempts=3, failure_threshold=5, reset_timeout=30.0, hedge_after=None):
+    return Resilience(
+        "test",
+        RetryPolicy(attempts=attempts, backoff_base=0),
+        CircuitBreaker("test", failure_threshold=failure_threshold, reset_timeout=reset_timeout),
+        hedge_after=hedge_after,
+    )
+
+
+def test_retries_transient_errors_until_success():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise requests.ConnectionError("conexión rechazada")
+        return "ok"
+
+    assert fast_resilience().call(flaky) == "ok"
+    assert len(calls) == 3
+
+
+def test_exhausted_retries_raise_backend_error():
+    resilience = fast_resilience(attempts=2)
+
+    def down():
+        raise requests.Timeout("sin respuesta")
+
+    with pytest.raises(BackendError) as excinfo:
+        resilience.call(down)
+    assert isinstance(excinfo.value.__cause__, requests.Timeout)
+
+
+def test_non_idempotent_calls_are_not_retried():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise TransientError("503")
+
+    with pytest.raises(TransientError):
+        fast_resilience().call(failing, idempotent=False)
+    assert len(calls) == 1
+
+
+def test_non_transient_errors_propagate_without_tripping_breaker():
+    resilience = fast_resilience(failure_threshold=1)
+
+    def bug():
+        raise ValueError("payload inválido")
+
+    with pytest.raises(ValueError):
+        resilience.call(bug)
+    assert resilience.breaker.state == "closed"
+
+
+def test_circuit_opens_then_half_open_probe_closes_it():
+    resilience = fast_resilience(attempts=1, failure_threshold=2, reset_timeout=0.05)
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise TransientError("503")
+
+    for _ in range(2):
+        with pytest.raises(TransientError):
+            resilience.call(down)
+    assert resilience.breaker.state == "open"
+
+    # Abierto: falla rápido sin llamar al backend
+    with pytest.raises(CircuitOpenError):
+        resilience.call(down)
+    assert len(calls) == 2
+
+    # Tras reset_timeout una petición de prueba cierra el circuito
+    time.sleep(0.06)
+    assert resilience.call(lambda: "ok") == "ok"
+    assert resilience.breaker.state == "closed"
+
+
+def test_hedged_call_returns_fastest_response():
+    calls = []
+
+    def slow_then_fast():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "lenta"
+        return "rápida"
+
+    start = time.perf_counter()
+    result = fast_resilience(hedge_after=0.02).call(slow_then_fast, hedge=True)
+
+    assert result == "rápida"
+    assert time.perf_counter() - start < 0.4
+
+
+def test_async_call_retries_and_hedges():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise TransientError("503")
+        if len(calls) == 2:
+            await asyncio.sleep(0.5)
+            return "lenta"
+        return "rápida"
+
+    result = asyncio.run(fast_resilience(hedge_after=0.02).acall(flaky, hedge=True))
+
+    assert result == "rápida"
+    assert len(calls) == 3
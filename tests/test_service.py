@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Pruebas del servicio de recuperación residente (HTTP sobre asyncio)
+"""
+
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from src.rag_agent.resilience import BackendError
+from src.rag_agent.service import InFlightRequests, RetrievalService, ServiceClient
+from src.rag_agent.tools import rag_tools
+from tests.test_rag_client import client  # noqa: F401 (fixture)
+
+
+@pytest.fixture
+def service(client):
+    """Servicio en un event loop propio (hilo), como el proceso residente"""
+    service = RetrievalService(client, workers=8)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(service.start("127.0.0.1", 0))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield service
+
+    async def shutdown():
+        # Cierra también las conexiones keep-alive que siguen abiertas
+        server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+    service.close()
+
+
+def test_identical_in_flight_requests_are_coalesced():
+    calls = []
+
+    async def slow_search():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ["resultado"]
+
+    async def scenario():
+        inflight = InFlightRequests()
+        results = await asyncio.gather(*(inflight.run("search:q", slow_search) for _ in range(5)),
+                                       inflight.run("search:otra", slow_search))
+        # Terminada la llamada, la clave se libera
+        await inflight.run("search:q", slow_search)
+        return results, inflight
+
+    results, inflight = asyncio.run(scenario())
+
+    assert results == [["resultado"]] * 6
+    assert len(calls) == 3
+    assert inflight.coalesced == 4 and inflight.in_flight == 0
+
+
+def test_service_endpoints_share_one_warm_client(service, client):
+    remote = ServiceClient(service.url)
+
+    added, _ = remote.add("Qdrant es una base vectorial", {"category": "tools"})
+    assert added.action == "added"
+    duplicate, avoided = remote.add("Qdrant es una base vectorial", {"category": "tools"})
+    assert duplicate.duplicate and avoided == 1
+
+    hits = remote.search("Qdrant es una base vectorial", limit=3, category="tools")
+    assert hits[0]["text"] == "Qdrant es una base vectorial"
+    assert remote.search("Qdrant es una base vectorial", category="otra") == []
+    assert "Qdrant es una base vectorial" in remote.context("Qdrant es una base vectorial")
+    assert client.count_documents() == 1
+
+    health = requests.get(f"{service.url}/health").json()
+    assert health["status"] == "ok" and health["requests"] == 6
+
+    # Peticiones inválidas: 400/404, sin reintentos
+    with pytest.raises(BackendError, match="400"):
+        remote.search("")
+    assert requests.post(f"{service.url}/otra", json={}).status_code == 404
+
+
+@pytest.mark.parametrize("headers", [b"Content-Length: abc\r\n", b"X-Largo: " + b"a" * 70000 + b"\r\n"])
+def test_malformed_requests_get_a_400(service, headers):
+    host, port = service.url.removeprefix("http://").split(":")
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        sock.sendall(b"POST /search HTTP/1.1\r\nHost: test\r\n" + headers + b"\r\n")
+        response = sock.recv(4096)
+
+    assert response.startswith(b"HTTP/1.1 400")
+
+
+def test_concurrent_identical_queries_embed_and_search_once(service, client):
+    original = client.get_context_for_query
+    calls = []
+
+    def slow_context(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.2)
+        return original(*args, **kwargs)
+
+    client.get_context_for_query = slow_context
+    client.add_document("Ollama ejecuta modelos locales")
+    client.http_session.calls.clear()
+
+    remote = ServiceClient(service.url)
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        contexts = list(pool.map(lambda _: remote.context("Ollama ejecuta modelos locales"), range(6)))
+
+    assert all("Ollama ejecuta modelos locales" in context for context in contexts)
+    assert len(calls) == 1
+    assert len(client.http_session.calls) == 1
+    assert service.inflight.coalesced == 5
+
+
+def test_tools_use_the_service_when_configured(service, monkeypatch):
+    monkeypatch.setenv("RAG_SERVICE_URL", service.url)
+    # Ningún cliente en el proceso de la herramienta
+    monkeypatch.setattr(rag_tools, "get_rag_client", lambda: pytest.fail("cliente en proceso"))
+
+    response = rag_tools.RAGAddDocumentTool()._run(text="Contrato marco firmado en 2026", category="legal")
+    assert response.startswith("✅")
+
+    found = asyncio.run(rag_tools.RAGSearchTool()._arun("Contrato marco firmado en 2026", category="legal"))
+    assert "Contrato marco firmado en 2026" in found
+    assert service.requests == 2
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los snapshots portables (exportar e importar embeddings precalculados)
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from src.rag_agent.rag_client import get_rag_client, reset_rag_clients
+from src.rag_agent.setup_knowledge_base import load_knowledge_folder
+from src.rag_agent import snapshot as snapshot_module
+from src.rag_agent.snapshot import export_snapshot, import_snapshot
+from tests.test_incremental_ingest import workspace  # noqa: F401 (fixture)
+from tests.test_rag_client import FakeSession
+
+
+class OfflineSession(FakeSession):
+    """Un nodo recién creado sin acceso a Ollama"""
+
+    def post(self, url, json=None, **kwargs):
+        raise AssertionError("import no debe llamar a Ollama")
+
+
+def test_export_then_import_on_a_new_node_without_embedding(workspace, monkeypatch):
+    root, client = workspace
+    (root / "knowledge" / "a.txt").write_text("Qdrant es una base vectorial.", encoding="utf-8")
+    (root / "knowledge" / "b.txt").write_text("Ollama ejecuta modelos locales.", encoding="utf-8")
+    load_knowledge_folder()
+
+    manifest = export_snapshot(client, root / "snapshot", batch_size=1)
+    assert manifest["count"] == 2 and manifest["dtype"] == "float16"
+    vectors = np.load(root / "snapshot" / "vectors.npy", mmap_mode="r")
+    assert vectors.shape == (2, client.collection_config.dimension) and vectors.dtype == np.float16
+    assert sorted(manifest["ingest"]["files"]) == ["knowledge/a.txt", "knowledge/b.txt"]
+
+    # Nodo nuevo: otro backend y sin manifiesto de ingesta
+    monkeypatch.setenv("VECTOR_BACKEND", "numpy")
+    monkeypatch.setenv("NUMPY_STORE_PATH", str(root / "numpy_store"))
+    monkeypatch.setenv("INGEST_MANIFEST_PATH", str(root / "node_manifest.json"))
+    reset_rag_clients()
+    node = get_rag_client()
+    node.http_session = OfflineSession()
+
+    assert import_snapshot(node, root / "snapshot", batch_size=1) == 2
+    assert node.count_documents() == 2
+    query = client.get_embeddings(["Ollama ejecuta modelos locales."])
+    hits = node.vector_store.search_batch(query, limit=1)[0]
+    assert hits[0]["text"] == "Ollama ejecuta modelos locales."
+    assert hits[0]["score"] == pytest.approx(1.0, abs=1e-3)
+
+    # El manifiesto viajó con el snapshot: setup no re-embebe nada
+    assert load_knowledge_folder() == 0
+
+
+def test_import_rejects_incompatible_snapshots(workspace):
+    root, client = workspace
+    client.add_document("Qdrant es una base vectorial")
+    export_snapshot(client, root / "snapshot")
+
+    manifest_path = root / "snapshot" / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    manifest["embedding_model"] = "otro-modelo"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="otro-modelo"):
+        import_snapshot(client, root / "snapshot")
+    assert import_snapshot(client, root / "snapshot", replace=True, force=True) == 1
+
+    manifest_path.unlink()
+    with pytest.raises(ValueError, match="completo"):
+        import_snapshot(client, root / "snapshot")
+
+
+def test_namespace_import_leaves_the_ingest_manifest_alone(workspace, monkeypatch):
+    root, client = workspace
+    (root / "knowledge" / "a.txt").write_text("Qdrant es una base vectorial.", encoding="utf-8")
+    load_knowledge_folder()
+    export_snapshot(client, root / "snapshot")
+    manifest_before = (root / "manifest.json").read_text(encoding="utf-8")
+
+    invalidations = []
+    monkeypatch.setattr(snapshot_module, "invalidate_answer_cache", lambda: invalidations.append(1))
+    team = client.namespace_client("equipo")
+    assert import_snapshot(team, root / "snapshot", replace=True) == 1
+
+    assert team.count_documents() == 1
+    assert (root / "manifest.json").read_text(encoding="utf-8") == manifest_before
+    assert invalidations == [1]
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Pruebas de los backends vectoriales: todos deben retornar lo mismo
+"""
+
+import subprocess
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, PayloadSchemaType, ScalarQuantization
+
+from src.rag_agent import vector_store as vector_store_module
+from src.rag_agent.collection_config import CollectionConfig
+from src.rag_agent.rag_client import document_id
+from src.rag_agent.search_filter import SearchFilter
+from src.rag_agent.vector_store import NumpyVectorStore, QdrantVectorStore, normalize_point_id
+
+DIMENSION = 32
+CONFIG = CollectionConfig(dimension=DIMENSION)
+
+
+def populate(store, count=200, seed=0, config=CONFIG):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    ids = [document_id(f"doc {i}") for i in range(count)]
+    payloads = [{"text": f"doc {i}", "metadata": {"i": i}} for i in range(count)]
+    store.ensure_collection(config)
+    store.upsert(ids, vectors, payloads)
+    return vectors
+
+
+@pytest.fixture(params=["memory", "disk"])
+def numpy_store(request, tmp_path):
+    return NumpyVectorStore("test", path=tmp_path if request.param == "disk" else None)
+
+
+@pytest.mark.parametrize("distance, threshold", [("cosine", 0.1), ("dot", 0.5), ("euclid", 8.0)])
+def test_numpy_backend_matches_qdrant(numpy_store, distance, threshold):
+    config = CollectionConfig(dimension=DIMENSION, distance=distance)
+    qdrant_store = QdrantVectorStore(QdrantClient(":memory:"), "test")
+    vectors = populate(qdrant_store, config=config)
+    populate(numpy_store, config=config)
+    queries = vectors[:5] + 0.5 * np.random.default_rng(1).standard_normal((5, DIMENSION))
+
+    with warnings.catch_warnings():
+        # Query API: search_batch de qdrant-client está obsoleto
+        warnings.simplefilter("error", DeprecationWarning)
+        expected = qdrant_store.search_batch(queries, limit=7, score_threshold=threshold)
+    actual = numpy_store.search_batch(queries, limit=7, score_threshold=threshold)
+
+    for want, got in zip(expected, actual):
+        assert [hit["id"] for hit in got] == [hit["id"] for hit in want]
+        assert [hit["text"] for hit in got] == [hit["text"] for hit in want]
+        np.testing.assert_allclose([h["score"] for h in got], [h["score"] for h in want], atol=1e-5)
+
+
+def test_numpy_backend_upsert_delete_and_reload(tmp_path):
+    store = NumpyVectorStore("test", path=tmp_path)
+    vectors = populate(store, count=100)
+    deleted = [document_id("doc 0"), document_id("doc 50")]
+
+    store.delete(deleted)
+    store.upsert([document_id("doc 1")], vectors[2:3], [{"text": "reemplazado", "metadata": {}}])
+
+    reloaded = NumpyVectorStore("test", path=tmp_path)
+    assert reloaded.count() == 98
+    hit = reloaded.search_batch(vectors[2:3], limit=2)[0]
+    assert {h["text"] for h in hit} == {"doc 2", "reemplazado"}
+    assert reloaded.search_batch(vectors[:1], limit=1)[0][0]["text"] != "doc 0"
+
+
+def test_numpy_writes_append_to_a_log_and_compact(tmp_path, monkeypatch):
+    store = NumpyVectorStore.shared("test", path=tmp_path)
+    assert store.for_collection("test") is store
+    vectors = populate(store, count=20)
+    snapshot = (tmp_path / "test" / "points.json").read_bytes()
+
+    # Cada escritura añade una línea al log: points.json no se reescribe
+    store.delete([document_id("doc 0")])
+    store.upsert([document_id("doc 1")], vectors[2:3], [{"text": "reemplazado", "metadata": {}}])
+    assert (tmp_path / "test" / "points.json").read_bytes() == snapshot
+
+    reloaded = NumpyVectorStore("test", path=tmp_path)
+    assert reloaded.count() == 19
+    assert {h["text"] for h in reloaded.search_batch(vectors[2:3], limit=2)[0]} == {"doc 2", "reemplazado"}
+
+    # Superado el umbral, el log se compacta en points.json
+    monkeypatch.setattr("src.rag_agent.vector_store.NUMPY_LOG_COMPACT_BYTES", 0)
+    store.delete([document_id("doc 3")])
+    assert list((tmp_path / "test").glob("points.*.log")) == []
+    assert NumpyVectorStore("test", path=tmp_path).count() == 18
+
+
+def test_numpy_delete_recovers_from_a_crash_before_moving_rows(tmp_path, monkeypatch):
+    store = NumpyVectorStore("test", path=tmp_path)
+    vectors = populate(store, count=10)
+
+    def crash(moves):
+        # Cae a mitad de los movimientos: el delete ya está en el log
+        store._matrix[moves[0][0]] = store._matrix[moves[0][1]]
+        raise OSError("caída simulada")
+
+    monkeypatch.setattr(store, "_move_rows", crash)
+    with pytest.raises(OSError):
+        # doc 8 deja su hueco a doc 9 y doc 0 a la fila 8 (movimientos encadenados)
+        store.delete([document_id("doc 8"), document_id("doc 0")])
+
+    reloaded = NumpyVectorStore("test", path=tmp_path)
+    assert reloaded.count() == 8
+    for i in range(1, 8):
+        assert reloaded.search_batch(vectors[i:i + 1], limit=1)[0][0]["text"] == f"doc {i}"
+    assert reloaded.search_batch(vectors[9:10], limit=1)[0][0]["text"] == "doc 9"
+
+
+@pytest.mark.skipif(vector_store_module.fcntl is None, reason="bloqueo entre procesos solo en POSIX")
+def test_numpy_store_rejects_a_second_writer_process(tmp_path):
+    store = NumpyVectorStore("test", path=tmp_path)
+    populate(store, count=5)
+    script = (
+        "import sys; import numpy as np\n"
+        "from src.rag_agent.vector_store import NumpyVectorStore\n"
+        f"store = NumpyVectorStore('test', path={str(tmp_path)!r})\n"
+        "try:\n"
+        "    store.upsert(['otro'], np.ones((1, store._dim)), [{'text': 'otro'}])\n"
+        "except RuntimeError:\n"
+        "    sys.exit(3)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=Path(__file__).parent.parent)
+
+    assert result.returncode == 3
+    assert NumpyVectorStore("test", path=tmp_path).count() == 5
+
+
+def test_numpy_backend_empty_collection():
+    store = NumpyVectorStore("test")
+    store.ensure_collection(CONFIG)
+
+    assert store.search_batch(np.ones((2, DIMENSION)), limit=3) == [[], []]
+
+
+def test_collection_config_from_env(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_DIMENSION", "256")
+    monkeypatch.setenv("DISTANCE_METRIC", "euclidean")
+    monkeypatch.setenv("VECTORS_ON_DISK", "true")
+    monkeypatch.setenv("VECTOR_QUANTIZATION", "scalar")
+    monkeypatch.setenv("HNSW_M", "32")
+    monkeypatch.setenv("SEARCH_HNSW_EF", "128")
+    config = CollectionConfig.from_env()
+
+    kwargs = config.create_collection_kwargs()
+    assert kwargs["vectors_config"].size == 256
+    assert kwargs["vectors_config"].distance == Distance.EUCLID
+    assert kwargs["vectors_config"].on_disk is True
+    assert isinstance(kwargs["quantization_config"], ScalarQuantization)
+    assert kwargs["hnsw_config"].m == 32
+
+    params = config.search_params(oversampling=2.0)
+    assert params.hnsw_ef == 128
+    assert params.quantization.rescore is True
+    assert params.quantization.oversampling == 2.0
+
+
+def test_quantized_qdrant_collection_searches():
+    config = CollectionConfig(dimension=DIMENSION, quantization="scalar", hnsw_m=8)
+    store = QdrantVectorStore(QdrantClient(":memory:"), "test")
+    vectors = populate(store, count=50, config=config)
+
+    hits = store.search_batch(vectors[:1], limit=3, search_params=config.search_params(hnsw_ef=64))[0]
+    assert hits[0]["text"] == "doc 0"
+
+
+@pytest.mark.parametrize("backend", ["qdrant", "numpy"])
+def test_two_stage_search_rescores_with_full_vectors(backend, tmp_path):
+    # Oversampling alto: los candidatos del prefijo cubren toda la colección
+    config = CollectionConfig(dimension=DIMENSION, prefix_dimension=8, prefix_oversampling=100)
+    if backend == "qdrant":
+        store = QdrantVectorStore(QdrantClient(":memory:"), "test")
+    else:
+        store = NumpyVectorStore("test", path=tmp_path)
+    exact = NumpyVectorStore("exact")
+    vectors = populate(store, config=config)
+    populate(exact)
+    queries = vectors[:5] + 0.5 * np.random.default_rng(1).standard_normal((5, DIMENSION))
+
+    expected = exact.search_batch(queries, limit=5)
+    actual = store.search_batch(queries, limit=5, with_vectors=True)
+
+    for want, got in zip(expected, actual):
+        assert [hit["id"] for hit in got] == [hit["id"] for hit in want]
+        np.testing.assert_allclose([h["score"] for h in got], [h["score"] for h in want], atol=1e-5)
+        assert all(len(hit["vector"]) == DIMENSION for hit in got)
+
+
+def test_numpy_two_stage_prefix_survives_reload(tmp_path):
+    config = CollectionConfig(dimension=DIMENSION, prefix_dimension=8, prefix_oversampling=1)
+    store = NumpyVectorStore("test", path=tmp_path)
+    vectors = populate(store, config=config)
+    store.delete([document_id("doc 3")])
+    before = store.search_batch(vectors[:10], limit=3)
+
+    # El prefijo se recalcula al cargar, sin volver a llamar a ensure_collection
+    reloaded = NumpyVectorStore("test", path=tmp_path)
+    assert reloaded.search_batch(vectors[:10], limit=3) == before
+    assert all(hit["text"] != "doc 3" for hits in before for hit in hits)
+
+
+@pytest.mark.parametrize("prefix_dimension", [None, 8])
+def test_scroll_returns_every_point_with_full_vectors(numpy_store, prefix_dimension):
+    config = CollectionConfig(dimension=DIMENSION, prefix_dimension=prefix_dimension)
+    qdrant_store = QdrantVectorStore(QdrantClient(":memory:"), "test")
+    for store in (qdrant_store, numpy_store):
+        vectors = populate(store, count=70, config=config)
+        batches = list(store.scroll(batch_size=32))
+
+        assert [len(ids) for ids, _, _ in batches] == [32, 32, 6]
+        ids = [point_id for batch_ids, _, _ in batches for point_id in batch_ids]
+        matrix = np.concatenate([batch_vectors for _, batch_vectors, _ in batches])
+        texts = [payload["text"] for _, _, payloads in batches for payload in payloads]
+        assert sorted(ids) == sorted(normalize_point_id(document_id(f"doc {i}")) for i in range(70))
+        # Coseno: los backends guardan los vectores normalizados
+        expected = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        order = [int(text.split()[1]) for text in texts]
+        np.testing.assert_allclose(matrix, expected[order], atol=1e-5)
+
+
+def test_filtered_search_matches_qdrant(numpy_store):
+    qdrant_store = QdrantVectorStore(QdrantClient(":memory:"), "test")
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((60, DIMENSION)).astype(np.float32)
+    ids = [document_id(f"doc {i}") for i in range(60)]
+    payloads = [
+        {"text": f"doc {i}", "metadata": {
+            "category": ["tools", "ai", "user_data"][i % 3],
+            "added_at": f"2026-01-{i % 28 + 1:02d}T00:00:00+00:00",
+        }}
+        for i in range(60)
+    ]
+    for store in (qdrant_store, numpy_store):
+        store.ensure_collection(CONFIG)
+        store.upsert(ids, vectors, payloads)
+
+    search_filter = SearchFilter(category=["tools", "ai"], added_after="2026-01-10T00:00:00Z")
+    expected = qdrant_store.search_batch(vectors[:3], limit=5, search_filter=search_filter)
+    actual = numpy_store.search_batch(vectors[:3], limit=5, search_filter=search_filter)
+
+    for want, got in zip(expected, actual):
+        assert len(got) == 5
+        assert [hit["id"] for hit in got] == [hit["id"] for hit in want]
+        assert all(hit["metadata"]["category"] != "user_data" for hit in got)
+        assert all(hit["metadata"]["added_at"] >= "2026-01-10" for hit in got)
+
+
+def test_search_filter_semantics():
+    metadata = {"category": ["tools", "ai"], "source": "setup", "added_at": "2026-03-01T12:00:00Z"}
+
+    assert SearchFilter(category="ai").matches(metadata)
+    assert not SearchFilter(category="ai", source="web").matches(metadata)
+    assert SearchFilter(added_before="2026-03-02").matches(metadata)
+    assert not SearchFilter(added_after="2026-03-02").matches(metadata)
+    assert not SearchFilter(added_after="2026-01-01").matches({"category": "ai"})
+    assert SearchFilter.build(category=None, source="") is None
+
+
+def test_payload_indexes_from_env(monkeypatch):
+    monkeypatch.setenv("PAYLOAD_INDEXES", "category:keyword, added_at:datetime")
+    assert CollectionConfig.from_env().payload_index_schemas() == {
+        "metadata.category": PayloadSchemaType.KEYWORD,
+        "metadata.added_at": PayloadSchemaType.DATETIME,
+    }
+
+    monkeypatch.setenv("PAYLOAD_INDEXES", "none")
+    assert CollectionConfig.from_env().payload_index_schemas() == {}
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la escritura diferida (write-behind) de documentos
+"""
+
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+from src.rag_agent.resilience import RetryPolicy
+from src.rag_agent.tools.rag_tools import RAGAddDocumentTool
+from src.rag_agent.write_buffer import WriteBehindBuffer, close_write_buffers
+from tests.test_rag_client import FakeResponse, client  # noqa: F401 (fixture)
+
+
+@pytest.fixture
+def spill_path(tmp_path):
+    return tmp_path / "write_behind.jsonl"
+
+
+def test_flush_writes_queued_documents_in_one_batch(client, spill_path):
+    buffer = WriteBehindBuffer(client, spill_path, max_batch=32, flush_interval=60)
+    for i in range(5):
+        buffer.enqueue(f"hallazgo {i}", {"category": "test"})
+    assert len(buffer.spill_path.read_text(encoding="utf-8").splitlines()) == 5
+    assert client.count_documents() == 0
+
+    assert buffer.flush(timeout=5)
+
+    assert client.count_documents() == 5
+    assert len(client.http_session.calls) == 1
+    assert not buffer.spill_path.exists()
+    assert buffer.stats() == {"enqueued": 5, "written": 5, "pending": 0, "failed_batches": 0}
+    buffer.close()
+
+
+def test_size_and_time_thresholds_trigger_writes(client, spill_path):
+    buffer = WriteBehindBuffer(client, spill_path, max_batch=2, flush_interval=0.2)
+    buffer.enqueue("primero")
+    buffer.enqueue("segundo")
+    buffer.enqueue("tercero")
+
+    deadline = time.monotonic() + 5
+    while buffer.stats()["written"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    assert client.count_documents() == 3
+    assert [len(call[1]["input"]) for call in client.http_session.calls] == [2, 1]
+    buffer.close()
+
+
+def test_failed_writes_survive_in_spill_file(client, spill_path):
+    working_post = client.http_session.post
+    client.http_session.post = lambda *args, **kwargs: FakeResponse({}, status_code=500)
+    # Sin reintentos: el circuit breaker no llega a abrirse
+    client.ollama_resilience.retry = RetryPolicy(attempts=1)
+    buffer = WriteBehindBuffer(client, spill_path, flush_interval=60)
+    buffer.enqueue("no se pierde", {"source": "test"})
+
+    assert not buffer.flush(timeout=5)
+    buffer.close(timeout=1)
+    assert json.loads(buffer.spill_path.read_text(encoding="utf-8"))["text"] == "no se pierde"
+
+    # Un proceso nuevo recupera lo pendiente del archivo de derrame
+    client.http_session.post = working_post
+    recovered = WriteBehindBuffer(client, spill_path, flush_interval=60)
+    assert recovered.flush(timeout=5)
+    assert client.search_similar("no se pierde", limit=1)[0]["metadata"]["source"] == "test"
+    recovered.close()
+
+
+def test_failed_batches_back_off_even_while_documents_keep_arriving(client, spill_path):
+    attempts = []
+
+    def failing_write(documents):
+        attempts.append(len(documents))
+        raise RuntimeError("backend caído")
+
+    client.add_documents_unique = failing_write
+    buffer = WriteBehindBuffer(client, spill_path, max_batch=1, flush_interval=0.05, max_backoff=10)
+    for i in range(20):
+        buffer.enqueue(f"hallazgo {i}")
+        time.sleep(0.01)
+
+    # Sin backoff cada documento nuevo dispararía un reintento inmediato (~20)
+    assert 1 <= len(attempts) <= 5
+    assert len(buffer.spill_path.read_text(encoding="utf-8").splitlines()) == 20
+    buffer.close(timeout=1)
+
+
+def test_each_process_spills_to_its_own_file_and_recovers_orphans(client, spill_path):
+    finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                              capture_output=True, text=True, check=True)
+    orphan = spill_path.with_name(f"write_behind.{finished.stdout.strip()}-0a1b2c3d.jsonl")
+    entry = {"write_id": "huerfano", "text": "escrito por un proceso terminado", "metadata": {}}
+    orphan.write_text(json.dumps(entry) + "\n", encoding="utf-8")
+
+    first = WriteBehindBuffer(client, spill_path, flush_interval=60)
+    first.enqueue("pendiente del primero")
+    # El archivo del primer buffer sigue vivo: el segundo no lo reclama
+    second = WriteBehindBuffer(client, spill_path, flush_interval=60)
+
+    assert first.spill_path != second.spill_path
+    assert not orphan.exists()
+    assert first.stats()["pending"] == 2 and second.stats()["pending"] == 0
+    first.close()
+    second.close()
+    assert client.count_documents() == 2
+
+
+def test_tool_enqueues_when_write_behind_is_enabled(client, spill_path, monkeypatch):
+    monkeypatch.setenv("WRITE_BEHIND_ENABLED", "true")
+    monkeypatch.setenv("WRITE_BEHIND_SPILL_PATH", str(spill_path))
+    monkeypatch.setattr("src.rag_agent.write_buffer.get_rag_client", lambda: client)
+
+    response = RAGAddDocumentTool()._run(text="Qdrant es una base vectorial", category="tools")
+
+    assert response.startswith("✅ Documento encolado")
+    assert client.http_session.calls == []
+    close_write_buffers()
+    assert client.count_documents() == 1